@@ -0,0 +1,387 @@
+"""Локальная служба чтения данных в формате JSON (HTTP).
+
+Для других программ (печать этикеток, прайс-лист на сайте): они получают
+продукцию и материалы теми же запросами, что и приложение (statements.py),
+не обращаясь к базе напрямую.
+
+    GET /products?offset=0&limit=50       список продукции (по наименованию)
+    GET /products/<id>                    продукт и состав
+    GET /materials?offset=0&limit=50      список материалов (&low_stock=1 — ниже минимума)
+    GET /materials/<id>                   материал и продукция, в которой он используется
+
+Ответ списка: {"items": [...], "total": N, "offset": 0, "limit": 50, "next_offset": 50 или null}.
+
+Соединения с базой берутся из пула (не больше pool_size одновременно).
+Ответы кэшируются в памяти службы, поэтому одинаковые запросы многих
+клиентов обходятся одним обращением к базе. Кэш сбрасывается по
+уведомлениям PostgreSQL об изменении таблиц (канал table_changed, см.
+database.py): записи с любого рабочего места видны сразу. Каждый ответ
+помечается ETag; запрос с If-None-Match и тем же ETag получает 304 без
+обращения к кэшу и базе.
+
+Запуск отдельно или внутри приложения (переменная окружения API_PORT при
+запуске main.py):
+
+    python api_server.py --port 8080
+"""
+import argparse
+import json
+import select
+import sys
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from decimal import Decimal
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import database
+import statements
+
+DEFAULT_PORT = 8080
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+CHANNEL = "table_changed"
+
+# Таблицы, из которых собирается каждый вид ответа
+PRODUCT_LIST_TABLES = ("products", "type_product")
+PRODUCT_TABLES = ("products", "product_materials", "materials")
+MATERIAL_LIST_TABLES = ("materials", "type_material")
+MATERIAL_TABLES = ("materials", "product_materials", "products")
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"{type(value).__name__} не сериализуется в JSON")
+
+
+def to_json(data):
+    return json.dumps(data, ensure_ascii=False, default=_json_default).encode("utf-8")
+
+
+class ResponseCache:
+    """Кэш готовых ответов (LRU) с поколениями таблиц.
+
+    Поколение таблицы увеличивается при каждом ее изменении; по поколениям
+    таблиц ответа строится его ETag. Ответ, при подготовке которого таблица
+    изменилась, в кэш не попадает.
+    """
+
+    def __init__(self, max_entries=2000):
+        self.max_entries = max_entries
+        self.boot = uuid.uuid4().hex[:8]  # ETag прошлого запуска службы не совпадет
+        self.generations = {}
+        self.entries = OrderedDict()  # ключ -> (ETag, тело, таблицы)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def etag(self, tables):
+        with self._lock:
+            versions = "-".join(str(self.generations.get(table, 0)) for table in tables)
+        return f'W/"{self.boot}-{versions}"'
+
+    def get(self, key, tables, build, encode=to_json):
+        """(ETag, тело ответа); build() готовит данные ответа при промахе кэша,
+        encode превращает их в хранимое значение (по умолчанию — тело JSON)"""
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0], entry[1]
+            self.misses += 1
+            versions = tuple(self.generations.get(table, 0) for table in tables)
+
+        body = encode(build())
+        etag = f'W/"{self.boot}-{"-".join(map(str, versions))}"'
+        with self._lock:
+            if versions == tuple(self.generations.get(table, 0) for table in tables):
+                self.entries[key] = (etag, body, tables)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+        return etag, body
+
+    def invalidate(self, *tables):
+        with self._lock:
+            for table in tables:
+                self.generations[table] = self.generations.get(table, 0) + 1
+            changed = set(tables)
+            for key in [key for key, entry in self.entries.items() if changed.intersection(entry[2])]:
+                del self.entries[key]
+
+    def clear(self):
+        """Сброс всего кэша (например, после потери уведомлений)"""
+        with self._lock:
+            tables = set(self.generations)
+            for entry in self.entries.values():
+                tables.update(entry[2])
+        self.invalidate(*tables)
+
+
+class DataService:
+    """Ответы службы: запросы к базе через пул соединений и кэш ответов"""
+
+    def __init__(self, pool_size=8):
+        self.pool = database.connection_pool(1, pool_size)
+        self.cache = ResponseCache()
+        # ThreadedConnectionPool не ждет свободного соединения, а сразу выдает ошибку
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._stop = threading.Event()
+        self._listener = None
+
+    def start(self):
+        conn = self.pool.getconn()
+        try:
+            database.ensure_schema(conn)
+        finally:
+            self.pool.putconn(conn)
+        self._listener = threading.Thread(target=self._listen, daemon=True)
+        self._listener.start()
+
+    def close(self):
+        self._stop.set()
+        if self._listener is not None:
+            self._listener.join()
+        self.pool.closeall()
+
+    @contextmanager
+    def cursor(self):
+        with self._slots:
+            conn = self.pool.getconn()
+            broken = False
+            try:
+                if not conn.autocommit:
+                    conn.set_session(readonly=True, autocommit=True)
+                cursor = conn.cursor()
+                try:
+                    yield cursor
+                finally:
+                    cursor.close()
+            except Exception:
+                broken = bool(conn.closed)
+                raise
+            finally:
+                self.pool.putconn(conn, close=broken)
+
+    def _listen(self):
+        """Поток уведомлений об изменении таблиц; после переподключения кэш сбрасывается"""
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = database.connect()
+                conn.autocommit = True
+                conn.cursor().execute(f"LISTEN {CHANNEL}")
+                # Изменения, пропущенные без соединения
+                self.cache.clear()
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], 1.0)[0]:
+                        conn.poll()
+                        tables = {notify.payload for notify in conn.notifies}
+                        conn.notifies.clear()
+                        if tables:
+                            self.cache.invalidate(*tables)
+            except Exception:
+                self._stop.wait(5.0)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    # --- Ответы ---
+
+    def product_list(self):
+        with self.cursor() as cursor:
+            statements.PRODUCTS_LIST.execute(cursor)
+            return [{"id": product_id, "type": type_name, "name": name, "min_cost": min_cost,
+                     "articul": articul, "width": width}
+                    for product_id, type_name, name, min_cost, articul, width in cursor.fetchall()]
+
+    def product(self, product_id):
+        with self.cursor() as cursor:
+            statements.PRODUCT_ROW.execute(cursor, (product_id,))
+            row = cursor.fetchone()
+            if row is None:
+                raise ApiError(HTTPStatus.NOT_FOUND, "Продукт не найден")
+            statements.PRODUCT_COMPOSITION.execute(cursor, (product_id,))
+            composition = cursor.fetchall()
+        articul, type_id, name, min_cost, width, _ = row
+        return {
+            "id": product_id, "articul": articul, "type_id": type_id, "name": name,
+            "min_cost": min_cost, "width": width,
+            "materials": [{"name": material_name, "quantity": quantity, "unit": unit, "cost": cost}
+                          for material_name, quantity, unit, cost in composition],
+        }
+
+    def material_list(self, low_stock_only=False):
+        statement = statements.MATERIALS_LOW_STOCK_LIST if low_stock_only else statements.MATERIALS_LIST
+        with self.cursor() as cursor:
+            statement.execute(cursor)
+            return [{"id": material_id, "type": type_name, "name": name, "unit_price": unit_price,
+                     "stock_quantity": stock_quantity, "unit": unit, "low_stock": low_stock}
+                    for material_id, type_name, name, unit_price, stock_quantity, unit, low_stock
+                    in cursor.fetchall()]
+
+    def material(self, material_id):
+        with self.cursor() as cursor:
+            statements.MATERIAL_ROW.execute(cursor, (material_id,))
+            row = cursor.fetchone()
+            if row is None:
+                raise ApiError(HTTPStatus.NOT_FOUND, "Материал не найден")
+            statements.MATERIAL_USAGE.execute(cursor, (material_id,))
+            usage = cursor.fetchall()
+        name, type_id, unit_price, stock_quantity, min_quantity, package_quantity, unit, _ = row
+        return {
+            "id": material_id, "name": name, "type_id": type_id, "unit_price": unit_price,
+            "stock_quantity": stock_quantity, "min_quantity": min_quantity,
+            "package_quantity": package_quantity, "unit": unit,
+            "used_in": [{"product": product_name, "quantity": quantity}
+                        for product_name, quantity in usage],
+        }
+
+    def page(self, key, tables, load, offset, limit):
+        """Страница списка: сам список кэшируется целиком, страницы — отдельно"""
+        def build():
+            _, items = self.cache.get(key, tables, load, encode=tuple)
+            return {"items": list(items[offset:offset + limit]), "total": len(items),
+                    "offset": offset, "limit": limit,
+                    "next_offset": offset + limit if offset + limit < len(items) else None}
+        return (key, offset, limit), tables, build
+
+    def resolve(self, path, query):
+        """(ключ кэша, таблицы, build) для пути запроса"""
+        parts = [part for part in path.split("/") if part]
+        if len(parts) == 1 and parts[0] in ("products", "materials"):
+            offset = _int_param(query, "offset", 0, 0, None)
+            limit = _int_param(query, "limit", DEFAULT_LIMIT, 1, MAX_LIMIT)
+            if parts[0] == "products":
+                return self.page("products", PRODUCT_LIST_TABLES, self.product_list, offset, limit)
+            low_stock_only = query.get("low_stock", ["0"])[0] in ("1", "true")
+            return self.page(("materials", low_stock_only), MATERIAL_LIST_TABLES,
+                             lambda: self.material_list(low_stock_only), offset, limit)
+        if len(parts) == 2 and parts[0] in ("products", "materials"):
+            try:
+                row_id = int(parts[1])
+            except ValueError:
+                raise ApiError(HTTPStatus.NOT_FOUND, "Неверный идентификатор")
+            if parts[0] == "products":
+                return ("product", row_id), PRODUCT_TABLES, lambda: self.product(row_id)
+            return ("material", row_id), MATERIAL_TABLES, lambda: self.material(row_id)
+        raise ApiError(HTTPStatus.NOT_FOUND, "Неизвестный адрес")
+
+
+def _int_param(query, name, default, minimum, maximum):
+    values = query.get(name)
+    if not values:
+        return default
+    try:
+        value = int(values[0])
+    except ValueError:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"Параметр {name} должен быть целым числом")
+    if value < minimum or maximum is not None and value > maximum:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"Параметр {name} вне допустимого диапазона")
+    return value
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    server_version = "demvar-api"
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        service = self.server.service
+        url = urlsplit(self.path)
+        try:
+            key, tables, build = service.resolve(url.path, parse_qs(url.query))
+            etag = service.cache.etag(tables)
+            if etag in _etags(self.headers.get("If-None-Match", "")):
+                self.send_response(HTTPStatus.NOT_MODIFIED)
+                self.send_header("ETag", etag)
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+                return
+            etag, body = service.cache.get(key, tables, build)
+            self._send(HTTPStatus.OK, body, etag)
+        except ApiError as e:
+            self._send(e.status, to_json({"error": str(e)}))
+        except Exception as e:
+            self._send(HTTPStatus.SERVICE_UNAVAILABLE, to_json({"error": f"Ошибка базы данных: {e}"}))
+
+    def _send(self, status, body, etag=None):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if etag is not None:
+            self.send_header("ETag", etag)
+            # Клиент может хранить ответ, но перед использованием проверяет его по ETag
+            self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def _etags(header):
+    return {tag.strip() for tag in header.split(",") if tag.strip()}
+
+
+class ApiServer:
+    """HTTP-служба в фоновом потоке: start() и stop() для встраивания в другие программы"""
+
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, pool_size=8, verbose=False):
+        self.service = DataService(pool_size)
+        self.httpd = ThreadingHTTPServer((host, port), RequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.service = self.service
+        self.httpd.verbose = verbose
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.httpd.server_address[1]
+
+    def start(self):
+        self.service.start()
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self._thread.join()
+        self.service.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальная служба чтения данных (JSON)")
+    parser.add_argument("--host", default="127.0.0.1", help="адрес (по умолчанию только этот компьютер)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--pool-size", type=int, default=8, help="соединений с базой")
+    parser.add_argument("--verbose", action="store_true", help="выводить каждый запрос")
+    args = parser.parse_args()
+
+    server = ApiServer(args.host, args.port, args.pool_size, args.verbose)
+    server.service.start()
+    print(f"Служба запущена: http://{args.host}:{server.port}/products")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        server.service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""Архив продукции и материалов (мягкое удаление).
+
+Снятая с производства продукция и неиспользуемые материалы не удаляются, а
+отмечаются временем переноса в архив (archived_at). Списки, поиск дефицита,
+показатели и моделирование цен читают только строки в работе — через
+частичные индексы WHERE archived_at IS NULL (см. database.SCHEMA_STATEMENTS),
+поэтому их скорость зависит от размера рабочего каталога, а не от всей
+истории. Строку можно вернуть из архива; перенос и возврат записываются в
+журнал изменений.
+
+Строки, которые находятся в архиве дольше заданного срока, можно перенести в
+таблицы products_archive и materials_archive, чтобы основные таблицы не
+росли:
+
+    python archive.py --older-than 365
+"""
+import argparse
+import datetime
+import sys
+
+import statements
+
+PRODUCTS = "products"
+MATERIALS = "materials"
+
+_SET_ARCHIVED = {
+    PRODUCTS: statements.PRODUCT_SET_ARCHIVED_SQL,
+    MATERIALS: statements.MATERIAL_SET_ARCHIVED_SQL,
+}
+
+
+def set_archived(connection, table, row_id, archived=True):
+    """Переносит строку в архив (archived=False — возвращает в работу).
+
+    Возвращает False, если строка уже была в этом состоянии или удалена.
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute(_SET_ARCHIVED[table], (archived, row_id, archived))
+        changed = cursor.fetchone()[0] > 0
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+    return changed
+
+
+def move_old(connection, older_than):
+    """Переносит строки, находящиеся в архиве дольше older_than (timedelta),
+    в таблицы *_archive одной транзакцией: (продукции, материалов)"""
+    before = datetime.datetime.now(datetime.timezone.utc) - older_than
+    cursor = connection.cursor()
+    try:
+        # Сначала продукция: состав перенесенной продукции освобождает материалы
+        cursor.execute(statements.ARCHIVE_MOVE_PRODUCTS_SQL, {"before": before})
+        products = cursor.fetchone()[0]
+        cursor.execute(statements.ARCHIVE_MOVE_MATERIALS_SQL, {"before": before})
+        materials = cursor.fetchone()[0]
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+    return products, materials
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Перенос давно архивных строк в таблицы архива")
+    parser.add_argument("--older-than", type=int, default=365, metavar="DAYS",
+                        help="сколько дней строка должна пробыть в архиве")
+    args = parser.parse_args()
+
+    import database
+    conn = database.connect()
+    try:
+        database.ensure_schema(conn)
+        products, materials = move_old(conn, datetime.timedelta(days=args.older_than))
+    finally:
+        conn.close()
+    print(f"Перенесено в таблицы архива: продукции {products}, материалов {materials}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,233 @@
+"""Журнал изменений данных (аудит).
+
+Каждое изменение продукта или материала записывается в таблицу audit_log:
+кто (имя клиента, см. database.CLIENT_NAME), когда, откуда (источник) и
+образы строки до и после изменения. Для изменений хранятся только поля,
+значения которых поменялись; для новых строк — все поля.
+
+Сохранение из диалога не ждет записи в журнал: AuditWriter.record только
+кладет изменение в очередь в памяти, а фоновый поток со своим подключением
+записывает накопленные изменения пачками, одной командой на пачку. Образ
+«до» берется из строки, которую диалог прочитал при открытии: UPDATE
+выполняется с проверкой версии (conflicts.py), поэтому при успешном
+сохранении строка в базе до изменения совпадает с ней.
+
+Пересчет цен изменяет сразу все строки, поэтому он пишет в журнал тем же
+запросом, что и цены (statements.INSERT_REPRICED_AUDIT_SQL), без передачи
+строк в приложение и обратно.
+
+Таблица секционирована по месяцам, поиск по сущности и времени — через
+индекс (entity, entity_id, changed_at):
+
+    cursor = conn.cursor()
+    for changed_at, action, actor, source, before, after in audit.history(
+            cursor, audit.ENTITY_MATERIAL, 7):
+        ...
+"""
+import datetime
+import threading
+from collections import deque
+from decimal import Decimal
+
+import database
+import statements
+
+ENTITY_PRODUCT = "product"
+ENTITY_MATERIAL = "material"
+
+ACTION_INSERT = "I"
+ACTION_UPDATE = "U"
+ACTION_DELETE = "D"
+
+SOURCE_EDIT = "edit"
+SOURCE_WRITE_BEHIND = "write_behind"
+SOURCE_REPRICING = "repricing"
+SOURCE_SIMULATION = "simulation"
+SOURCE_MERGE = "merge"
+
+# Столбцы образов строк в порядке запросов statements.PRODUCT_ROW и MATERIAL_ROW
+COLUMNS = {
+    ENTITY_PRODUCT: ("acrticul", "id_type_product", "product_name", "min_cost", "width"),
+    ENTITY_MATERIAL: ("material_name", "id_type_material", "unit_price", "stock_quantity",
+                      "min_quantity", "package_quantity", "unit"),
+}
+
+INSERT_SQL = """
+    INSERT INTO audit_log (entity, entity_id, action, changed_at, source, before_row, after_row)
+    VALUES %s"""
+
+
+def _json_value(value):
+    # numeric(12, 2) и меньше точно представляются в double precision
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+
+def row_images(entity, before, after):
+    """Образы строки (до, после) в виде словарей столбец -> значение.
+
+    Если строка до изменения неизвестна (новая строка), образ «после»
+    содержит все поля, иначе — только поля с другими значениями.
+    None — изменений нет.
+    """
+    columns = COLUMNS[entity]
+    after = [_json_value(value) for value in after]
+    if before is None:
+        return None, dict(zip(columns, after))
+    before = [_json_value(value) for value in before]
+    changed = [index for index, (old, new) in enumerate(zip(before, after)) if old != new]
+    if not changed:
+        return None
+    return ({columns[index]: before[index] for index in changed},
+            {columns[index]: after[index] for index in changed})
+
+
+def write_entries(cursor, entries):
+    """Записывает изменения (см. AuditWriter.record) одной командой на страницу"""
+    from psycopg2.extras import Json, execute_values
+
+    rows = []
+    for entity, entity_id, action, changed_at, source, before, after in entries:
+        images = row_images(entity, before, after)
+        if images is None:
+            continue
+        before_row, after_row = images
+        rows.append((entity, entity_id, action, changed_at, source,
+                     None if before_row is None else Json(before_row), Json(after_row)))
+    if not rows:
+        return 0
+    # Пачка охватывает секунды, поэтому секций нужно не больше двух (на границе месяца)
+    for moment in {min(row[3] for row in rows), max(row[3] for row in rows)}:
+        statements.ENSURE_AUDIT_LOG_PARTITION.execute(cursor, (moment,))
+    execute_values(cursor, INSERT_SQL, rows, page_size=1000)
+    return len(rows)
+
+
+def history(cursor, entity, entity_id, since=None, until=None):
+    """Изменения строки за период (по умолчанию — все), от старых к новым"""
+    statements.AUDIT_HISTORY.execute(
+        cursor, (entity, entity_id, since or "-infinity", until or "infinity"))
+    return cursor.fetchall()
+
+
+class AuditWriter:
+    """Фоновая запись журнала изменений пачками.
+
+    record() вызывается сразу после фиксации транзакции с изменением и
+    только добавляет запись в очередь. Поток записывает очередь раз в
+    interval секунд или сразу, когда накопилось batch_size записей. Если
+    база недоступна, записи остаются в очереди (не больше max_pending,
+    самые старые отбрасываются и считаются в dropped) до следующей попытки.
+    Записи, которые база отклонила по другой причине (ошибка данных),
+    отбрасываются, чтобы не задерживать остальные: они считаются в
+    rejected, последняя ошибка — в last_error.
+    """
+
+    def __init__(self, interval=1.0, batch_size=500, max_pending=100000):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.dropped = 0
+        self.rejected = 0
+        self.last_error = None
+        self._queue = deque(maxlen=max_pending)
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._connection = None
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        """Записывает оставшуюся очередь и останавливает поток"""
+        if self._thread is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def record(self, entity, entity_id, action, source, before, after):
+        """Ставит изменение в очередь: before и after — поля строки в порядке COLUMNS
+        (before — None для новой строки или если строка до изменения неизвестна)"""
+        if len(self._queue) == self._queue.maxlen:
+            self.dropped += 1
+        self._queue.append((entity, entity_id, action, datetime.datetime.now(datetime.timezone.utc),
+                            source, before, after))
+        if len(self._queue) >= self.batch_size:
+            self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            stopping = self._stopping
+            while self._queue:
+                if not self._flush():
+                    break
+            if stopping:
+                break
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _flush(self):
+        import psycopg2
+
+        entries = []
+        while self._queue and len(entries) < self.batch_size:
+            entries.append(self._queue.popleft())
+        try:
+            self._write(entries)
+            return True
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            self._requeue(entries)
+            return False
+        except Exception as e:
+            if len(entries) == 1:
+                self.rejected += 1
+                self.last_error = e
+                return True
+        # Пачка отклонена: записи пишутся по одной, отбрасываются только отклоненные
+        for number, entry in enumerate(entries):
+            try:
+                self._write([entry])
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                self._requeue(entries[number:])
+                return False
+            except Exception as e:
+                self.rejected += 1
+                self.last_error = e
+        return True
+
+    def _write(self, entries):
+        if self._connection is None:
+            self._connection = database.connect()
+        cursor = self._connection.cursor()
+        try:
+            write_entries(cursor, entries)
+            self._connection.commit()
+        except Exception:
+            self._connection.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    def _requeue(self, entries):
+        """Нет соединения: записи возвращаются в начало очереди до следующей попытки"""
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except Exception:
+                pass
+            self._connection = None
+        # В полной очереди отбрасываются самые старые записи, как и в record()
+        overflow = len(entries) + len(self._queue) - self._queue.maxlen
+        if overflow > 0:
+            self.dropped += overflow
+            entries = entries[overflow:]
+        self._queue.extendleft(reversed(entries))
@@ -0,0 +1,30 @@
+"""Оптимистическая блокировка при сохранении из диалогов.
+
+Версия строки — системный столбец PostgreSQL xmin: он меняется при каждой
+записи строки с любого рабочего места (в том числе при пересчете цен), поэтому
+отдельный столбец версии и триггеры не нужны. Диалог запоминает версию при
+открытии, а UPDATE выполняется с условием xmin = версия. Если строку успели
+изменить, обновится ноль строк, ничего не блокируется и не перезаписывается,
+а пользователю показываются различия по полям.
+"""
+from decimal import Decimal
+
+# Поля диалогов в порядке запросов statements.PRODUCT_ROW и MATERIAL_ROW
+PRODUCT_FIELDS = ("Артикул", "Тип продукта", "Наименование", "Мин. стоимость", "Ширина")
+MATERIAL_FIELDS = ("Наименование", "Тип материала", "Цена за единицу", "Количество на складе",
+                   "Минимальное количество", "Количество в упаковке", "Единица измерения")
+
+
+def normalized(value):
+    """Значение для сравнения: числа — с точностью полей диалога (2 знака)"""
+    if isinstance(value, (float, Decimal)):
+        return round(float(value), 2)
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+
+def field_differences(labels, mine, theirs):
+    """Построчное сравнение: (поле, мое значение, значение в базе, различается)"""
+    return [(label, my_value, their_value, normalized(my_value) != normalized(their_value))
+            for label, my_value, their_value in zip(labels, mine, theirs)]
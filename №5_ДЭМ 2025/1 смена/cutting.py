@@ -0,0 +1,443 @@
+"""Раскрой рулонов на полосы по ширине продукции (одномерный раскрой).
+
+Заказ — ширины полос (ширина продукции, м) и их количество, на складе —
+рулоны одной или нескольких ширин. Результат — схемы раскроя (какие полосы
+режутся из рулона и сколько рулонов режется по схеме), отход в процентах и
+потребность в рулонах каждой ширины.
+
+Два способа:
+- first_fit_decreasing — «первый подходящий по убыванию»: полосы от широких
+  к узким кладутся в первый рулон, где хватает места; быстро при любом
+  числе полос;
+- generate_patterns — генерация схем (метод Гилмора — Гомори): схемы
+  раскроя подбираются решением задачи о рюкзаке по двойственным оценкам
+  полос, пока они уменьшают расход рулонов; отход обычно меньше, время
+  ограничено PATTERN_TIME_LIMIT.
+
+Ширины переводятся в целые миллиметры (см. money.scaled), ширина реза
+(kerf) добавляется между соседними полосами.
+
+    python cutting.py --rolls 1.06 0.53 --order 1=120 5=300 --method patterns
+"""
+import argparse
+import math
+import sys
+import time
+from array import array
+from collections import Counter
+
+import money
+import statements
+
+WIDTH_DIGITS = 3  # ширины в миллиметрах
+
+METHOD_FFD = "ffd"
+METHOD_PATTERNS = "patterns"
+
+# Ограничение времени построения схем, с
+PATTERN_TIME_LIMIT = 0.8
+
+
+def to_units(width):
+    return money.scaled(width, WIDTH_DIGITS)
+
+
+def to_meters(units):
+    return units / 10 ** WIDTH_DIGITS
+
+
+class CuttingPattern:
+    """Схема раскроя: ширина рулона, полосы {ширина: число} и число рулонов по схеме"""
+
+    __slots__ = ("roll_width", "cuts", "count", "kerf")
+
+    def __init__(self, roll_width, cuts, count, kerf=0):
+        self.roll_width = roll_width
+        self.cuts = dict(sorted(cuts.items(), reverse=True))
+        self.count = count
+        self.kerf = kerf
+
+    @property
+    def pieces(self):
+        return sum(self.cuts.values())
+
+    @property
+    def used(self):
+        """Занятая ширина рулона вместе с резами, в единицах WIDTH_DIGITS"""
+        return sum(width * count for width, count in self.cuts.items()) + self.kerf * (self.pieces - 1)
+
+    @property
+    def waste(self):
+        return self.roll_width - self.used
+
+    def describe(self):
+        cuts = " + ".join(f"{count} × {to_meters(width):g}" for width, count in self.cuts.items())
+        return (f"{self.count} рул. по {to_meters(self.roll_width):g} м: {cuts} "
+                f"(отход {to_meters(self.waste):g} м)")
+
+
+class CuttingPlan:
+    """Результат раскроя"""
+
+    def __init__(self, method, patterns):
+        self.method = method
+        self.patterns = sorted(patterns, key=lambda pattern: (-pattern.count, pattern.waste))
+
+    @property
+    def rolls(self):
+        return sum(pattern.count for pattern in self.patterns)
+
+    @property
+    def rolls_by_width(self):
+        """Потребность в рулонах: {ширина рулона: число рулонов}"""
+        needs = Counter()
+        for pattern in self.patterns:
+            needs[pattern.roll_width] += pattern.count
+        return dict(sorted(needs.items(), reverse=True))
+
+    @property
+    def waste_percent(self):
+        total = sum(pattern.roll_width * pattern.count for pattern in self.patterns)
+        waste = sum(pattern.waste * pattern.count for pattern in self.patterns)
+        return 100.0 * waste / total if total else 0.0
+
+    def packages_needed(self, package_quantity):
+        """Упаковки рулонов каждой ширины при package_quantity рулонов в упаковке"""
+        return {width: -(-rolls // package_quantity) for width, rolls in self.rolls_by_width.items()}
+
+
+def _demand(order):
+    """Заказ [(ширина, количество)] -> {ширина в единицах: количество}"""
+    demand = Counter()
+    for width, quantity in order:
+        if quantity < 0:
+            raise ValueError("Количество полос не может быть отрицательным")
+        units = to_units(width)
+        if units <= 0:
+            raise ValueError("Ширина полосы должна быть положительной")
+        demand[units] += int(quantity)
+    return {width: quantity for width, quantity in demand.items() if quantity}
+
+
+def _check(demand, roll_widths):
+    if not roll_widths:
+        raise ValueError("Не заданы ширины рулонов")
+    widest = max(roll_widths)
+    too_wide = [width for width in demand if width > widest]
+    if too_wide:
+        raise ValueError(f"Полоса {to_meters(max(too_wide)):g} м шире самого широкого рулона")
+
+
+def _aggregate(contents, roll_widths, kerf):
+    """Одинаковые рулоны -> схемы; каждый рулон заменяется самым узким, в который он помещается"""
+    patterns = Counter()
+    for cuts in contents:
+        used = sum(cuts) + kerf * (len(cuts) - 1)
+        roll_width = min(width for width in roll_widths if width >= used)
+        patterns[(roll_width, tuple(sorted(Counter(cuts).items())))] += 1
+    return [CuttingPattern(roll_width, dict(cuts), count, kerf)
+            for (roll_width, cuts), count in patterns.items()]
+
+
+def first_fit_decreasing(order, roll_widths, kerf=0):
+    """Раскрой «первый подходящий по убыванию».
+
+    Рулоны открываются самой большой ширины; после раскладки каждый рулон
+    заменяется самым узким подходящим. Первый рулон с достаточным остатком
+    ищется по дереву максимумов остатков, поэтому раскладка n полос занимает
+    O(n log n).
+    """
+    roll_widths = sorted({to_units(width) for width in roll_widths})
+    kerf = to_units(kerf)
+    demand = _demand(order)
+    _check(demand, roll_widths)
+    total = sum(demand.values())
+    if not total:
+        return CuttingPlan(METHOD_FFD, [])
+
+    # Ширина реза прибавляется к каждой полосе и к рулону (после последней полосы реза нет)
+    capacity = roll_widths[-1] + kerf
+    size = 1
+    while size < total:
+        size *= 2
+    tree = array("q", [capacity]) * (2 * size)
+    contents = []
+    for width in sorted(demand, reverse=True):
+        need = width + kerf
+        for _ in range(demand[width]):
+            node = 1
+            while node < size:
+                node *= 2
+                if tree[node] < need:
+                    node += 1
+            roll = node - size
+            if roll == len(contents):
+                contents.append([])
+            contents[roll].append(width)
+            tree[node] -= need
+            node //= 2
+            while node:
+                tree[node] = max(tree[2 * node], tree[2 * node + 1])
+                node //= 2
+    return CuttingPlan(METHOD_FFD, _aggregate(contents, roll_widths, kerf))
+
+
+def _knapsack(values, weights, bounds, capacity):
+    """Ограниченный рюкзак: (наибольшая сумма values[i] * a[i], a) при
+    sum(weights[i] * a[i]) <= capacity и a[i] <= bounds[i].
+
+    Кратные предметы разбиваются на группы 1, 2, 4, ... штук, таблица по
+    вместимости пересчитывается целиком для каждой группы.
+    """
+    best = [0.0] * (capacity + 1)
+    history = []
+    for index, (value, weight, bound) in enumerate(zip(values, weights, bounds)):
+        if value <= 0:
+            continue
+        bound = min(bound, capacity // weight)
+        chunk = 1
+        while bound > 0:
+            take = min(chunk, bound)
+            chunk_weight, chunk_value = weight * take, value * take
+            history.append((best, index, take, chunk_weight))
+            best = best[:chunk_weight] + [
+                kept if kept >= added + chunk_value else added + chunk_value
+                for kept, added in zip(best[chunk_weight:], best)]
+            bound -= take
+            chunk *= 2
+    counts = [0] * len(values)
+    rest, after = capacity, best
+    for before, index, take, chunk_weight in reversed(history):
+        if after[rest] != before[rest]:
+            counts[index] += take
+            rest -= chunk_weight
+        after = before
+    return best[capacity], counts
+
+
+def _solve_relaxation(widths, demand, roll_widths, kerf, deadline):
+    """Генерация схем (Гилмор — Гомори) для непрерывной задачи раскроя.
+
+    Задача: минимум суммарной ширины рулонов sum(R_p * x_p) при условии, что
+    схемы p дают не меньше demand[i] полос каждой ширины. Решается
+    модифицированным симплекс-методом с явной обратной матрицей базиса;
+    новая схема — решение рюкзака с ценностями из двойственных оценок.
+    Начальный базис — однородные схемы, поэтому решение допустимо на каждом
+    шаге и расчет можно прервать по deadline. Возвращает [(ширина рулона,
+    полосы по индексам widths, x_p)].
+    """
+    size = len(widths)
+    needs = [width + kerf for width in widths]
+    gcd = 0
+    for value in needs + [roll_width + kerf for roll_width in roll_widths]:
+        gcd = math.gcd(gcd, value)
+    needs_reduced = [need // gcd for need in needs]
+
+    widest = roll_widths[-1]
+    columns = []  # (ширина рулона, полосы)
+    for index in range(size):
+        counts = [0] * size
+        counts[index] = min(demand[index], (widest + kerf) // needs[index])
+        columns.append((widest, counts))
+    basis = list(range(size))
+    inverse = [[1.0 / columns[row][1][row] if row == col else 0.0 for col in range(size)]
+               for row in range(size)]
+    values = [demand[row] / columns[row][1][row] for row in range(size)]
+
+    def vector(column):
+        # Отрицательный номер — избыток полос ширины -column - 1
+        if column < 0:
+            result = [0.0] * size
+            result[-column - 1] = -1.0
+            return result
+        return columns[column][1]
+
+    def cost(column):
+        return 0.0 if column < 0 else columns[column][0]
+
+    epsilon = 1e-9
+    for _ in range(100 * size + 1000):
+        if time.perf_counter() > deadline:
+            break
+        basic_costs = [cost(column) for column in basis]
+        duals = [sum(basic_costs[row] * inverse[row][col] for row in range(size)) for col in range(size)]
+
+        entering = None
+        negative = [index for index, dual in enumerate(duals) if dual < -epsilon]
+        if negative:
+            entering = -negative[0] - 1
+        else:
+            best_reduced = -epsilon
+            in_basis = set(basis)
+            for column, (roll_width, counts) in enumerate(columns):
+                if column in in_basis:
+                    continue
+                reduced = roll_width - sum(dual * count for dual, count in zip(duals, counts))
+                if reduced < best_reduced * roll_width:
+                    best_reduced, entering = reduced / roll_width, column
+        if entering is None:
+            best_ratio, candidate = 1.0 + epsilon, None
+            for roll_width in roll_widths:
+                value, counts = _knapsack(duals, needs_reduced, demand, (roll_width + kerf) // gcd)
+                if value / roll_width > best_ratio:
+                    best_ratio, candidate = value / roll_width, (roll_width, counts)
+            if candidate is None:
+                break
+            columns.append(candidate)
+            entering = len(columns) - 1
+
+        column_vector = vector(entering)
+        direction = [sum(inverse[row][col] * column_vector[col] for col in range(size) if column_vector[col])
+                     for row in range(size)]
+        leaving, best_step = None, None
+        for row in range(size):
+            if direction[row] > epsilon:
+                step = values[row] / direction[row]
+                if best_step is None or step < best_step - epsilon:
+                    leaving, best_step = row, step
+        if leaving is None:
+            break
+
+        pivot = direction[leaving]
+        for row in range(size):
+            if row != leaving and direction[row]:
+                factor = direction[row] / pivot
+                values[row] -= factor * values[leaving]
+                inverse_row, leaving_row = inverse[row], inverse[leaving]
+                for col in range(size):
+                    inverse_row[col] -= factor * leaving_row[col]
+        values[leaving] /= pivot
+        inverse[leaving] = [value / pivot for value in inverse[leaving]]
+        basis[leaving] = entering
+
+    return [(columns[column][0], columns[column][1], values[row])
+            for row, column in enumerate(basis) if column >= 0 and values[row] > epsilon]
+
+
+def _trim(contents, demand):
+    """Убирает из раскладки лишние полосы, которые дали округленные схемы"""
+    produced = Counter()
+    for cuts in contents:
+        produced.update(cuts)
+    surplus = {width: produced[width] - demand.get(width, 0) for width in produced}
+    for cuts in contents:
+        for width in list(cuts):
+            extra = min(surplus.get(width, 0), cuts[width])
+            if extra > 0:
+                cuts[width] -= extra
+                surplus[width] -= extra
+                if not cuts[width]:
+                    del cuts[width]
+    return [cuts for cuts in contents if cuts]
+
+
+def generate_patterns(order, roll_widths, kerf=0, time_limit=PATTERN_TIME_LIMIT):
+    """Раскрой по схемам, построенным генерацией столбцов.
+
+    Непрерывная задача решается генерацией схем (_solve_relaxation), число
+    рулонов по каждой схеме округляется вниз, а оставшиеся полосы
+    раскладываются «первым подходящим по убыванию». Если раскладка
+    first_fit_decreasing всего заказа тратит меньше рулонов по ширине,
+    возвращается она.
+    """
+    deadline = time.perf_counter() + time_limit
+    fallback = first_fit_decreasing(order, roll_widths, kerf)
+    roll_widths = sorted({to_units(width) for width in roll_widths})
+    kerf = to_units(kerf)
+    demand = _demand(order)
+    if not demand:
+        return fallback
+
+    widths = sorted(demand, reverse=True)
+    relaxation = _solve_relaxation(widths, [demand[width] for width in widths], roll_widths, kerf, deadline)
+
+    # Рулоны по округленным вниз схемам: Counter полос на каждый рулон
+    contents = []
+    for roll_width, counts, amount in relaxation:
+        cuts = Counter({widths[index]: count for index, count in enumerate(counts) if count})
+        contents.extend(Counter(cuts) for _ in range(int(amount + 1e-9)))
+    contents = _trim(contents, demand)
+
+    produced = Counter()
+    for cuts in contents:
+        produced.update(cuts)
+    rest = [(to_meters(width), demand[width] - produced[width])
+            for width in widths if demand[width] > produced[width]]
+    patterns = _aggregate([list(cuts.elements()) for cuts in contents], roll_widths, kerf)
+    if rest:
+        patterns += first_fit_decreasing(rest, [to_meters(width) for width in roll_widths],
+                                         to_meters(kerf)).patterns
+
+    # Одинаковые схемы из двух частей объединяются
+    merged = {}
+    for pattern in patterns:
+        key = (pattern.roll_width, tuple(pattern.cuts.items()))
+        if key in merged:
+            merged[key].count += pattern.count
+        else:
+            merged[key] = pattern
+    plan = CuttingPlan(METHOD_PATTERNS, list(merged.values()))
+    if _material(fallback) < _material(plan):
+        return fallback
+    return plan
+
+
+def _material(plan):
+    return sum(pattern.roll_width * pattern.count for pattern in plan.patterns)
+
+
+def optimize(order, roll_widths, method=METHOD_FFD, kerf=0):
+    """Раскрой заказа [(ширина, количество)] из рулонов roll_widths (ширины в метрах)"""
+    if method == METHOD_FFD:
+        return first_fit_decreasing(order, roll_widths, kerf)
+    if method == METHOD_PATTERNS:
+        return generate_patterns(order, roll_widths, kerf)
+    raise ValueError(f"Неизвестный способ раскроя: {method}")
+
+
+def order_from_products(cursor, quantities):
+    """Заказ по продукции {id_product: число полос} -> [(ширина, количество)]"""
+    statements.PRODUCT_WIDTHS.execute(cursor, (list(quantities),))
+    widths = dict(cursor.fetchall())
+    missing = [product_id for product_id in quantities if product_id not in widths]
+    if missing:
+        raise ValueError(f"Не найдена продукция: {', '.join(map(str, missing))}")
+    return [(widths[product_id], quantity) for product_id, quantity in quantities.items()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Раскрой рулонов по ширине продукции")
+    parser.add_argument("--rolls", nargs="+", required=True, help="ширины рулонов, м")
+    parser.add_argument("--order", nargs="+", required=True,
+                        help="заказ: id_продукта=число_полос (или ширина_м=число с --widths)")
+    parser.add_argument("--widths", action="store_true", help="в заказе ширины вместо id продукции")
+    parser.add_argument("--method", choices=(METHOD_FFD, METHOD_PATTERNS), default=METHOD_FFD)
+    parser.add_argument("--kerf", default="0", help="ширина реза, м")
+    parser.add_argument("--package-quantity", type=int, default=None, help="рулонов в упаковке")
+    args = parser.parse_args()
+
+    pairs = [item.split("=", 1) for item in args.order]
+    if args.widths:
+        order = [(width, int(quantity)) for width, quantity in pairs]
+    else:
+        import database
+        conn = database.connect()
+        try:
+            order = order_from_products(conn.cursor(), {int(key): int(value) for key, value in pairs})
+        finally:
+            conn.close()
+
+    plan = optimize(order, args.rolls, args.method, args.kerf)
+    for pattern in plan.patterns:
+        print(pattern.describe())
+    print(f"Рулонов: {plan.rolls}, отход: {plan.waste_percent:.2f} %")
+    for width, rolls in plan.rolls_by_width.items():
+        line = f"  {to_meters(width):g} м: {rolls} рул."
+        if args.package_quantity:
+            line += f" ({plan.packages_needed(args.package_quantity)[width]} уп.)"
+        print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
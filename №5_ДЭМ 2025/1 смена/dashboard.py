@@ -0,0 +1,36 @@
+"""Показатели главной страницы из материализованного представления dashboard_summary"""
+import statements
+
+
+class DashboardSummary:
+    """Показатели: продукция по типам, стоимость запасов, дефицит материалов"""
+
+    def __init__(self, rows=()):
+        self.product_types = []  # (тип, число продуктов, средняя стоимость)
+        self.inventory_value = 0
+        self.low_stock_count = 0
+        for kind, label, item_count, amount in rows:
+            if kind == "materials":
+                self.low_stock_count = item_count
+                self.inventory_value = amount
+            else:
+                self.product_types.append((label, item_count, amount))
+
+    @property
+    def product_count(self):
+        return sum(count for _, count, _ in self.product_types)
+
+
+def fetch_summary(cursor):
+    """Читает показатели одним запросом к материализованному представлению"""
+    statements.DASHBOARD_SUMMARY.execute(cursor)
+    return DashboardSummary(cursor.fetchall())
+
+
+def refresh(conn):
+    """Пересчитывает представление; соединение должно быть в режиме autocommit"""
+    cursor = conn.cursor()
+    try:
+        statements.DASHBOARD_REFRESH.execute(cursor)
+    finally:
+        cursor.close()
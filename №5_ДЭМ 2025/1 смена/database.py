@@ -0,0 +1,227 @@
+"""Подключение к базе данных demvar и служебные таблицы приложения"""
+import getpass
+import socket
+
+# Параметры подключения к PostgreSQL
+DB_CONFIG = {
+    "dbname": "demvar",
+    "user": "postgres",
+    "password": "toor",
+    "host": "localhost",
+    "port": "5432",
+}
+
+# Имя рабочего места в сессиях PostgreSQL (application_name): по нему журнал
+# изменений (audit.py) отмечает, кто изменил данные
+CLIENT_NAME = f"{getpass.getuser()}@{socket.gethostname()}"[:63]
+
+# Таблицы, которые приложение создает само, если их еще нет в базе
+SCHEMA_STATEMENTS = [
+    # Состав продукции: какие материалы и в каком количестве нужны на единицу продукции
+    """CREATE TABLE IF NOT EXISTS product_materials (
+        id_product integer NOT NULL REFERENCES products(id_product) ON DELETE CASCADE,
+        id_material integer NOT NULL REFERENCES materials(id_material) ON DELETE CASCADE,
+        required_quantity numeric(12, 4) NOT NULL DEFAULT 0,
+        PRIMARY KEY (id_product, id_material)
+    )""",
+    # Правила ценообразования по типам продукции
+    """CREATE TABLE IF NOT EXISTS pricing_rules (
+        id_type_product integer PRIMARY KEY
+            REFERENCES type_product(id_type_product) ON DELETE CASCADE,
+        formula text NOT NULL DEFAULT 'width * base_cost * coefficient',
+        base_cost numeric(12, 2) NOT NULL DEFAULT 100,
+        markup_percent numeric(6, 2) NOT NULL DEFAULT 0,
+        min_price numeric(12, 2) NOT NULL DEFAULT 0,
+        rounding_step numeric(12, 2) NOT NULL DEFAULT 0.01 CHECK (rounding_step > 0),
+        updated_at timestamp NOT NULL DEFAULT now()
+    )""",
+    # История цен продукции, секционированная по месяцам
+    """CREATE TABLE IF NOT EXISTS product_price_history (
+        id_product integer NOT NULL,
+        min_cost numeric(12, 2) NOT NULL,
+        valid_from timestamptz NOT NULL DEFAULT now(),
+        source varchar(20) NOT NULL
+    ) PARTITION BY RANGE (valid_from)""",
+    """CREATE TABLE IF NOT EXISTS product_price_history_default
+        PARTITION OF product_price_history DEFAULT""",
+    """CREATE INDEX IF NOT EXISTS product_price_history_product_idx
+        ON product_price_history (id_product, valid_from)""",
+    # Секция за месяц создается перед первой записью в этом месяце
+    """CREATE OR REPLACE FUNCTION ensure_price_history_partition(moment timestamptz)
+    RETURNS void AS $$
+    DECLARE
+        month_start date := date_trunc('month', moment)::date;
+        partition_name text := 'product_price_history_' || to_char(month_start, 'YYYY_MM');
+    BEGIN
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF product_price_history FOR VALUES FROM (%L) TO (%L)',
+                partition_name, month_start, (month_start + interval '1 month')::date
+            );
+        END IF;
+    EXCEPTION
+        -- Секцию одновременно создало другое рабочее место
+        WHEN duplicate_table THEN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    # Журнал изменений продукции и материалов (audit.py), секционированный по месяцам.
+    # Образы строк содержат только измененные поля
+    """CREATE TABLE IF NOT EXISTS audit_log (
+        entity varchar(10) NOT NULL,
+        entity_id integer NOT NULL,
+        action char(1) NOT NULL,
+        changed_at timestamptz NOT NULL DEFAULT now(),
+        actor varchar(63) NOT NULL DEFAULT current_setting('application_name'),
+        source varchar(20) NOT NULL,
+        before_row jsonb,
+        after_row jsonb NOT NULL
+    ) PARTITION BY RANGE (changed_at)""",
+    """CREATE TABLE IF NOT EXISTS audit_log_default
+        PARTITION OF audit_log DEFAULT""",
+    """CREATE INDEX IF NOT EXISTS audit_log_entity_idx
+        ON audit_log (entity, entity_id, changed_at)""",
+    """CREATE OR REPLACE FUNCTION ensure_audit_log_partition(moment timestamptz)
+    RETURNS void AS $$
+    DECLARE
+        month_start date := date_trunc('month', moment)::date;
+        partition_name text := 'audit_log_' || to_char(month_start, 'YYYY_MM');
+    BEGIN
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF audit_log FOR VALUES FROM (%L) TO (%L)',
+                partition_name, month_start, (month_start + interval '1 month')::date
+            );
+        END IF;
+    EXCEPTION
+        WHEN duplicate_table THEN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    # Запуски параллельного пересчета цен и их секции (для продолжения после сбоя)
+    """CREATE TABLE IF NOT EXISTS repricing_runs (
+        id_run serial PRIMARY KEY,
+        started_at timestamptz NOT NULL DEFAULT now(),
+        finished_at timestamptz
+    )""",
+    """CREATE TABLE IF NOT EXISTS repricing_shards (
+        id_run integer NOT NULL REFERENCES repricing_runs(id_run) ON DELETE CASCADE,
+        shard_no integer NOT NULL,
+        id_from integer NOT NULL,
+        id_to integer NOT NULL,
+        status varchar(10) NOT NULL DEFAULT 'pending',
+        updated_count integer NOT NULL DEFAULT 0,
+        error text,
+        PRIMARY KEY (id_run, shard_no)
+    )""",
+    # Архив (archive.py): время переноса строки в архив, NULL — строка в работе
+    """ALTER TABLE products ADD COLUMN IF NOT EXISTS archived_at timestamptz""",
+    """ALTER TABLE materials ADD COLUMN IF NOT EXISTS archived_at timestamptz""",
+    # Частичные индексы только по строкам в работе: списки читаются в порядке
+    # наименования без архивных строк, и индексы не растут вместе с архивом
+    """CREATE INDEX IF NOT EXISTS products_active_name_idx
+        ON products (product_name) WHERE archived_at IS NULL""",
+    """CREATE INDEX IF NOT EXISTS materials_active_name_idx
+        ON materials (material_name) WHERE archived_at IS NULL""",
+    # Давно архивные строки переносятся в отдельные таблицы (archive.move_old),
+    # продукция — вместе с составом
+    """CREATE TABLE IF NOT EXISTS products_archive (
+        LIKE products,
+        moved_at timestamptz NOT NULL DEFAULT now(),
+        composition jsonb
+    )""",
+    """CREATE TABLE IF NOT EXISTS materials_archive (
+        LIKE materials,
+        moved_at timestamptz NOT NULL DEFAULT now()
+    )""",
+    # Частичный индекс по материалам в работе ниже минимального остатка: поиск
+    # дефицита читает только эти строки, а не всю таблицу materials (прежний
+    # индекс materials_low_stock_idx включал и архивные строки)
+    """DROP INDEX IF EXISTS materials_low_stock_idx""",
+    """CREATE INDEX IF NOT EXISTS materials_active_low_stock_idx
+        ON materials (material_name) WHERE stock_quantity < min_quantity AND archived_at IS NULL""",
+    # Показатели главной страницы; обновляется без блокировки чтения
+    # (REFRESH ... CONCURRENTLY требует уникального индекса). Представление,
+    # созданное до появления архива, учитывает архивные строки и пересоздается
+    """DO $$
+    BEGIN
+        IF EXISTS (SELECT 1 FROM pg_matviews
+                   WHERE matviewname = 'dashboard_summary'
+                     AND definition NOT LIKE '%archived_at%') THEN
+            DROP MATERIALIZED VIEW dashboard_summary;
+        END IF;
+    END
+    $$""",
+    """CREATE MATERIALIZED VIEW IF NOT EXISTS dashboard_summary AS
+        SELECT 'product_type'::varchar(20) AS kind,
+               tp.id_type_product AS key,
+               tp.type_product AS label,
+               count(p.id_product) AS item_count,
+               COALESCE(avg(p.min_cost), 0)::numeric(14, 2) AS amount
+        FROM type_product tp
+        LEFT JOIN products p ON p.id_type_product = tp.id_type_product AND p.archived_at IS NULL
+        GROUP BY tp.id_type_product, tp.type_product
+        UNION ALL
+        SELECT 'materials', 0, 'Материалы',
+               count(*) FILTER (WHERE stock_quantity < min_quantity),
+               COALESCE(sum(stock_quantity * unit_price), 0)::numeric(14, 2)
+        FROM materials
+        WHERE archived_at IS NULL""",
+    """CREATE UNIQUE INDEX IF NOT EXISTS dashboard_summary_key
+        ON dashboard_summary (kind, key)""",
+    # Уведомление об изменении таблицы (канал table_changed, в тексте — имя таблицы):
+    # по нему сбрасывает кэш служба api_server.py. Триггер уровня команды, а
+    # одинаковые уведомления в транзакции PostgreSQL объединяет в одно
+    """CREATE OR REPLACE FUNCTION notify_table_changed() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('table_changed', TG_TABLE_NAME);
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    """DO $$
+    DECLARE
+        table_name text;
+    BEGIN
+        FOREACH table_name IN ARRAY ARRAY['products', 'materials', 'product_materials',
+                                          'type_product', 'type_material'] LOOP
+            IF NOT EXISTS (SELECT 1 FROM pg_trigger
+                           WHERE tgname = table_name || '_changed'
+                             AND tgrelid = table_name::regclass) THEN
+                EXECUTE format('CREATE TRIGGER %I AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %I '
+                               'FOR EACH STATEMENT EXECUTE FUNCTION notify_table_changed()',
+                               table_name || '_changed', table_name);
+            END IF;
+        END LOOP;
+    END
+    $$""",
+    # Текущие цены попадают в историю один раз, когда таблица истории еще пуста
+    """INSERT INTO product_price_history (id_product, min_cost, valid_from, source)
+        SELECT id_product, min_cost, '-infinity', 'initial'
+        FROM products
+        WHERE min_cost IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM product_price_history)""",
+]
+
+
+def connect():
+    """Открывает новое соединение с базой данных"""
+    import psycopg2
+    return psycopg2.connect(**{"application_name": CLIENT_NAME, **DB_CONFIG})
+
+
+def connection_pool(minconn, maxconn):
+    """Пул соединений для нескольких потоков (psycopg2 ThreadedConnectionPool)"""
+    from psycopg2.pool import ThreadedConnectionPool
+    return ThreadedConnectionPool(minconn, maxconn, **{"application_name": CLIENT_NAME, **DB_CONFIG})
+
+
+def ensure_schema(conn):
+    """Создает служебные таблицы приложения, если их нет"""
+    cursor = conn.cursor()
+    try:
+        for statement in SCHEMA_STATEMENTS:
+            cursor.execute(statement)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
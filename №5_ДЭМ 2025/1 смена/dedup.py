@@ -0,0 +1,362 @@
+"""Поиск и объединение дублей продукции и материалов.
+
+Дублями считаются строки с одинаковым ключом (артикулом продукции) и строки
+с похожими наименованиями. Наименования приводятся к единому виду
+(регистр, «ё», знаки препинания, пробелы) и разбиваются на символьные
+триграммы; сходство — коэффициент Жаккара множеств триграмм.
+
+Чтобы не сравнивать все пары строк, используется префиксная фильтрация:
+триграммы каждой строки упорядочены от редких к частым, и в индекс попадают
+только первые из них (префикс). Если сходство двух строк не ниже порога,
+их префиксы обязательно имеют общую триграмму, поэтому кандидаты — только
+строки с общей триграммой префикса, а редкие триграммы дают короткие
+списки. Поиск дублей по всей таблице — почти линейный, проверка одного
+наименования перед сохранением — доли миллисекунды.
+
+    python dedup.py materials                   # группы похожих материалов
+    python dedup.py products --threshold 0.8
+    python dedup.py materials --merge            # объединить каждую группу в старейшую строку
+    python dedup.py materials --merge-pair 12 40 # строку 40 объединить в 12
+"""
+import argparse
+import sys
+from math import ceil
+
+import statements
+
+NGRAM = 3
+DEFAULT_THRESHOLD = 0.75
+
+# Знаки, которые не различают наименования: «Клей ПВА» и «клей-ПВА.» — одно и то же
+_SEPARATORS = str.maketrans({character: " " for character in "-_.,;:!?\"'«»()[]/\\|*+"})
+
+
+def normalize(text):
+    """Наименование без учета регистра, «ё», знаков препинания и лишних пробелов"""
+    text = str(text or "").casefold().replace("ё", "е").translate(_SEPARATORS)
+    return " ".join(text.split())
+
+
+def ngrams(text, n=NGRAM):
+    """Множество символьных n-грамм нормализованного наименования (с границами слов)"""
+    return _ngrams(normalize(text), n)
+
+
+def _ngrams(text, n=NGRAM):
+    text = f" {text} "
+    if len(text) <= n:
+        return {text}
+    return {text[start:start + n] for start in range(len(text) - n + 1)}
+
+
+def jaccard(first, second):
+    if not first or not second:
+        return 0.0
+    common = len(first & second)
+    return common / (len(first) + len(second) - common)
+
+
+class SimilarityIndex:
+    """Индекс наименований для поиска похожих с префиксной фильтрацией.
+
+    Порядок триграмм (по частоте) фиксируется при rebuild; триграммы, которых
+    тогда не было, считаются самыми редкими. Порядок одинаков для всех строк,
+    поэтому строки, добавленные через update, находятся так же точно.
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        self._frequency = {}
+        self._texts = {}  # id строки -> нормализованное наименование
+        self._grams = {}  # id строки -> множество триграмм
+        self._prefixes = {}  # id строки -> триграммы префикса
+        self._postings = {}  # триграмма префикса -> множество id строк
+
+    def __len__(self):
+        return len(self._grams)
+
+    def _prefix(self, grams):
+        ordered = sorted(grams, key=lambda gram: (self._frequency.get(gram, 0), gram))
+        return ordered[:len(ordered) - ceil(self.threshold * len(ordered)) + 1]
+
+    def rebuild(self, rows):
+        """Строит индекс заново; rows — (id, наименование)"""
+        texts = {row_id: normalize(name) for row_id, name in rows}
+        grams = {row_id: _ngrams(text) for row_id, text in texts.items()}
+        frequency = {}
+        for row_grams in grams.values():
+            for gram in row_grams:
+                frequency[gram] = frequency.get(gram, 0) + 1
+        self._frequency = frequency
+        self._texts = texts
+        self._grams = {}
+        self._prefixes = {}
+        self._postings = {}
+        for row_id, row_grams in grams.items():
+            self._add(row_id, row_grams)
+
+    def _add(self, row_id, grams):
+        prefix = self._prefix(grams)
+        self._grams[row_id] = grams
+        self._prefixes[row_id] = prefix
+        for gram in prefix:
+            self._postings.setdefault(gram, set()).add(row_id)
+
+    def update(self, row_id, name):
+        """Добавляет строку или заменяет ее наименование"""
+        self.remove(row_id)
+        self._texts[row_id] = normalize(name)
+        self._add(row_id, _ngrams(self._texts[row_id]))
+
+    def remove(self, row_id):
+        grams = self._grams.pop(row_id, None)
+        if grams is None:
+            return
+        del self._texts[row_id]
+        for gram in self._prefixes.pop(row_id):
+            postings = self._postings[gram]
+            postings.discard(row_id)
+            if not postings:
+                del self._postings[gram]
+
+    def _matches(self, grams, exclude=None):
+        """(id, сходство) строк со сходством не ниже порога"""
+        low = self.threshold * len(grams)
+        high = len(grams) / self.threshold
+        checked = {exclude}
+        for gram in self._prefix(grams):
+            for row_id in self._postings.get(gram, ()):
+                if row_id in checked:
+                    continue
+                checked.add(row_id)
+                other = self._grams[row_id]
+                # Сходство не достигнет порога, если размеры множеств слишком разные
+                if not low <= len(other) <= high:
+                    continue
+                similarity = jaccard(grams, other)
+                if similarity >= self.threshold:
+                    yield row_id, similarity
+
+    def similar(self, name, exclude=None):
+        """Строки с похожим наименованием: [(id, сходство)] по убыванию сходства"""
+        return sorted(self._matches(ngrams(name), exclude), key=lambda match: -match[1])
+
+    def groups(self):
+        """Строки с одинаковыми нормализованными наименованиями: списки id"""
+        groups = {}
+        for row_id, text in self._texts.items():
+            groups.setdefault(text, []).append(row_id)
+        return list(groups.values())
+
+    def pairs(self, groups=None):
+        """Пары похожих наименований (id, id, сходство), каждая пара один раз.
+
+        Одинаковые наименования (groups) сравниваются один раз — по первой
+        строке группы. Строки просматриваются по возрастанию числа триграмм и
+        сравниваются только с уже просмотренными (не большими по размеру),
+        поэтому в индекс достаточно поместить более короткий префикс. Кандидат
+        отбрасывается без сравнения множеств, если даже при совпадении всех
+        триграмм после общей триграммы префикса (в общем порядке) сходство не
+        достигнет порога.
+        """
+        threshold = self.threshold
+        overlap = threshold / (1 + threshold)
+        all_grams = self._grams
+        representatives = [group[0] for group in (groups if groups is not None else self.groups())]
+        postings = {}
+        for row_id in sorted(representatives, key=lambda row_id: len(all_grams[row_id])):
+            grams = all_grams[row_id]
+            size = len(grams)
+            low = threshold * size
+            prefix = self._prefixes[row_id]
+            checked = set()
+            for position, gram in enumerate(prefix):
+                rest = size - position
+                for other_id, other_rest in postings.get(gram, ()):
+                    if other_id in checked:
+                        continue
+                    other = all_grams[other_id]
+                    other_size = len(other)
+                    # Нужное число общих триграмм и наибольшее возможное с этой позиции
+                    if other_size < low or min(rest, other_rest) < overlap * (size + other_size):
+                        continue
+                    checked.add(other_id)
+                    similarity = jaccard(grams, other)
+                    if similarity >= threshold:
+                        yield min(row_id, other_id), max(row_id, other_id), similarity
+            for position in range(size - ceil(2 * overlap * size) + 1):
+                postings.setdefault(prefix[position], []).append((row_id, size - position))
+
+
+class DuplicateDetector:
+    """Дубли строк таблицы: совпадающий ключ (артикул) или похожее наименование"""
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD):
+        self.labels = {}  # id строки -> подпись для сообщений
+        self.stale = True  # индекс нужно построить заново из загруженного списка
+        self.names = SimilarityIndex(threshold)
+        self._keys = {}  # id строки -> нормализованный ключ
+        self._by_key = {}  # нормализованный ключ -> множество id строк
+
+    def rebuild(self, rows):
+        """Строит индекс заново; rows — (id, подпись, наименование, ключ или None)"""
+        rows = list(rows)
+        self.labels = {row_id: label for row_id, label, _, _ in rows}
+        self._keys = {}
+        self._by_key = {}
+        for row_id, _, _, key in rows:
+            self._add_key(row_id, key)
+        self.names.rebuild((row_id, name) for row_id, _, name, _ in rows)
+        self.stale = False
+
+    def _add_key(self, row_id, key):
+        key = normalize(key)
+        if key:
+            self._keys[row_id] = key
+            self._by_key.setdefault(key, set()).add(row_id)
+
+    def update(self, row_id, label, name, key=None):
+        self.remove(row_id)
+        self.labels[row_id] = label
+        self._add_key(row_id, key)
+        self.names.update(row_id, name)
+
+    def remove(self, row_id):
+        self.labels.pop(row_id, None)
+        key = self._keys.pop(row_id, None)
+        if key is not None:
+            self._by_key[key].discard(row_id)
+            if not self._by_key[key]:
+                del self._by_key[key]
+        self.names.remove(row_id)
+
+    def check(self, name, key=None, exclude=None):
+        """Возможные дубли строки перед сохранением: [(id, подпись, причина)]"""
+        found = {}
+        for row_id in sorted(self._by_key.get(normalize(key), ())):
+            if row_id != exclude:
+                found[row_id] = "тот же артикул"
+        for row_id, similarity in self.names.similar(name, exclude):
+            found.setdefault(row_id, f"похожее наименование ({similarity:.0%})")
+        return [(row_id, self.labels.get(row_id, str(row_id)), reason) for row_id, reason in found.items()]
+
+    def clusters(self):
+        """Группы дублей (списки id по возрастанию), группы — по убыванию размера"""
+        parent = {}
+
+        def root(row_id):
+            parent.setdefault(row_id, row_id)
+            while parent[row_id] != row_id:
+                parent[row_id] = parent[parent[row_id]]
+                row_id = parent[row_id]
+            return row_id
+
+        def join(first, second):
+            first, second = root(first), root(second)
+            if first != second:
+                parent[max(first, second)] = min(first, second)
+
+        # Блоки: одинаковый ключ или одинаковое наименование; похожие наименования
+        # сравниваются только между блоками
+        name_groups = self.names.groups()
+        for row_ids in list(self._by_key.values()) + name_groups:
+            first = min(row_ids)
+            for row_id in row_ids:
+                join(first, row_id)
+        for first, second, _ in self.names.pairs(name_groups):
+            join(first, second)
+
+        groups = {}
+        for row_id in list(parent):
+            groups.setdefault(root(row_id), []).append(row_id)
+        return sorted((sorted(group) for group in groups.values() if len(group) > 1),
+                      key=lambda group: (-len(group), group))
+
+
+def resolve_merges(merges):
+    """{id дубля: id сохраняемой строки} с цепочками, сведенными к конечной строке"""
+    resolved = {}
+    for duplicate in merges:
+        target = duplicate
+        seen = set()
+        while target in merges:
+            if target in seen:
+                raise ValueError(f"Циклическое объединение строк: {sorted(seen)}")
+            seen.add(target)
+            target = merges[target]
+        if target != duplicate:
+            resolved[duplicate] = target
+    return resolved
+
+
+def merge(connection, merge_sql, merges):
+    """Объединяет строки одной транзакцией, возвращает число удаленных дублей.
+
+    merge_sql — statements.MERGE_MATERIALS_SQL или MERGE_PRODUCTS_SQL: ссылки
+    состава переводятся на сохраняемую строку, дубли удаляются и записываются
+    в журнал изменений.
+    """
+    from psycopg2.extras import execute_values
+
+    merges = resolve_merges(merges)
+    if not merges:
+        return 0
+    cursor = connection.cursor()
+    try:
+        counts = execute_values(cursor, merge_sql, list(merges.items()), page_size=len(merges), fetch=True)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+    return sum(count for count, in counts)
+
+
+def load_detector(cursor, table, threshold=DEFAULT_THRESHOLD):
+    """Индекс дублей по всей таблице products или materials"""
+    detector = DuplicateDetector(threshold)
+    if table == "products":
+        statements.PRODUCTS_LIST.execute(cursor)
+        detector.rebuild((row[0], f"{row[4]} — {row[2]}", row[2], row[4]) for row in cursor.fetchall())
+    else:
+        statements.MATERIALS_LIST.execute(cursor)
+        detector.rebuild((row[0], row[2], row[2], None) for row in cursor.fetchall())
+    return detector
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Поиск и объединение дублей продукции и материалов")
+    parser.add_argument("table", choices=("products", "materials"))
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="минимальное сходство наименований (0..1)")
+    parser.add_argument("--merge", action="store_true", help="объединить каждую группу в строку с меньшим id")
+    parser.add_argument("--merge-pair", nargs=2, type=int, metavar=("KEEP", "DUPLICATE"),
+                        help="объединить строку DUPLICATE в строку KEEP")
+    args = parser.parse_args()
+
+    import database
+    merge_sql = statements.MERGE_PRODUCTS_SQL if args.table == "products" else statements.MERGE_MATERIALS_SQL
+    conn = database.connect()
+    try:
+        if args.merge_pair:
+            keep, duplicate = args.merge_pair
+            print(f"Объединено строк: {merge(conn, merge_sql, {duplicate: keep})}")
+            return 0
+
+        detector = load_detector(conn.cursor(), args.table, args.threshold)
+        conn.rollback()
+        clusters = detector.clusters()
+        for group in clusters:
+            print(" | ".join(f"{row_id}: {detector.labels[row_id]}" for row_id in group))
+        print(f"Групп дублей: {len(clusters)}")
+        if args.merge and clusters:
+            merges = {row_id: group[0] for group in clusters for row_id in group[1:]}
+            print(f"Объединено строк: {merge(conn, merge_sql, merges)}")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""Оценка запасов материалов: стоимость, число упаковок и количество в
+базовых единицах — всего и по типам материалов.
+
+Строки запроса INVENTORY_MATERIALS (материалы, упорядоченные по типу)
+раскладываются в массивы array("q"), после чего стоимость (копейки),
+количество в базовых единицах (units.FACTOR_DIGITS знаков) и число упаковок
+считаются поэлементно по массивам целиком, а итоги типов — суммами по
+непрерывным отрезкам массивов. Оценка строится как результат запроса в кэше
+(query_cache) и сбрасывается вместе с ним при сохранении материалов:
+
+    valuation = inventory.load(main_window.query_cache, cursor)
+    valuation.total_value  # копейки, см. money.format_rub
+    for summary in valuation.types:
+        print(summary.type_name, summary.value, format_quantities(summary.quantities))
+"""
+from array import array
+from operator import mul
+
+import statements
+from units import REGISTRY, format_quantity
+
+
+class TypeValuation:
+    """Итог по типу материалов: стоимость в копейках, упаковки и количества
+    {базовая единица: количество (FACTOR_DIGITS знаков)}"""
+
+    def __init__(self, type_name):
+        self.type_name = type_name
+        self.materials = 0
+        self.value = 0
+        self.packages = 0
+        self.quantities = {}
+
+
+class Valuation:
+    """Оценка запасов по строкам (id, тип, единица, цена в копейках, остаток,
+    количество в упаковке)"""
+
+    def __init__(self, rows):
+        self.material_ids = array("q")
+        units = []
+        stocks = array("q")
+        prices = array("q")
+        package_sizes = array("q")
+        self.types = []
+        ranges = []
+        lookup = {}  # написание единицы -> Unit
+        for material_id, type_name, unit, price, stock, package_quantity in rows:
+            if not self.types or self.types[-1].type_name != type_name:
+                self.types.append(TypeValuation(type_name))
+                ranges.append(len(self.material_ids))
+            self.material_ids.append(material_id)
+            if unit not in lookup:
+                lookup[unit] = REGISTRY.lookup(unit)
+            units.append(lookup[unit])
+            stocks.append(stock)
+            prices.append(price)
+            package_sizes.append(package_quantity)
+        ranges.append(len(self.material_ids))
+
+        # Поэлементно по всем материалам сразу
+        self.units = units
+        self.values = array("q", map(mul, stocks, prices))
+        self.base_quantities = array("q", (unit.factor * stock for unit, stock in zip(units, stocks)))
+        # Остаток в упаковках, неполная упаковка считается целой; для единицы
+        # "упак" остаток уже в упаковках
+        self.packages = array("q", (
+            stock if unit.dimension == "упаковки" else -(-stock // size) if size > 0 and stock > 0 else 0
+            for unit, stock, size in zip(units, stocks, package_sizes)))
+
+        self.quantities = {}
+        for summary, first, last in zip(self.types, ranges, ranges[1:]):
+            summary.materials = last - first
+            summary.value = sum(self.values[first:last])
+            summary.packages = sum(self.packages[first:last])
+            for position in range(first, last):
+                base = units[position].base
+                summary.quantities[base] = summary.quantities.get(base, 0) + self.base_quantities[position]
+            for base, quantity in summary.quantities.items():
+                self.quantities[base] = self.quantities.get(base, 0) + quantity
+
+    def __len__(self):
+        return len(self.material_ids)
+
+    @property
+    def total_value(self):
+        """Стоимость всех запасов, в копейках"""
+        return sum(self.values)
+
+    @property
+    def total_packages(self):
+        return sum(self.packages)
+
+    @property
+    def unknown_units(self):
+        """Единицы, которых нет в реестре (учтены отдельно от остальных)"""
+        return sorted({unit.name for unit in self.units if not unit.known})
+
+
+def load(query_cache, cursor):
+    """Оценка запасов из кэша запросов или из базы"""
+    return query_cache.fetchall(cursor, statements.INVENTORY_MATERIALS, build=Valuation)
+
+
+def format_quantities(quantities):
+    """Количества по базовым единицам одной строкой: "250 кг, 1200 л" """
+    return ", ".join(format_quantity(quantity, base) for base, quantity in sorted(quantities.items()))
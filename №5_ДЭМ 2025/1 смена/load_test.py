@@ -0,0 +1,250 @@
+"""Нагрузочный тест базы данных: несколько рабочих мест одновременно.
+
+Каждый клиент — отдельный поток со своим подключением, выполняющий те же
+запросы, что и приложение: загрузку списков, сохранение продукта и
+материала, пересчет цен. Доли операций задаются параметром --mix.
+В конце выводятся пропускная способность, перцентили задержек, ошибки,
+взаимоблокировки, конфликты версий строк (conflicts.py) и таблицы, на
+блокировках которых ждали клиенты.
+
+Тест записывает в базу (сохраняет строки с теми же значениями и пересчитывает
+цены), поэтому запускайте его на локальной копии базы. База указывается явно;
+на рабочую базу из database.py тест запускается только с --allow-main-db:
+
+    python load_test.py --clients 12 --duration 60 --dbname demvar_test \\
+        --mix list_products=40,list_materials=30,edit_product=15,edit_material=10,reprice=5
+"""
+import argparse
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+import database
+import price_history
+import statements
+from pricing import PricingEngine
+
+DEFAULT_MIX = "list_products=40,list_materials=30,edit_product=15,edit_material=10,reprice=5"
+
+
+class VersionConflict(Exception):
+    """Строку изменил другой клиент между чтением и сохранением"""
+
+
+def op_list_products(cursor, ids):
+    statements.PRODUCTS_LIST.execute(cursor)
+    cursor.fetchall()
+
+
+def op_list_materials(cursor, ids):
+    statements.MATERIALS_LIST.execute(cursor)
+    cursor.fetchall()
+
+
+def op_edit_product(cursor, ids):
+    """Открытие и сохранение продукта, как в ProductDialog"""
+    product_id = random.choice(ids["products"])
+    statements.PRODUCT_ROW.execute(cursor, (product_id,))
+    articul, type_id, name, min_cost, width, version = cursor.fetchone()
+    statements.ENSURE_PRICE_HISTORY_PARTITION.execute(cursor)
+    statements.PRODUCT_UPDATE.execute(cursor, (
+        articul, type_id, name, min_cost, width, product_id, version, price_history.SOURCE_EDIT))
+    if not cursor.fetchone()[0]:
+        raise VersionConflict()
+
+
+def op_edit_material(cursor, ids):
+    """Открытие и сохранение материала, как в MaterialDialog"""
+    material_id = random.choice(ids["materials"])
+    statements.MATERIAL_ROW.execute(cursor, (material_id,))
+    name, type_id, price, stock, min_quantity, package, unit, version = cursor.fetchone()
+    statements.MATERIAL_UPDATE.execute(cursor, (
+        name, type_id, price, stock, min_quantity, package, unit, material_id, version))
+    if cursor.rowcount == 0:
+        raise VersionConflict()
+
+
+def op_reprice(cursor, ids):
+    """Пересчет цен всей продукции, как по кнопке «Пересчитать стоимость»"""
+    PricingEngine.load(cursor).reprice_all(cursor)
+
+
+OPERATIONS = {
+    "list_products": op_list_products,
+    "list_materials": op_list_materials,
+    "edit_product": op_edit_product,
+    "edit_material": op_edit_material,
+    "reprice": op_reprice,
+}
+
+
+def parse_mix(text):
+    """Разбирает строку вида name=вес,name=вес"""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"Неизвестная операция: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class LoadTest:
+    def __init__(self, clients, duration, mix):
+        self.clients = clients
+        self.duration = duration
+        self.mix = mix
+        self.latencies = {name: [] for name in mix}
+        self.errors = Counter()
+        self.error_kinds = Counter()
+        self.deadlocks = 0
+        self.conflicts = 0
+        self.lock_samples = Counter()
+        self.lock_wait_samples = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def load_ids(self):
+        conn = database.connect()
+        try:
+            cursor = conn.cursor()
+            statements.LOAD_TEST_PRODUCT_IDS.execute(cursor)
+            products = [row[0] for row in cursor.fetchall()]
+            statements.LOAD_TEST_MATERIAL_IDS.execute(cursor)
+            materials = [row[0] for row in cursor.fetchall()]
+            return {"products": products, "materials": materials}
+        finally:
+            conn.close()
+
+    def client(self, ids):
+        import psycopg2.errors
+
+        names = list(self.mix)
+        weights = [self.mix[name] for name in names]
+        conn = database.connect()
+        cursor = conn.cursor()
+        try:
+            while not self._stop.is_set():
+                name = random.choices(names, weights)[0]
+                started = time.perf_counter()
+                try:
+                    OPERATIONS[name](cursor, ids)
+                    conn.commit()
+                except VersionConflict:
+                    conn.rollback()
+                    with self._lock:
+                        self.conflicts += 1
+                    continue
+                except psycopg2.errors.DeadlockDetected:
+                    conn.rollback()
+                    with self._lock:
+                        self.deadlocks += 1
+                        self.errors[name] += 1
+                    continue
+                except Exception as error:
+                    conn.rollback()
+                    with self._lock:
+                        self.errors[name] += 1
+                        self.error_kinds[type(error).__name__] += 1
+                    continue
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                with self._lock:
+                    self.latencies[name].append(elapsed_ms)
+        finally:
+            conn.close()
+
+    def sample_locks(self, interval=0.1):
+        """Периодически смотрит в pg_locks, какие блокировки ожидаются"""
+        conn = database.connect()
+        conn.autocommit = True
+        cursor = conn.cursor()
+        try:
+            while not self._stop.wait(interval):
+                statements.LOCK_WAITS.execute(cursor)
+                rows = cursor.fetchall()
+                self.lock_wait_samples += len(rows)
+                for relation, mode, _ in rows:
+                    self.lock_samples[(relation, mode)] += 1
+        finally:
+            conn.close()
+
+    def run(self):
+        ids = self.load_ids()
+        if "edit_product" in self.mix and not ids["products"] \
+                or "edit_material" in self.mix and not ids["materials"]:
+            raise RuntimeError("В базе нет строк для операций редактирования")
+
+        threads = [threading.Thread(target=self.client, args=(ids,)) for _ in range(self.clients)]
+        sampler = threading.Thread(target=self.sample_locks)
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        sampler.start()
+        time.sleep(self.duration)
+        self._stop.set()
+        for thread in threads:
+            thread.join()
+        sampler.join()
+        return time.perf_counter() - started
+
+    def print_report(self, elapsed):
+        total = sum(len(values) for values in self.latencies.values())
+        print(f"Клиентов: {self.clients}, длительность: {elapsed:.1f} с, "
+              f"операций: {total} ({total / elapsed:.1f} в секунду)")
+        print(f"{'операция':<16}{'кол-во':>8}{'в сек':>8}{'p50 мс':>9}{'p95 мс':>9}"
+              f"{'p99 мс':>9}{'макс мс':>9}{'ошибок':>8}")
+        for name, values in self.latencies.items():
+            values.sort()
+            print(f"{name:<16}{len(values):>8}{len(values) / elapsed:>8.1f}"
+                  f"{percentile(values, 0.5):>9.1f}{percentile(values, 0.95):>9.1f}"
+                  f"{percentile(values, 0.99):>9.1f}{(values[-1] if values else 0):>9.1f}"
+                  f"{self.errors[name]:>8}")
+        print(f"Взаимоблокировок: {self.deadlocks}")
+        print(f"Конфликтов версий строк: {self.conflicts}")
+        for kind, count in self.error_kinds.most_common():
+            print(f"  ошибка {kind}: {count}")
+        print(f"Ожиданий блокировок в замерах pg_locks: {self.lock_wait_samples}")
+        for (relation, mode), count in self.lock_samples.most_common(10):
+            print(f"  {relation:<30}{mode:<24}{count:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест нескольких рабочих мест")
+    parser.add_argument("--clients", type=int, default=12, help="число одновременных клиентов")
+    parser.add_argument("--duration", type=float, default=30, help="длительность, с")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="доли операций: name=вес,...")
+    parser.add_argument("--dbname", required=True, help="база данных (копия рабочей)")
+    parser.add_argument("--allow-main-db", action="store_true",
+                        help="разрешить запуск на рабочей базе из database.py")
+    parser.add_argument("--host", default=None)
+    parser.add_argument("--port", default=None)
+    parser.add_argument("--user", default=None)
+    parser.add_argument("--password", default=None)
+    args = parser.parse_args()
+    if args.dbname == database.DB_CONFIG["dbname"] and not args.allow_main_db:
+        parser.error(f"{args.dbname} — рабочая база из database.py; тест записывает в базу, "
+                     f"запускайте его на копии или укажите --allow-main-db")
+
+    for key in ("dbname", "host", "port", "user", "password"):
+        value = getattr(args, key)
+        if value is not None:
+            database.DB_CONFIG[key] = value
+
+    test = LoadTest(args.clients, args.duration, parse_mix(args.mix))
+    elapsed = test.run()
+    test.print_report(elapsed)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
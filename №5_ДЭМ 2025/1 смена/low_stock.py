@@ -0,0 +1,12 @@
+"""Материалы, остаток которых опустился ниже минимального количества"""
+import statements
+
+
+def is_low_stock(stock_quantity, min_quantity):
+    return stock_quantity < min_quantity
+
+
+def fetch_shortages(cursor):
+    """Список материалов с дефицитом: (id, наименование, остаток, минимум, ед. изм.)"""
+    statements.LOW_STOCK_SHORTAGES.execute(cursor)
+    return cursor.fetchall()
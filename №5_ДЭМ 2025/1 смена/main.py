@@ -1,14 +1,236 @@
+import os
 import sys
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel,
     QScrollArea, QFrame, QPushButton, QGridLayout, QSizePolicy, QMessageBox,
     QLineEdit, QComboBox, QDialog, QDialogButtonBox, QFormLayout, QDoubleSpinBox,
-    QStackedWidget, QSpinBox, QGraphicsDropShadowEffect
+    QStackedWidget, QSpinBox, QGraphicsDropShadowEffect, QListWidget, QListWidgetItem
 )
 from PySide6.QtGui import (
-    QFont, QPixmap, QIcon, QColor, QPalette, QLinearGradient, QBrush, QPainter
+    QFont, QPixmap, QIcon, QColor, QPalette, QLinearGradient, QBrush, QPainter,
+    QKeySequence, QShortcut
 )
-from PySide6.QtCore import Qt, QPoint
+from PySide6.QtCore import Qt, QPoint, QObject, QTimer, Signal, QEvent
+import threading
+
+import psycopg2
+
+import archive
+import audit
+import conflicts
+import dashboard
+import database
+import dedup
+import inventory
+import low_stock
+import money
+import price_history
+import price_simulation
+import statements
+import ui_monitor
+import units
+import write_behind
+from pricing import PricingEngine
+from query_cache import QueryCache
+from quick_open import QuickOpenIndex
+from row_store import ProductStore, MaterialStore
+
+
+def add_detail_row(details_layout, title, value):
+    """Добавляет в сетку подробностей карточки строку «название: значение»"""
+    row = details_layout.count() // 2
+
+    title_label = QLabel(title)
+    title_label.setFont(QFont("Gabriola", 12))
+    title_label.setStyleSheet("color: #555555; font-weight: bold;")
+
+    value_label = QLabel(str(value))
+    value_label.setFont(QFont("Gabriola", 12))
+    value_label.setStyleSheet("color: #333333;")
+
+    details_layout.addWidget(title_label, row, 0)
+    details_layout.addWidget(value_label, row, 1)
+
+
+def load_editor_data(cache, cursor, types_statement, row_statement, combined_statement, row_id):
+    """Справочник типов и строка для диалога редактирования: (типы, строка или None).
+
+    Из кэша берется все, что там есть; если справочника нет, он и строка
+    читаются одним запросом combined_statement и сохраняются в кэш как
+    результаты types_statement и row_statement.
+    """
+    types = cache.cached(types_statement)
+    if types is None:
+        combined_statement.execute(cursor, (row_id,))
+        *row, type_rows = cursor.fetchone()
+        types = cache.put(types_statement, None, [tuple(type_row) for type_row in type_rows or ()])
+        if not row_id:
+            return types, None
+        # Последнее поле строки — версия, у существующей строки она не NULL
+        rows = cache.put(row_statement, (row_id,), [tuple(row)] if row[-1] is not None else [])
+        return types, rows[0] if rows else None
+    if not row_id:
+        return types, None
+    return types, cache.fetchone(cursor, row_statement, (row_id,))
+
+
+class CardList:
+    """Карточки страницы в макете прокрутки: порядок и группы без пересоздания виджетов.
+
+    Перестановка вычисляется хранилищем строк (ColumnStore.permutation), здесь
+    существующие карточки только переставляются в макете, а для групп
+    показываются сворачиваемые заголовки.
+    """
+
+    def __init__(self, layout):
+        self.layout = layout
+        self.cards = {}  # id строки -> карточка
+        self.group_headers = {}  # название группы -> кнопка-заголовок
+        self.group_cards = {}  # название группы -> карточки группы
+        self.collapsed_groups = set()
+
+    def add(self, row_id, card):
+        self.cards[row_id] = card
+        self.layout.addWidget(card)
+
+    def clear(self):
+        """Забывает карточки и заголовки (сами виджеты удаляет страница)"""
+        self.cards = {}
+        self.group_headers = {}
+        self.group_cards = {}
+
+    def arrange(self, store, permutation, group_by=None):
+        """Расставляет карточки в порядке позиций permutation"""
+        for widget in list(self.cards.values()) + list(self.group_headers.values()):
+            self.layout.removeWidget(widget)
+        for header in self.group_headers.values():
+            header.hide()
+        self.group_cards = {}
+
+        ids = store.columns["id"]
+        groups = store.columns[group_by] if group_by else None
+        current_group = None
+        for position in permutation:
+            card = self.cards.get(ids[position])
+            if card is None:
+                continue
+            if groups is not None:
+                group = groups[position]
+                if group != current_group:
+                    current_group = group
+                    self.layout.addWidget(self.group_header(group))
+                self.group_cards.setdefault(group, []).append(card)
+                card.setVisible(group not in self.collapsed_groups)
+            else:
+                card.show()
+            self.layout.addWidget(card)
+
+        for group in self.group_cards:
+            self.update_group_header(group)
+
+    def group_header(self, group):
+        header = self.group_headers.get(group)
+        if header is None:
+            header = QPushButton()
+            header.setFont(QFont("Gabriola", 16, QFont.Bold))
+            header.setStyleSheet("""
+                QPushButton {
+                    background-color: transparent;
+                    color: #2D6033;
+                    border: none;
+                    border-bottom: 2px solid #BBD9B2;
+                    padding: 6px;
+                    text-align: left;
+                }
+            """)
+            header.clicked.connect(lambda: self.toggle_group(group))
+            self.group_headers[group] = header
+        header.show()
+        return header
+
+    def update_group_header(self, group):
+        arrow = "▶" if group in self.collapsed_groups else "▼"
+        self.group_headers[group].setText(f"{arrow} {group} ({len(self.group_cards[group])})")
+
+    def toggle_group(self, group):
+        """Сворачивает/разворачивает группу"""
+        if group in self.collapsed_groups:
+            self.collapsed_groups.discard(group)
+        else:
+            self.collapsed_groups.add(group)
+        for card in self.group_cards.get(group, ()):
+            card.setVisible(group not in self.collapsed_groups)
+        self.update_group_header(group)
+
+    def reveal(self, row_id, scroll_area):
+        """Прокручивает область к карточке строки, разворачивая ее группу; False — карточки нет"""
+        card = self.cards.get(row_id)
+        if card is None:
+            return False
+        for group, cards in self.group_cards.items():
+            if group in self.collapsed_groups and any(other is card for other in cards):
+                self.toggle_group(group)
+        # Положение карточки известно только после пересчета макета
+        QTimer.singleShot(0, lambda: scroll_area.ensureWidgetVisible(card))
+        return True
+
+
+def add_sort_controls(page, header_layout):
+    """Добавляет в заголовок страницы выбор сортировки и кнопку группировки по типу"""
+    page.sort_combo = QComboBox()
+    page.sort_combo.setFont(QFont("Gabriola", 14))
+    page.sort_combo.setStyleSheet("""
+        QComboBox {
+            border: 1px solid #BBD9B2;
+            border-radius: 4px;
+            padding: 5px;
+            min-width: 200px;
+        }
+    """)
+    for label, _ in page.SORT_OPTIONS:
+        page.sort_combo.addItem(label)
+    page.sort_combo.currentIndexChanged.connect(lambda: page.apply_order())
+    header_layout.addWidget(page.sort_combo)
+
+    page.group_button = QPushButton("Группировать по типу")
+    page.group_button.setFont(QFont("Gabriola", 14))
+    page.group_button.setStyleSheet(page.get_button_style())
+    page.group_button.setCheckable(True)
+    page.group_button.toggled.connect(lambda: page.apply_order())
+    header_layout.addWidget(page.group_button)
+
+
+def add_archive_controls(page, buttons_layout):
+    """Добавляет на страницу переключатель списка: строки в работе или архив"""
+    page.archive_button = QPushButton("Архив")
+    page.archive_button.setFont(QFont("Gabriola", 14))
+    page.archive_button.setStyleSheet(page.get_button_style())
+    page.archive_button.setCheckable(True)
+    page.archive_button.toggled.connect(lambda checked: page.set_show_archived(checked))
+    buttons_layout.addWidget(page.archive_button)
+
+
+def add_archive_button(page, buttons_layout, row_id):
+    """Кнопка карточки: перенос в архив или, в списке архива, возврат в работу"""
+    archived = page.show_archived
+    button = QPushButton("Вернуть из архива" if archived else "В архив")
+    button.setFont(QFont("Gabriola", 12))
+    button.setStyleSheet(page.get_button_style())
+    button.clicked.connect(lambda: page.set_archived(row_id, not archived))
+    buttons_layout.addWidget(button)
+
+
+def confirm_archive(page, name, archived):
+    """Подтверждение переноса строки в архив или возврата из него"""
+    if archived:
+        text = f"Перенести «{name}» в архив? Строка пропадет из списков, ее можно будет вернуть из архива."
+    else:
+        text = f"Вернуть «{name}» из архива?"
+    reply = QMessageBox.question(
+        page, "Подтверждение", text,
+        QMessageBox.Yes | QMessageBox.No, QMessageBox.No
+    )
+    return reply == QMessageBox.Yes
 
 
 class MainWindow(QMainWindow):
@@ -24,6 +246,26 @@ class MainWindow(QMainWindow):
         # Подключение к базе данных
         self.db_connection = self.connect_to_db()
 
+        # Кэш результатов запросов, сбрасывается при записи в таблицы
+        self.query_cache = QueryCache()
+
+        # Фоновое отслеживание материалов ниже минимального остатка
+        self.low_stock_monitor = LowStockMonitor(self)
+
+        # Фоновое обновление показателей главной страницы после изменений данных
+        self.dashboard_refresher = DashboardRefresher(self)
+
+        # Журнал изменений данных, записывается пачками в фоновом потоке
+        self.audit = audit.AuditWriter()
+
+        # Пакетное сохранение материалов: журнал на диске и запись в базу в фоне
+        self.write_behind = WriteBehindQueue(self)
+        self.write_behind.flushed.connect(lambda: self.tables_changed("materials"))
+        self.write_behind.failed.connect(self.resolve_write_failures)
+
+        # Диалоги редактирования создаются один раз и переиспользуются (editor_dialog)
+        self.dialogs = {}
+
         # Создаем стек виджетов для навигации
         self.stacked_widget = QStackedWidget()
         self.setCentralWidget(self.stacked_widget)
@@ -41,6 +283,12 @@ class MainWindow(QMainWindow):
         # Показываем главную страницу
         self.show_main_page()
 
+        if self.db_connection:
+            self.audit.start()
+            self.low_stock_monitor.start()
+            # Изменения, не записанные в базу до закрытия или сбоя прошлого запуска
+            self.write_behind.start()
+
     def setup_colors(self):
         """Настройка цветовой схемы приложения"""
         palette = self.palette()
@@ -56,14 +304,11 @@ class MainWindow(QMainWindow):
     def connect_to_db(self):
         """Установка соединения с PostgreSQL"""
         try:
-            import psycopg2
-            conn = psycopg2.connect(
-                dbname="demvar",
-                user="postgres",
-                password="toor",
-                host="localhost",
-                port="5432"
-            )
+            conn = database.connect()
+            database.ensure_schema(conn)
+            # Чтение без отдельных BEGIN и COMMIT; связанные изменения отправляются
+            # одной строкой (statements.execute_batch) и выполняются одной транзакцией
+            conn.autocommit = True
             return conn
         except Exception as e:
             self.show_error_message(
@@ -73,20 +318,29 @@ class MainWindow(QMainWindow):
             return None
 
     # Методы навигации
+    @ui_monitor.timed("page.main")
     def show_main_page(self):
         self.setWindowTitle("Система управления - Главная")
+        self.main_page.load_dashboard()
         self.stacked_widget.setCurrentWidget(self.main_page)
 
+    @ui_monitor.timed("page.products")
     def show_products_page(self):
         self.setWindowTitle("Система управления - Продукция")
         self.products_page.load_products()
         self.stacked_widget.setCurrentWidget(self.products_page)
 
+    @ui_monitor.timed("page.materials")
     def show_materials_page(self):
         self.setWindowTitle("Система управления - Материалы")
         self.materials_page.load_materials()
         self.stacked_widget.setCurrentWidget(self.materials_page)
 
+    def show_low_stock_materials(self):
+        """Открывает страницу материалов с отбором по дефициту"""
+        self.materials_page.low_stock_button.setChecked(True)
+        self.show_materials_page()
+
     def show_error_message(self, title, message):
         msg = QMessageBox(self)
         msg.setIcon(QMessageBox.Critical)
@@ -138,12 +392,377 @@ class MainWindow(QMainWindow):
         """)
         msg.exec()
 
+    def editor_dialog(self, dialog_class, row_id=None):
+        """Диалог редактирования, привязанный к строке row_id (None — новая запись).
+
+        Диалог каждого класса строится один раз; при следующих открытиях он
+        только перепривязывается к строке и перезаполняет поля.
+        """
+        dialog = self.dialogs.get(dialog_class)
+        if dialog is None:
+            dialog = dialog_class(self, self.db_connection, row_id)
+            self.dialogs[dialog_class] = dialog
+        else:
+            dialog.bind(row_id)
+        return dialog
+
+    def resolve_write_failures(self, failures):
+        """Предлагает пользователю решение по изменениям, которые не удалось записать в фоне"""
+        for record, error in failures:
+            material_id = record["material_id"]
+            values = tuple(record["values"])
+            if error is None:
+                # Конфликт версий: материал изменили на другом рабочем месте
+                dialog = self.editor_dialog(MaterialDialog, material_id)
+                choice, theirs = dialog.ask_conflict(values)
+                if choice == ConflictDialog.OVERWRITE:
+                    self.write_behind.retry(material_id, theirs[7], theirs[:7])
+                elif choice == ConflictDialog.RELOAD or theirs is None:
+                    self.write_behind.discard(material_id)
+                # При отмене изменение остается в журнале и будет предложено снова
+            else:
+                reply = QMessageBox.question(
+                    self, "Ошибка пакетного сохранения",
+                    f"Не удалось сохранить материал «{values[0]}»: {error}\n"
+                    f"Повторить попытку? (Нет — отменить это изменение)",
+                    QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes
+                )
+                if reply == QMessageBox.Yes:
+                    self.write_behind.retry(material_id)
+                else:
+                    self.write_behind.discard(material_id)
+
+        if self.stacked_widget.currentWidget() is self.materials_page:
+            self.materials_page.load_materials()
+
+    def tables_changed(self, *tables):
+        """Вызывается после записи в таблицы: сбрасывает кэш и обновляет показатели"""
+        self.query_cache.invalidate(*tables)
+        self.dashboard_refresher.schedule()
+
     def closeEvent(self, event):
+        self.low_stock_monitor.stop()
+        self.dashboard_refresher.stop()
+        error = self.write_behind.stop()
+        # После последней записи изменений материалов, чтобы она тоже попала в журнал
+        self.audit.stop()
+        pending = len(self.write_behind.journal.pending)
+        if pending:
+            message = (f"Не записано в базу изменений материалов: {pending}. "
+                       f"Они сохранены в файле {os.path.abspath(self.write_behind.journal.path)} "
+                       f"и будут записаны при следующем запуске.")
+            if error:
+                message += f"\n\nОшибка: {error}"
+            self.show_warning_message("Несохраненные изменения", message)
         if self.db_connection:
             self.db_connection.close()
         event.accept()
 
 
+class LowStockMonitor(QObject):
+    """Следит за материалами, остаток которых ниже минимального.
+
+    Набор дефицитных материалов периодически перечитывается в фоновом потоке
+    по частичному индексу (только дефицитные строки) и обновляется сразу при
+    сохранении материала в этом приложении.
+    """
+
+    changed = Signal(int)
+    _loaded = Signal(object)
+
+    def __init__(self, parent=None, interval_ms=60000):
+        super().__init__(parent)
+        self.shortages = {}  # id_material -> (id, наименование, остаток, минимум, ед. изм.)
+        self._connection = None
+        self._running = False
+        self._version = 0  # растет при каждом локальном изменении набора
+        self._loaded.connect(self._apply)
+        self.timer = QTimer(self)
+        self.timer.setInterval(interval_ms)
+        self.timer.timeout.connect(self.refresh)
+
+    def start(self):
+        self.refresh()
+        self.timer.start()
+
+    def stop(self):
+        self.timer.stop()
+        if self._connection is not None and not self._running:
+            self._connection.close()
+            self._connection = None
+
+    def refresh(self):
+        """Запускает перечитывание дефицита в фоновом потоке"""
+        if self._running:
+            return
+        self._running = True
+        threading.Thread(target=self._load, args=(self._version,), daemon=True).start()
+
+    def _load(self, version):
+        rows = None
+        try:
+            if self._connection is None:
+                self._connection = database.connect()
+                self._connection.autocommit = True
+            cursor = self._connection.cursor()
+            try:
+                rows = low_stock.fetch_shortages(cursor)
+            finally:
+                cursor.close()
+        except Exception:
+            # Соединение пересоздается при следующей проверке
+            self._connection = None
+        self._loaded.emit((version, rows))
+
+    def _apply(self, result):
+        version, rows = result
+        self._running = False
+        if version != self._version:
+            # Пока шел запрос, материал был сохранен: результат мог устареть
+            self.refresh()
+            return
+        if rows is None:
+            return
+        self.shortages = {row[0]: row for row in rows}
+        self.changed.emit(len(self.shortages))
+
+    def material_saved(self, material_id, material_name, stock_quantity, min_quantity, unit):
+        """Обновляет набор дефицита по сохраненному материалу без запроса к базе"""
+        self._version += 1
+        if low_stock.is_low_stock(stock_quantity, min_quantity):
+            self.shortages[material_id] = (material_id, material_name, stock_quantity, min_quantity, unit)
+        else:
+            self.shortages.pop(material_id, None)
+        self.changed.emit(len(self.shortages))
+
+
+class DashboardRefresher(QObject):
+    """Обновляет материализованное представление показателей в фоновом потоке.
+
+    Несколько изменений подряд объединяются в одно обновление: оно
+    запускается через несколько секунд после последнего изменения.
+    """
+
+    refreshed = Signal()
+    _finished = Signal(bool)
+
+    def __init__(self, parent=None, delay_ms=3000):
+        super().__init__(parent)
+        self._connection = None
+        self._running = False
+        self._pending = False
+        self._finished.connect(self._on_finished)
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(delay_ms)
+        self.timer.timeout.connect(self.refresh)
+
+    def schedule(self):
+        self.timer.start()
+
+    def stop(self):
+        self.timer.stop()
+        if self._connection is not None and not self._running:
+            self._connection.close()
+            self._connection = None
+
+    def refresh(self):
+        if self._running:
+            self._pending = True
+            return
+        self._running = True
+        threading.Thread(target=self._refresh, daemon=True).start()
+
+    def _refresh(self):
+        success = False
+        try:
+            if self._connection is None:
+                self._connection = database.connect()
+                self._connection.autocommit = True
+            dashboard.refresh(self._connection)
+            success = True
+        except Exception:
+            self._connection = None
+        self._finished.emit(success)
+
+    def _on_finished(self, success):
+        self._running = False
+        if self._pending:
+            self._pending = False
+            self.refresh()
+        elif success:
+            self.refreshed.emit()
+
+
+class WriteBehindQueue(QObject):
+    """Пакетное сохранение материалов (режим включается на странице материалов).
+
+    Сохраненное в MaterialDialog изменение сразу попадает в журнал на диске
+    (write_behind.MaterialJournal) и на экран, а фоновый поток записывает
+    накопленные изменения в базу одной транзакцией. Конфликты версий и ошибки
+    записи возвращаются пользователю сигналом failed.
+    """
+
+    pending_changed = Signal(int)
+    flushed = Signal()
+    failed = Signal(object)  # [(запись журнала, текст ошибки или None при конфликте версий)]
+    _finished = Signal(object)
+
+    def __init__(self, parent=None, journal_path=write_behind.JOURNAL_FILE, delay_ms=2000, batch_size=200):
+        super().__init__(parent)
+        self.enabled = False
+        self.batch_size = batch_size
+        self.journal = write_behind.MaterialJournal(journal_path)
+        self.failures = {}  # id_material -> (запись журнала, текст ошибки или None)
+        self._connection = None
+        self._running = False
+        self._finished.connect(self._on_finished)
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(delay_ms)
+        self.timer.timeout.connect(self.flush)
+
+    def start(self):
+        if self.journal.pending:
+            self.flush()
+
+    def stop(self):
+        """Последняя попытка записать изменения; все незаписанное остается в журнале.
+
+        Возвращает текст ошибки базы данных или None; число оставшихся
+        изменений — len(journal.pending).
+        """
+        self.timer.stop()
+        if self._running:
+            return None
+        records = self._batch()
+        try:
+            if records:
+                if self._connection is None:
+                    self._connection = database.connect()
+                done, _, _ = write_behind.flush_batch(self._connection, records)
+                self.journal.ack([record for record, _ in done])
+                self._audit(done)
+        except psycopg2.Error as e:
+            return str(e)
+        finally:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+        return None
+
+    def pending_record(self, material_id):
+        """Незаписанное изменение материала или None"""
+        return self.journal.pending.get(material_id)
+
+    def apply_pending(self, store):
+        """Накладывает незаписанные изменения на загруженные материалы (MaterialStore).
+
+        Хранилище из кэша запросов меняется на месте, поэтому отмена изменения
+        (discard) сбрасывает кэш материалов.
+        """
+        for material_id, record in self.journal.pending.items():
+            if store.get(material_id) is None:
+                continue
+            name, _, unit_price, stock_quantity, min_quantity, _, unit = record["values"]
+            store.update((material_id, record["type_name"], name, unit_price, stock_quantity, unit,
+                          low_stock.is_low_stock(stock_quantity, min_quantity)))
+
+    def put(self, material_id, version, values, type_name, before=None):
+        """Ставит изменение материала в очередь (сначала — в журнал на диске);
+        before — поля строки версии version для журнала изменений"""
+        if self.failures.pop(material_id, None) is not None:
+            # Изменение после конфликта заменяет несохраненное и основано на новой версии
+            self.journal.pending.pop(material_id, None)
+        self.journal.put(material_id, version, values, type_name, before)
+        self.pending_changed.emit(len(self.journal.pending))
+        if len(self.journal.pending) >= self.batch_size:
+            self.flush()
+        elif not self.timer.isActive():
+            self.timer.start()
+
+    def retry(self, material_id, version=None, before=None):
+        """Повторяет запись после ошибки; version — версия строки, на которую переносится
+        изменение, before — поля строки этой версии"""
+        record, _ = self.failures.pop(material_id)
+        if version is not None:
+            self.journal.rebase(record, version, before)
+        self.timer.start()
+
+    def discard(self, material_id):
+        """Отменяет незаписанное изменение материала"""
+        record, _ = self.failures.pop(material_id)
+        self.journal.ack([record])
+        # В кэше остались списки с наложенным отмененным изменением
+        self.parent().query_cache.invalidate("materials")
+        self.pending_changed.emit(len(self.journal.pending))
+
+    def _audit(self, done):
+        audit_writer = self.parent().audit
+        for record, _ in done:
+            audit_writer.record(audit.ENTITY_MATERIAL, record["material_id"], audit.ACTION_UPDATE,
+                                audit.SOURCE_WRITE_BEHIND, record.get("before"), record["values"])
+
+    def _batch(self):
+        records = [record for material_id, record in self.journal.pending.items()
+                   if material_id not in self.failures]
+        return records[:self.batch_size]
+
+    def flush(self):
+        """Запускает запись накопленных изменений в фоновом потоке"""
+        if self._running:
+            return
+        records = self._batch()
+        if not records:
+            return
+        self._running = True
+        threading.Thread(target=self._flush, args=(records,), daemon=True).start()
+
+    def _flush(self, records):
+        result = None
+        try:
+            if self._connection is None:
+                self._connection = database.connect()
+            result = write_behind.flush_batch(self._connection, records)
+        except Exception:
+            # Нет соединения: изменения остаются в журнале до следующей попытки
+            self._connection = None
+        self._finished.emit(result)
+
+    def _on_finished(self, result):
+        self._running = False
+        if result is None:
+            self.timer.start()
+            return
+
+        done, conflicted, failed = result
+        acked = []
+        for record, version in done:
+            current = self.journal.pending.get(record["material_id"])
+            if current is record:
+                acked.append(record)
+            elif current is not None:
+                # Пока шла запись, материал изменили снова: новое изменение
+                # переносится на только что записанную версию
+                self.journal.rebase(current, version, record["values"])
+        self.journal.ack(acked)
+        self._audit(done)
+
+        new_failures = []
+        for record, error in [(record, None) for record in conflicted] + failed:
+            if self.journal.pending.get(record["material_id"]) is record:
+                self.failures[record["material_id"]] = (record, error)
+                new_failures.append((record, error))
+
+        self.pending_changed.emit(len(self.journal.pending))
+        if done:
+            self.flushed.emit()
+        if new_failures:
+            self.failed.emit(new_failures)
+        if self._batch():
+            self.timer.start()
+
+
 class MainPage(QWidget):
     def __init__(self, main_window):
         super().__init__()
@@ -207,6 +826,34 @@ class MainPage(QWidget):
         header_frame.setLayout(header_layout)
         layout.addWidget(header_frame)
 
+        # Показатели
+        dashboard_frame = QFrame()
+        dashboard_frame.setStyleSheet("""
+            QFrame {
+                background-color: rgba(255, 255, 255, 180);
+                border-radius: 15px;
+            }
+        """)
+        dashboard_frame.setGraphicsEffect(self.create_shadow())
+
+        dashboard_layout = QVBoxLayout()
+        dashboard_layout.setContentsMargins(30, 20, 30, 20)
+        dashboard_layout.setSpacing(10)
+
+        dashboard_title = QLabel("Показатели")
+        dashboard_title.setFont(QFont("Gabriola", 22, QFont.Bold))
+        dashboard_title.setStyleSheet("color: #2D6033;")
+        dashboard_layout.addWidget(dashboard_title)
+
+        self.dashboard_grid = QGridLayout()
+        self.dashboard_grid.setVerticalSpacing(6)
+        self.dashboard_grid.setHorizontalSpacing(30)
+        dashboard_layout.addLayout(self.dashboard_grid)
+
+        dashboard_frame.setLayout(dashboard_layout)
+        layout.addWidget(dashboard_frame)
+        self.main_window.dashboard_refresher.refreshed.connect(self.on_dashboard_refreshed)
+
         # Кнопки навигации
         buttons_frame = QFrame()
         buttons_frame.setStyleSheet("""
@@ -231,8 +878,17 @@ class MainPage(QWidget):
         materials_btn.setStyleSheet(self.get_button_style())
         materials_btn.clicked.connect(self.main_window.show_materials_page)
 
+        # Значок дефицита материалов, скрыт, пока дефицита нет
+        self.low_stock_badge = QPushButton()
+        self.low_stock_badge.setFont(QFont("Gabriola", 16))
+        self.low_stock_badge.setStyleSheet(self.get_badge_style())
+        self.low_stock_badge.clicked.connect(self.main_window.show_low_stock_materials)
+        self.low_stock_badge.hide()
+        self.main_window.low_stock_monitor.changed.connect(self.update_low_stock_badge)
+
         buttons_layout.addWidget(products_btn)
         buttons_layout.addWidget(materials_btn)
+        buttons_layout.addWidget(self.low_stock_badge)
         buttons_layout.addStretch()
 
         buttons_frame.setLayout(buttons_layout)
@@ -245,6 +901,68 @@ class MainPage(QWidget):
         shadow.setOffset(5, 5)
         return shadow
 
+    def load_dashboard(self):
+        """Читает показатели одним запросом к dashboard_summary"""
+        if not self.main_window.db_connection:
+            return
+
+        try:
+            cursor = self.main_window.db_connection.cursor()
+            summary = dashboard.fetch_summary(cursor)
+        except Exception as e:
+            self.main_window.show_error_message(
+                "Ошибка загрузки показателей",
+                f"Не удалось загрузить показатели: {str(e)}"
+            )
+            return
+        finally:
+            if 'cursor' in locals():
+                cursor.close()
+
+        for i in reversed(range(self.dashboard_grid.count())):
+            widget = self.dashboard_grid.itemAt(i).widget()
+            if widget is not None:
+                widget.deleteLater()
+
+        rows = [("Всего продукции:", f"{summary.product_count} шт.")]
+        for type_name, count, avg_cost in summary.product_types:
+            rows.append((f"{type_name}:", f"{count} шт., средняя стоимость {avg_cost:.2f} ₽"))
+        rows.append(("Стоимость запасов материалов:", f"{summary.inventory_value:.2f} ₽"))
+        rows.append(("Материалы ниже минимума:", f"{summary.low_stock_count}"))
+
+        for row, (title, value) in enumerate(rows):
+            title_label = QLabel(title)
+            title_label.setFont(QFont("Gabriola", 14))
+            title_label.setStyleSheet("color: #555555; font-weight: bold;")
+            value_label = QLabel(value)
+            value_label.setFont(QFont("Gabriola", 14))
+            value_label.setStyleSheet("color: #333333;")
+            self.dashboard_grid.addWidget(title_label, row, 0)
+            self.dashboard_grid.addWidget(value_label, row, 1)
+
+    def on_dashboard_refreshed(self):
+        if self.main_window.stacked_widget.currentWidget() is self:
+            self.load_dashboard()
+
+    def update_low_stock_badge(self, count):
+        self.low_stock_badge.setText(f"Материалы ниже минимума: {count}")
+        self.low_stock_badge.setVisible(count > 0)
+
+    def get_badge_style(self):
+        return """
+            QPushButton {
+                background-color: #D9534F;
+                color: white;
+                border: none;
+                padding: 10px 30px;
+                border-radius: 8px;
+                font-weight: bold;
+            }
+            QPushButton:hover {
+                background-color: #E06A66;
+            }
+        """
+
     def get_button_style(self):
         return """
             QPushButton {
@@ -265,11 +983,136 @@ class MainPage(QWidget):
         """
 
 
+def add_quick_open(page, header_layout):
+    """Добавляет в заголовок страницы кнопку быстрого перехода и сочетание Ctrl+K"""
+    quick_open_button = QPushButton("Найти (Ctrl+K)")
+    quick_open_button.setFont(QFont("Gabriola", 14))
+    quick_open_button.setStyleSheet(page.get_button_style())
+    quick_open_button.clicked.connect(lambda: page.show_quick_open())
+    header_layout.addWidget(quick_open_button)
+
+    # Сочетание действует, только пока страница показана
+    shortcut = QShortcut(QKeySequence("Ctrl+K"), page)
+    shortcut.activated.connect(lambda: page.show_quick_open())
+
+
+def confirm_duplicates(dialog, duplicates, limit=5):
+    """Спрашивает, сохранять ли строку, похожую на уже существующие"""
+    if not duplicates:
+        return True
+    lines = [f"• {label} — {reason}" for _, label, reason in duplicates[:limit]]
+    if len(duplicates) > limit:
+        lines.append(f"… и еще {len(duplicates) - limit}")
+    reply = QMessageBox.question(
+        dialog, "Возможные дубли",
+        "Возможные дубли:\n" + "\n".join(lines) + "\n\nСохранить все равно?",
+        QMessageBox.Yes | QMessageBox.No, QMessageBox.No
+    )
+    return reply == QMessageBox.Yes
+
+
+class QuickOpenDialog(QDialog):
+    """Палитра быстрого перехода: совпадения ищутся в индексе в памяти на каждое нажатие"""
+
+    LIMIT = 12
+
+    def __init__(self, parent, index, placeholder):
+        super().__init__(parent)
+        self.index = index
+        self.selected_id = None
+        self.setModal(True)
+        self.setWindowTitle("Быстрый переход")
+        self.setMinimumWidth(560)
+        self.setStyleSheet("""
+            QDialog {
+                background-color: #FFFFFF;
+                font-family: Gabriola;
+                font-size: 14px;
+            }
+            QLineEdit, QListWidget {
+                border: 1px solid #BBD9B2;
+                border-radius: 4px;
+                padding: 5px;
+            }
+            QListWidget::item:selected {
+                background-color: #3E8043;
+                color: white;
+            }
+        """)
+
+        layout = QVBoxLayout()
+        self.setLayout(layout)
+
+        self.search_edit = QLineEdit()
+        self.search_edit.setFont(QFont("Gabriola", 14))
+        self.search_edit.setPlaceholderText(placeholder)
+        self.search_edit.textChanged.connect(self.update_matches)
+        self.search_edit.returnPressed.connect(self.open_selected)
+        # Стрелки в строке поиска перемещают выбор в списке совпадений
+        self.search_edit.installEventFilter(self)
+        layout.addWidget(self.search_edit)
+
+        self.matches_list = QListWidget()
+        self.matches_list.setFont(QFont("Gabriola", 13))
+        self.matches_list.itemActivated.connect(self.open_selected)
+        layout.addWidget(self.matches_list)
+
+    def reset(self):
+        """Очищает поиск перед очередным открытием"""
+        self.selected_id = None
+        self.search_edit.clear()
+        self.matches_list.clear()
+        self.search_edit.setFocus()
+
+    def update_matches(self, text):
+        self.matches_list.clear()
+        for row_id, label in self.index.search(text, self.LIMIT):
+            item = QListWidgetItem(label)
+            item.setData(Qt.UserRole, row_id)
+            self.matches_list.addItem(item)
+        if self.matches_list.count():
+            self.matches_list.setCurrentRow(0)
+
+    def open_selected(self, *args):
+        item = self.matches_list.currentItem()
+        if item is None:
+            return
+        self.selected_id = item.data(Qt.UserRole)
+        self.accept()
+
+    def eventFilter(self, watched, event):
+        if watched is self.search_edit and event.type() == QEvent.KeyPress \
+                and event.key() in (Qt.Key_Up, Qt.Key_Down):
+            row = self.matches_list.currentRow() + (-1 if event.key() == Qt.Key_Up else 1)
+            if 0 <= row < self.matches_list.count():
+                self.matches_list.setCurrentRow(row)
+            return True
+        return super().eventFilter(watched, event)
+
+
 class ProductsPage(QWidget):
+    # Варианты сортировки: название и ключи (столбец ProductStore, по убыванию)
+    SORT_OPTIONS = (
+        ("По наименованию", (("name", False),)),
+        ("Сначала дешевые", (("min_cost", False), ("name", False))),
+        ("Сначала дорогие", (("min_cost", True), ("name", False))),
+        ("По ширине", (("width", False), ("name", False))),
+        ("По типу", (("type_name", False), ("name", False))),
+        ("По артикулу", (("articul", False),)),
+    )
+
     def __init__(self, main_window):
         super().__init__()
         self.main_window = main_window
+        self.products = None  # загруженная продукция (ProductStore)
+        self.show_archived = False  # список архива вместо продукции в работе
+        # Быстрый переход (Ctrl+K): строится из загруженного списка при первом поиске,
+        # дополняется при сохранении
+        self.quick_index = QuickOpenIndex(("articul", "name"))
+        self.quick_open_dialog = None
+        self.duplicates = dedup.DuplicateDetector()  # строится при первой проверке
         self.init_ui()
+        self.card_list = CardList(self.scroll_content_layout)
 
     def init_ui(self):
         # Градиентный фон
@@ -311,6 +1154,10 @@ class ProductsPage(QWidget):
         header_layout.addWidget(title_label)
         header_layout.addStretch()
 
+        # Сортировка и группировка загруженных карточек, быстрый переход к строке
+        add_sort_controls(self, header_layout)
+        add_quick_open(self, header_layout)
+
         header_frame.setLayout(header_layout)
         layout.addWidget(header_frame)
 
@@ -383,16 +1230,23 @@ class ProductsPage(QWidget):
         self.refresh_button = QPushButton("Обновить")
         self.refresh_button.setFont(QFont("Gabriola", 14))
         self.refresh_button.setStyleSheet(self.get_button_style())
-        self.refresh_button.clicked.connect(self.load_products)
+        self.refresh_button.clicked.connect(self.refresh_products)
 
         self.calculate_button = QPushButton("Пересчитать стоимость")
         self.calculate_button.setFont(QFont("Gabriola", 14))
         self.calculate_button.setStyleSheet(self.get_button_style())
         self.calculate_button.clicked.connect(self.recalculate_all_prices)
 
+        self.simulate_button = QPushButton("Моделирование цен")
+        self.simulate_button.setFont(QFont("Gabriola", 14))
+        self.simulate_button.setStyleSheet(self.get_button_style())
+        self.simulate_button.clicked.connect(self.show_price_simulation)
+
         buttons_layout.addWidget(self.add_button)
         buttons_layout.addWidget(self.refresh_button)
         buttons_layout.addWidget(self.calculate_button)
+        buttons_layout.addWidget(self.simulate_button)
+        add_archive_controls(self, buttons_layout)
         buttons_layout.addStretch()
 
         buttons_frame.setLayout(buttons_layout)
@@ -405,6 +1259,7 @@ class ProductsPage(QWidget):
         shadow.setOffset(5, 5)
         return shadow
 
+    @ui_monitor.timed("products.load")
     def load_products(self):
         """Загрузка списка продукции из базы данных"""
         if not self.main_window.db_connection:
@@ -415,31 +1270,26 @@ class ProductsPage(QWidget):
             widget = self.scroll_content_layout.itemAt(i).widget()
             if widget is not None:
                 widget.deleteLater()
+        self.card_list.clear()
 
         try:
             cursor = self.main_window.db_connection.cursor()
 
             # Получаем данные о продукции
-            query = """SELECT 
-                    p.id_product,
-                    tp.type_product,
-                    p.product_name,
-                    p.min_cost,
-                    p.acrticul,
-                    p.width
-                FROM products p
-                JOIN type_product tp ON p.id_type_product = tp.id_type_product
-                ORDER BY p.product_name"""
-
-            cursor.execute(query)
-            products = cursor.fetchall()
+            query = statements.PRODUCTS_ARCHIVED_LIST if self.show_archived else statements.PRODUCTS_LIST
+
+            # Строки хранятся компактно по столбцам, карточки читают значения из хранилища
+            products = self.main_window.query_cache.fetchall(cursor, query, build=ProductStore)
+            self.products = products
 
             if not products:
-                self.main_window.show_info_message("Информация", "В базе данных нет продукции.")
+                if not self.show_archived:
+                    self.main_window.show_info_message("Информация", "В базе данных нет продукции.")
                 return
 
             for product in products:
-                self.add_product_card(*product)
+                self.add_product_card(product.id, product.type_name, product.name, product.min_cost)
+            self.apply_order()
 
         except Exception as e:
             self.main_window.show_error_message(
@@ -450,7 +1300,107 @@ class ProductsPage(QWidget):
             if 'cursor' in locals():
                 cursor.close()
 
-    def add_product_card(self, product_id, product_type, product_name, min_cost, acrticul, width):
+    @ui_monitor.timed("products.sort")
+    def apply_order(self):
+        """Переставляет карточки в выбранном порядке без перезапроса и пересоздания"""
+        if not self.products:
+            return
+        order = self.SORT_OPTIONS[self.sort_combo.currentIndex()][1]
+        group_by = "type_name" if self.group_button.isChecked() else None
+        self.card_list.arrange(self.products, self.products.permutation(order, group_by), group_by)
+
+    def refresh_products(self):
+        """Перечитывает продукцию из базы, минуя кэш (изменения с других рабочих мест)"""
+        self.main_window.query_cache.invalidate("products", "type_product")
+        self.quick_index.stale = True
+        self.duplicates.stale = True
+        self.load_products()
+
+    @staticmethod
+    def quick_label(articul, product_name, type_name):
+        return f"{articul} — {product_name} ({type_name})"
+
+    def show_quick_open(self):
+        """Переход к продукту по артикулу или началу наименования (Ctrl+K)"""
+        if not self.main_window.db_connection:
+            return
+        if self.quick_index.stale:
+            self.quick_index.rebuild(
+                (product.id, self.quick_label(product.articul, product.name, product.type_name),
+                 (product.articul, product.name)) for product in self.active_products())
+        if self.quick_open_dialog is None:
+            self.quick_open_dialog = QuickOpenDialog(self, self.quick_index, "Артикул или начало наименования")
+        self.quick_open_dialog.reset()
+        if self.quick_open_dialog.exec() != QDialog.Accepted:
+            return
+        product_id = self.quick_open_dialog.selected_id
+        if product_id not in self.card_list.cards and self.show_archived:
+            # Открыт список архива, а поиск — по продукции в работе
+            self.archive_button.setChecked(False)
+        self.card_list.reveal(product_id, self.scroll_area)
+
+    def active_products(self):
+        """Продукция в работе, а не список архива (список обычно в кэше).
+
+        Всегда читается запросом PRODUCTS_LIST, а не из загруженного списка:
+        на странице может быть открыт архив.
+        """
+        cursor = self.main_window.db_connection.cursor()
+        try:
+            return self.main_window.query_cache.fetchall(cursor, statements.PRODUCTS_LIST, build=ProductStore)
+        finally:
+            cursor.close()
+
+    def possible_duplicates(self, articul, product_name, exclude=None):
+        """Продукты с тем же артикулом или похожим наименованием: [(id, подпись, причина)]"""
+        if self.duplicates.stale:
+            if not self.main_window.db_connection:
+                return []
+            self.duplicates.rebuild(
+                (product.id, f"{product.articul} — {product.name}", product.name, product.articul)
+                for product in self.active_products())
+        return self.duplicates.check(product_name, articul, exclude)
+
+    def set_show_archived(self, checked):
+        """Переключает список между продукцией в работе и архивом"""
+        self.show_archived = checked
+        self.load_products()
+
+    def set_archived(self, product_id, archived):
+        """Переносит продукт в архив или возвращает из архива"""
+        product = self.products.get(product_id)
+        if not confirm_archive(self, product.name, archived):
+            return
+        try:
+            archive.set_archived(self.main_window.db_connection, archive.PRODUCTS, product_id, archived)
+        except Exception as e:
+            self.main_window.show_error_message(
+                "Ошибка архива",
+                f"Не удалось изменить состояние продукта: {str(e)}"
+            )
+            return
+        self.main_window.tables_changed("products")
+        if archived:
+            self.quick_index.remove(product_id)
+            self.duplicates.remove(product_id)
+        else:
+            self.quick_index.stale = True
+            self.duplicates.stale = True
+        self.load_products()
+
+    def product_saved(self, product_id, articul, product_name, type_name):
+        """Обновляет индексы поиска после сохранения продукта"""
+        if self.show_archived:
+            # Продукт мог быть из архива: индексы перестроятся из продукции в работе
+            self.quick_index.stale = True
+            self.duplicates.stale = True
+            return
+        self.quick_index.update(
+            product_id, self.quick_label(articul, product_name, type_name), (articul, product_name))
+        if not self.duplicates.stale:
+            self.duplicates.update(product_id, f"{articul} — {product_name}", product_name, articul)
+
+    def add_product_card(self, product_id, product_type, product_name, min_cost):
         """Добавляет карточку продукта в интерфейс"""
         card = QFrame()
         card.setFrameShape(QFrame.StyledPanel)
@@ -490,7 +1440,8 @@ class ProductsPage(QWidget):
         name_label.setFont(QFont("Gabriola", 18, QFont.Bold))
         name_label.setStyleSheet("color: white;")
 
-        cost_label = QLabel(f"{min_cost:.2f} ₽")
+        # Пустая цена в базе показывается прочерком, а не нулем
+        cost_label = QLabel("— ₽" if min_cost is None else f"{min_cost:.2f} ₽")
         cost_label.setFont(QFont("Gabriola", 16, QFont.Bold))
         cost_label.setStyleSheet("color: white;")
 
@@ -501,75 +1452,124 @@ class ProductsPage(QWidget):
         header_frame.setLayout(header_layout)
         main_card_layout.addWidget(header_frame)
 
-        # Детали продукта
+        # Детали продукта загружаются при первом раскрытии карточки
         details_frame = QFrame()
-        details_layout = QGridLayout()
-        details_layout.setContentsMargins(5, 5, 5, 5)
-        details_layout.setVerticalSpacing(8)
-        details_layout.setHorizontalSpacing(15)
+        details_frame.setVisible(False)
+        main_card_layout.addWidget(details_frame)
 
-        # Артикул
-        articul_title = QLabel("Артикул:")
-        articul_title.setFont(QFont("Gabriola", 12))
-        articul_title.setStyleSheet("color: #555555; font-weight: bold;")
-
-        articul_value = QLabel(acrticul)
-        articul_value.setFont(QFont("Gabriola", 12))
-        articul_value.setStyleSheet("color: #333333;")
-
-        # Ширина
-        width_title = QLabel("Ширина:")
-        width_title.setFont(QFont("Gabriola", 12))
-        width_title.setStyleSheet("color: #555555; font-weight: bold;")
-
-        width_value = QLabel(f"{width} м")
-        width_value.setFont(QFont("Gabriola", 12))
-        width_value.setStyleSheet("color: #333333;")
-
-        # Стоимость
-        cost_title = QLabel("Мин. стоимость:")
-        cost_title.setFont(QFont("Gabriola", 12))
-        cost_title.setStyleSheet("color: #555555; font-weight: bold;")
-
-        cost_value = QLabel(f"{min_cost:.2f} ₽")
-        cost_value.setFont(QFont("Gabriola", 12))
-        cost_value.setStyleSheet("color: #333333;")
-
-        # Размещаем элементы в сетке
-        details_layout.addWidget(articul_title, 0, 0)
-        details_layout.addWidget(articul_value, 0, 1)
-        details_layout.addWidget(width_title, 1, 0)
-        details_layout.addWidget(width_value, 1, 1)
-        details_layout.addWidget(cost_title, 2, 0)
-        details_layout.addWidget(cost_value, 2, 1)
+        buttons_layout = QHBoxLayout()
+        buttons_layout.addStretch()
 
-        details_frame.setLayout(details_layout)
-        main_card_layout.addWidget(details_frame)
+        # Кнопка подробностей
+        details_button = QPushButton("Подробнее")
+        details_button.setFont(QFont("Gabriola", 12))
+        details_button.setStyleSheet(self.get_button_style())
+        details_button.setCheckable(True)
+        details_button.toggled.connect(
+            lambda checked: self.toggle_product_details(product_id, details_frame, checked))
+        buttons_layout.addWidget(details_button)
 
         # Кнопка редактирования
         edit_button = QPushButton("Редактировать")
         edit_button.setFont(QFont("Gabriola", 12))
         edit_button.setStyleSheet(self.get_button_style())
         edit_button.clicked.connect(lambda: self.show_edit_product_dialog(product_id))
-        main_card_layout.addWidget(edit_button, alignment=Qt.AlignRight)
+        buttons_layout.addWidget(edit_button)
+        add_archive_button(self, buttons_layout, product_id)
+        main_card_layout.addLayout(buttons_layout)
 
         card.setLayout(main_card_layout)
-        self.scroll_content_layout.addWidget(card)
+        self.card_list.add(product_id, card)
+
+    def toggle_product_details(self, product_id, details_frame, expanded):
+        """Показывает/скрывает подробности продукта, при первом показе загружает их"""
+        if expanded and details_frame.layout() is None:
+            self.load_product_details(product_id, details_frame)
+        details_frame.setVisible(expanded)
+
+    @ui_monitor.timed("products.details")
+    def load_product_details(self, product_id, details_frame):
+        """Загружает поля строки и состав продукта в раскрытую карточку.
+
+        Строка читается тем же запросом, что и в ProductDialog, и кэшируется по id:
+        открытие просмотренного продукта не требует обращения к базе.
+        """
+        details_layout = QGridLayout()
+        details_layout.setContentsMargins(5, 5, 5, 5)
+        details_layout.setVerticalSpacing(8)
+        details_layout.setHorizontalSpacing(15)
+        details_frame.setLayout(details_layout)
+
+        try:
+            cursor = self.main_window.db_connection.cursor()
+            product_data = self.main_window.query_cache.fetchone(
+                cursor, statements.PRODUCT_ROW, (product_id,))
+            composition = self.main_window.query_cache.fetchall(
+                cursor, statements.PRODUCT_COMPOSITION, (product_id,))
+        except Exception as e:
+            self.main_window.show_error_message(
+                "Ошибка загрузки данных",
+                f"Не удалось загрузить данные продукта: {str(e)}"
+            )
+            return
+        finally:
+            if 'cursor' in locals():
+                cursor.close()
+
+        if product_data is None:
+            add_detail_row(details_layout, "Продукт удален", "")
+            return
+
+        add_detail_row(details_layout, "Артикул:", product_data[0])
+        add_detail_row(details_layout, "Ширина:", f"{product_data[4]} м")
+        add_detail_row(details_layout, "Состав:", "" if composition else "не указан")
+        for material_name, quantity, unit, cost in composition:
+            add_detail_row(details_layout, f"  {material_name}", f"{float(quantity):g} {unit} — {cost:.2f} ₽")
 
     def show_add_product_dialog(self):
         """Показывает диалог добавления нового продукта"""
-        dialog = ProductDialog(self.main_window, self.main_window.db_connection)
+        with ui_monitor.MONITOR.operation("dialog.product.open"):
+            dialog = self.main_window.editor_dialog(ProductDialog)
         if dialog.exec() == QDialog.Accepted:
             self.load_products()
             self.main_window.show_info_message("Успех", "Продукт успешно добавлен.")
 
     def show_edit_product_dialog(self, product_id):
         """Показывает диалог редактирования продукта"""
-        dialog = ProductDialog(self.main_window, self.main_window.db_connection, product_id)
+        with ui_monitor.MONITOR.operation("dialog.product.open"):
+            dialog = self.main_window.editor_dialog(ProductDialog, product_id)
         if dialog.exec() == QDialog.Accepted:
             self.load_products()
             self.main_window.show_info_message("Успех", "Продукт успешно обновлен.")
 
+    def show_price_simulation(self):
+        """Моделирование цен при других коэффициентах типов и ценах материалов"""
+        if not self.main_window.db_connection:
+            return
+
+        try:
+            cursor = self.main_window.db_connection.cursor()
+            try:
+                with ui_monitor.MONITOR.operation("products.simulation_load"):
+                    catalogue = price_simulation.Catalogue.load(cursor)
+            finally:
+                cursor.close()
+        except Exception as e:
+            self.main_window.show_error_message(
+                "Ошибка загрузки каталога",
+                f"Не удалось загрузить каталог для моделирования: {str(e)}"
+            )
+            return
+
+        dialog = PriceSimulationDialog(self, self.main_window.db_connection, catalogue)
+        if dialog.exec() == QDialog.Accepted:
+            self.main_window.tables_changed("products", "materials", "type_product")
+            self.load_products()
+            self.main_window.show_info_message(
+                "Сценарий применен",
+                f"Стоимость изменена для {dialog.applied} продуктов."
+            )
+
     def recalculate_all_prices(self):
         """Пересчет стоимости для всей продукции"""
         if not self.main_window.db_connection:
@@ -587,28 +1587,17 @@ class ProductsPage(QWidget):
         try:
             cursor = self.main_window.db_connection.cursor()
 
-            # Получаем список всех продуктов
-            cursor.execute("SELECT id_product FROM products")
-            product_ids = [row[0] for row in cursor.fetchall()]
-
-            if not product_ids:
+            statements.PRODUCT_ID_RANGE.execute(cursor)
+            if cursor.fetchone()[0] is None:
                 self.main_window.show_info_message("Информация", "Нет продукции для пересчета.")
                 return
 
-            # Пересчитываем стоимость для каждого продукта
-            updated_count = 0
-            for product_id in product_ids:
-                new_price = self.calculate_product_cost(product_id)
-
-                if new_price is not None:
-                    # Обновляем стоимость в базе данных
-                    update_query = """UPDATE products 
-                                    SET min_cost = %s 
-                                    WHERE id_product = %s"""
-                    cursor.execute(update_query, (new_price, product_id))
-                    updated_count += 1
+            # Правила компилируются один раз, пересчет выполняется одним запросом
+            with ui_monitor.MONITOR.operation("products.recalculate"):
+                engine = PricingEngine.load(cursor)
+                updated_count = engine.reprice_all(cursor)
 
-            self.main_window.db_connection.commit()
+            self.main_window.tables_changed("products")
             self.load_products()
 
             self.main_window.show_info_message(
@@ -617,7 +1606,6 @@ class ProductsPage(QWidget):
             )
 
         except Exception as e:
-            self.main_window.db_connection.rollback()
             self.main_window.show_error_message(
                 "Ошибка пересчета стоимости",
                 f"Произошла ошибка при пересчете стоимости: {str(e)}"
@@ -627,40 +1615,25 @@ class ProductsPage(QWidget):
                 cursor.close()
 
     def calculate_product_cost(self, product_id):
-        """Рассчитывает стоимость продукта на основе типа продукта и его ширины"""
+        """Рассчитывает стоимость продукта по правилу ценообразования его типа"""
         if not self.main_window.db_connection:
             return None
 
         try:
             cursor = self.main_window.db_connection.cursor()
 
-            # Получаем данные о продукте: ширину и коэффициент типа продукта
-            cursor.execute("""
-                SELECT p.width, tp.coefficient_type_product 
-                FROM products p
-                JOIN type_product tp ON p.id_type_product = tp.id_type_product
-                WHERE p.id_product = %s
-            """, (product_id,))
+            # Цена считается по правилу ценообразования для типа продукта
+            engine = PricingEngine.load(cursor)
+            total_cost = engine.price_product(cursor, product_id)
 
-            product_data = cursor.fetchone()
-
-            if not product_data:
+            if total_cost is None:
                 self.main_window.show_warning_message(
                     "Предупреждение",
                     f"Для продукта ID {product_id} не найдены данные. Стоимость не будет пересчитана."
                 )
                 return None
 
-            width, coefficient = product_data
-
-            # Базовая стоимость за метр ширины (можно настроить)
-            BASE_COST_PER_METER = 100.0
-
-            # Рассчитываем стоимость: ширина * базовая стоимость * коэффициент типа
-            total_cost = width * BASE_COST_PER_METER * coefficient
-
-            # Округляем до 2 знаков после запятой
-            return round(total_cost, 2)
+            return total_cost
 
         except Exception as e:
             self.main_window.show_error_message(
@@ -693,10 +1666,29 @@ class ProductsPage(QWidget):
 
 
 class MaterialsPage(QWidget):
+    # Варианты сортировки: название и ключи (столбец MaterialStore, по убыванию)
+    SORT_OPTIONS = (
+        ("По наименованию", (("name", False),)),
+        ("Сначала дешевые", (("unit_price", False), ("name", False))),
+        ("Сначала дорогие", (("unit_price", True), ("name", False))),
+        ("Больше на складе", (("stock_quantity", True), ("name", False))),
+        ("Меньше на складе", (("stock_quantity", False), ("name", False))),
+        ("По типу", (("type_name", False), ("name", False))),
+    )
+
     def __init__(self, main_window):
         super().__init__()
         self.main_window = main_window
+        self.materials = None  # загруженные материалы (MaterialStore)
+        self.low_stock_only = False
+        self.show_archived = False  # список архива вместо материалов в работе
+        # Быстрый переход (Ctrl+K): строится из полного списка при первом поиске,
+        # дополняется при сохранении
+        self.quick_index = QuickOpenIndex(("name",))
+        self.quick_open_dialog = None
+        self.duplicates = dedup.DuplicateDetector()  # строится при первой проверке
         self.init_ui()
+        self.card_list = CardList(self.scroll_content_layout)
 
     def init_ui(self):
         # Градиентный фон
@@ -738,6 +1730,10 @@ class MaterialsPage(QWidget):
         header_layout.addWidget(title_label)
         header_layout.addStretch()
 
+        # Сортировка и группировка загруженных карточек, быстрый переход к строке
+        add_sort_controls(self, header_layout)
+        add_quick_open(self, header_layout)
+
         header_frame.setLayout(header_layout)
         layout.addWidget(header_frame)
 
@@ -810,10 +1806,33 @@ class MaterialsPage(QWidget):
         self.refresh_button = QPushButton("Обновить")
         self.refresh_button.setFont(QFont("Gabriola", 14))
         self.refresh_button.setStyleSheet(self.get_button_style())
-        self.refresh_button.clicked.connect(self.load_materials)
+        self.refresh_button.clicked.connect(self.refresh_materials)
+
+        self.low_stock_button = QPushButton("Только дефицит")
+        self.low_stock_button.setFont(QFont("Gabriola", 14))
+        self.low_stock_button.setStyleSheet(self.get_button_style())
+        self.low_stock_button.setCheckable(True)
+        self.low_stock_button.toggled.connect(self.set_low_stock_only)
+
+        # Пакетное сохранение для быстрого ввода (например, при инвентаризации)
+        self.write_behind_button = QPushButton("Пакетное сохранение")
+        self.write_behind_button.setFont(QFont("Gabriola", 14))
+        self.write_behind_button.setStyleSheet(self.get_button_style())
+        self.write_behind_button.setCheckable(True)
+        self.write_behind_button.toggled.connect(self.set_write_behind)
+        self.main_window.write_behind.pending_changed.connect(self.update_write_behind_button)
+
+        self.inventory_button = QPushButton("Оценка запасов")
+        self.inventory_button.setFont(QFont("Gabriola", 14))
+        self.inventory_button.setStyleSheet(self.get_button_style())
+        self.inventory_button.clicked.connect(self.show_inventory_valuation)
 
         buttons_layout.addWidget(self.add_button)
         buttons_layout.addWidget(self.refresh_button)
+        buttons_layout.addWidget(self.low_stock_button)
+        buttons_layout.addWidget(self.write_behind_button)
+        buttons_layout.addWidget(self.inventory_button)
+        add_archive_controls(self, buttons_layout)
         buttons_layout.addStretch()
 
         buttons_frame.setLayout(buttons_layout)
@@ -826,6 +1845,7 @@ class MaterialsPage(QWidget):
         shadow.setOffset(5, 5)
         return shadow
 
+    @ui_monitor.timed("materials.load")
     def load_materials(self):
         """Загрузка списка материалов из базы данных"""
         if not self.main_window.db_connection:
@@ -836,33 +1856,34 @@ class MaterialsPage(QWidget):
             widget = self.scroll_content_layout.itemAt(i).widget()
             if widget is not None:
                 widget.deleteLater()
+        self.card_list.clear()
 
         try:
             cursor = self.main_window.db_connection.cursor()
 
-            # Получаем данные о материалах
-            query = """SELECT 
-                    m.id_material,
-                    tm.type_material,
-                    m.material_name,
-                    m.unit_price,
-                    m.stock_quantity,
-                    m.min_quantity,
-                    m.package_quantity,
-                    m.unit
-                FROM materials m
-                JOIN type_material tm ON m.id_type_material = tm.id_type_material
-                ORDER BY m.material_name"""
-
-            cursor.execute(query)
-            materials = cursor.fetchall()
+            # Получаем данные о материалах; в списке архива отбор по дефициту не действует
+            if self.show_archived:
+                query = statements.MATERIALS_ARCHIVED_LIST
+            elif self.low_stock_only:
+                query = statements.MATERIALS_LOW_STOCK_LIST
+            else:
+                query = statements.MATERIALS_LIST
+
+            # Строки хранятся компактно по столбцам, карточки читают значения из хранилища
+            materials = self.main_window.query_cache.fetchall(cursor, query, build=MaterialStore)
+            # Изменения, еще не записанные в базу в режиме пакетного сохранения, видны сразу
+            self.main_window.write_behind.apply_pending(materials)
+            self.materials = materials
 
             if not materials:
-                self.main_window.show_info_message("Информация", "В базе данных нет материалов.")
+                if not self.low_stock_only and not self.show_archived:
+                    self.main_window.show_info_message("Информация", "В базе данных нет материалов.")
                 return
 
             for material in materials:
-                self.add_material_card(*material)
+                self.add_material_card(material.id, material.type_name, material.name, material.unit_price,
+                                       material.unit, material.low_stock)
+            self.apply_order()
 
         except Exception as e:
             self.main_window.show_error_message(
@@ -873,18 +1894,138 @@ class MaterialsPage(QWidget):
             if 'cursor' in locals():
                 cursor.close()
 
-    def add_material_card(self, material_id, material_type, material_name, unit_price, stock_quantity, min_quantity,
-                          package_quantity, unit):
+    @ui_monitor.timed("materials.sort")
+    def apply_order(self):
+        """Переставляет карточки в выбранном порядке без перезапроса и пересоздания"""
+        if not self.materials:
+            return
+        order = self.SORT_OPTIONS[self.sort_combo.currentIndex()][1]
+        group_by = "type_name" if self.group_button.isChecked() else None
+        self.card_list.arrange(self.materials, self.materials.permutation(order, group_by), group_by)
+
+    def set_write_behind(self, checked):
+        """Включает/выключает пакетное сохранение изменений материалов"""
+        self.main_window.write_behind.enabled = checked
+
+    def update_write_behind_button(self, pending_count):
+        text = "Пакетное сохранение"
+        self.write_behind_button.setText(f"{text} ({pending_count})" if pending_count else text)
+
+    def set_low_stock_only(self, checked):
+        """Включает/выключает отбор материалов ниже минимального остатка"""
+        self.low_stock_only = checked
+        self.load_materials()
+
+    def refresh_materials(self):
+        """Перечитывает материалы из базы, минуя кэш (изменения с других рабочих мест)"""
+        self.main_window.query_cache.invalidate("materials", "type_material")
+        self.quick_index.stale = True
+        self.duplicates.stale = True
+        self.load_materials()
+
+    @staticmethod
+    def quick_label(material_name, type_name):
+        return f"{material_name} ({type_name})"
+
+    def show_quick_open(self):
+        """Переход к материалу по началу наименования (Ctrl+K)"""
+        if not self.main_window.db_connection:
+            return
+        if self.quick_index.stale:
+            self.quick_index.rebuild(
+                (material.id, self.quick_label(material.name, material.type_name), (material.name,))
+                for material in self.all_materials())
+        if self.quick_open_dialog is None:
+            self.quick_open_dialog = QuickOpenDialog(self, self.quick_index, "Начало наименования материала")
+        self.quick_open_dialog.reset()
+        if self.quick_open_dialog.exec() != QDialog.Accepted:
+            return
+        material_id = self.quick_open_dialog.selected_id
+        if material_id not in self.card_list.cards and self.show_archived:
+            # Открыт список архива, а поиск — по материалам в работе
+            self.archive_button.setChecked(False)
+        if material_id not in self.card_list.cards and self.low_stock_only:
+            # Материал скрыт отбором по дефициту
+            self.low_stock_button.setChecked(False)
+        self.card_list.reveal(material_id, self.scroll_area)
+
+    def all_materials(self):
+        """Все материалы в работе, а не отбор по дефициту или архив (список обычно в кэше).
+
+        Всегда читается запросом MATERIALS_LIST, а не из загруженного списка:
+        на странице может быть открыт архив или отбор по дефициту.
+        """
+        cursor = self.main_window.db_connection.cursor()
+        try:
+            materials = self.main_window.query_cache.fetchall(
+                cursor, statements.MATERIALS_LIST, build=MaterialStore)
+            self.main_window.write_behind.apply_pending(materials)
+        finally:
+            cursor.close()
+        return materials
+
+    def possible_duplicates(self, material_name, exclude=None):
+        """Материалы с похожим наименованием: [(id, подпись, причина)]"""
+        if self.duplicates.stale:
+            if not self.main_window.db_connection:
+                return []
+            self.duplicates.rebuild(
+                (material.id, material.name, material.name, None) for material in self.all_materials())
+        return self.duplicates.check(material_name, exclude=exclude)
+
+    def set_show_archived(self, checked):
+        """Переключает список между материалами в работе и архивом"""
+        self.show_archived = checked
+        self.load_materials()
+
+    def set_archived(self, material_id, archived):
+        """Переносит материал в архив или возвращает из архива"""
+        material = self.materials.get(material_id)
+        if not confirm_archive(self, material.name, archived):
+            return
+        try:
+            archive.set_archived(self.main_window.db_connection, archive.MATERIALS, material_id, archived)
+        except Exception as e:
+            self.main_window.show_error_message(
+                "Ошибка архива",
+                f"Не удалось изменить состояние материала: {str(e)}"
+            )
+            return
+        self.main_window.tables_changed("materials")
+        self.main_window.low_stock_monitor.refresh()
+        if archived:
+            self.quick_index.remove(material_id)
+            self.duplicates.remove(material_id)
+        else:
+            self.quick_index.stale = True
+            self.duplicates.stale = True
+        self.load_materials()
+
+    def material_saved(self, material_id, material_name, type_name):
+        """Обновляет индексы поиска после сохранения материала"""
+        if self.show_archived:
+            # Материал мог быть из архива: индексы перестроятся из материалов в работе
+            self.quick_index.stale = True
+            self.duplicates.stale = True
+            return
+        self.quick_index.update(
+            material_id, self.quick_label(material_name, type_name), (material_name,))
+        if not self.duplicates.stale:
+            self.duplicates.update(material_id, material_name, material_name)
+
+    def add_material_card(self, material_id, material_type, material_name, unit_price, unit, is_low_stock):
         """Добавляет карточку материала в интерфейс"""
         card = QFrame()
         card.setFrameShape(QFrame.StyledPanel)
-        card.setStyleSheet("""
-            QFrame {
+        # Материалы ниже минимального остатка выделяются красной рамкой
+        border_color = "#D9534F" if is_low_stock else "#BBD9B2"
+        card.setStyleSheet(f"""
+            QFrame {{
                 background-color: rgba(255, 255, 255, 200);
                 border-radius: 12px;
                 padding: 5px;
-                border: 1px solid #BBD9B2;
-            }
+                border: 1px solid {border_color};
+            }}
         """)
         card.setGraphicsEffect(self.create_shadow())
         card.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
@@ -914,7 +2055,7 @@ class MaterialsPage(QWidget):
         name_label.setFont(QFont("Gabriola", 18, QFont.Bold))
         name_label.setStyleSheet("color: white;")
 
-        price_label = QLabel(f"{unit_price:.2f} ₽/{unit}")
+        price_label = QLabel(f"— ₽/{unit}" if unit_price is None else f"{unit_price:.2f} ₽/{unit}")
         price_label.setFont(QFont("Gabriola", 16, QFont.Bold))
         price_label.setStyleSheet("color: white;")
 
@@ -925,71 +2066,114 @@ class MaterialsPage(QWidget):
         header_frame.setLayout(header_layout)
         main_card_layout.addWidget(header_frame)
 
-        # Детали материала
+        # Детали материала загружаются при первом раскрытии карточки
         details_frame = QFrame()
-        details_layout = QGridLayout()
-        details_layout.setContentsMargins(5, 5, 5, 5)
-        details_layout.setVerticalSpacing(8)
-        details_layout.setHorizontalSpacing(15)
+        details_frame.setVisible(False)
+        main_card_layout.addWidget(details_frame)
 
-        # Количество на складе
-        stock_title = QLabel("На складе:")
-        stock_title.setFont(QFont("Gabriola", 12))
-        stock_title.setStyleSheet("color: #555555; font-weight: bold;")
-
-        stock_value = QLabel(f"{stock_quantity} {unit}")
-        stock_value.setFont(QFont("Gabriola", 12))
-        stock_value.setStyleSheet("color: #333333;")
-
-        # Минимальное количество
-        min_qty_title = QLabel("Мин. заказ:")
-        min_qty_title.setFont(QFont("Gabriola", 12))
-        min_qty_title.setStyleSheet("color: #555555; font-weight: bold;")
-
-        min_qty_value = QLabel(f"{min_quantity} {unit}")
-        min_qty_value.setFont(QFont("Gabriola", 12))
-        min_qty_value.setStyleSheet("color: #333333;")
-
-        # Упаковка
-        package_title = QLabel("Упаковка:")
-        package_title.setFont(QFont("Gabriola", 12))
-        package_title.setStyleSheet("color: #555555; font-weight: bold;")
-
-        package_value = QLabel(f"{package_quantity} {unit}")
-        package_value.setFont(QFont("Gabriola", 12))
-        package_value.setStyleSheet("color: #333333;")
-
-        # Размещаем элементы в сетке
-        details_layout.addWidget(stock_title, 0, 0)
-        details_layout.addWidget(stock_value, 0, 1)
-        details_layout.addWidget(min_qty_title, 1, 0)
-        details_layout.addWidget(min_qty_value, 1, 1)
-        details_layout.addWidget(package_title, 2, 0)
-        details_layout.addWidget(package_value, 2, 1)
+        buttons_layout = QHBoxLayout()
+        buttons_layout.addStretch()
 
-        details_frame.setLayout(details_layout)
-        main_card_layout.addWidget(details_frame)
+        # Кнопка подробностей
+        details_button = QPushButton("Подробнее")
+        details_button.setFont(QFont("Gabriola", 12))
+        details_button.setStyleSheet(self.get_button_style())
+        details_button.setCheckable(True)
+        details_button.toggled.connect(
+            lambda checked: self.toggle_material_details(material_id, details_frame, checked))
+        buttons_layout.addWidget(details_button)
 
         # Кнопка редактирования
         edit_button = QPushButton("Редактировать")
         edit_button.setFont(QFont("Gabriola", 12))
         edit_button.setStyleSheet(self.get_button_style())
         edit_button.clicked.connect(lambda: self.show_edit_material_dialog(material_id))
-        main_card_layout.addWidget(edit_button, alignment=Qt.AlignRight)
+        buttons_layout.addWidget(edit_button)
+        add_archive_button(self, buttons_layout, material_id)
+        main_card_layout.addLayout(buttons_layout)
 
         card.setLayout(main_card_layout)
-        self.scroll_content_layout.addWidget(card)
+        self.card_list.add(material_id, card)
+
+    def toggle_material_details(self, material_id, details_frame, expanded):
+        """Показывает/скрывает подробности материала, при первом показе загружает их"""
+        if expanded and details_frame.layout() is None:
+            self.load_material_details(material_id, details_frame)
+        details_frame.setVisible(expanded)
+
+    @ui_monitor.timed("materials.details")
+    def load_material_details(self, material_id, details_frame):
+        """Загружает остатки материала и продукцию, в которой он используется.
+
+        Строка читается тем же запросом, что и в MaterialDialog, и кэшируется по id.
+        """
+        details_layout = QGridLayout()
+        details_layout.setContentsMargins(5, 5, 5, 5)
+        details_layout.setVerticalSpacing(8)
+        details_layout.setHorizontalSpacing(15)
+        details_frame.setLayout(details_layout)
+
+        try:
+            cursor = self.main_window.db_connection.cursor()
+            material_data = self.main_window.query_cache.fetchone(
+                cursor, statements.MATERIAL_ROW, (material_id,))
+            usage = self.main_window.query_cache.fetchall(
+                cursor, statements.MATERIAL_USAGE, (material_id,))
+        except Exception as e:
+            self.main_window.show_error_message(
+                "Ошибка загрузки данных",
+                f"Не удалось загрузить данные материала: {str(e)}"
+            )
+            return
+        finally:
+            if 'cursor' in locals():
+                cursor.close()
+
+        if material_data is None:
+            add_detail_row(details_layout, "Материал удален", "")
+            return
+
+        unit = material_data[6]
+        add_detail_row(details_layout, "На складе:", f"{material_data[3]} {unit}")
+        add_detail_row(details_layout, "Мин. заказ:", f"{material_data[4]} {unit}")
+        add_detail_row(details_layout, "Упаковка:", f"{material_data[5]} {unit}")
+        add_detail_row(details_layout, "Используется в:", "" if usage else "не используется")
+        for product_name, quantity in usage:
+            add_detail_row(details_layout, f"  {product_name}", f"{float(quantity):g} {unit}")
+
+    def show_inventory_valuation(self):
+        """Стоимость запасов, упаковки и количества по типам материалов"""
+        if not self.main_window.db_connection:
+            return
+
+        try:
+            cursor = self.main_window.db_connection.cursor()
+            try:
+                with ui_monitor.MONITOR.operation("materials.valuation"):
+                    valuation = inventory.load(self.main_window.query_cache, cursor)
+            finally:
+                cursor.close()
+        except Exception as e:
+            self.main_window.show_error_message(
+                "Ошибка оценки запасов",
+                f"Не удалось рассчитать стоимость запасов: {str(e)}"
+            )
+            return
+
+        InventoryDialog(self, valuation).exec()
 
     def show_add_material_dialog(self):
         """Показывает диалог добавления нового материала"""
-        dialog = MaterialDialog(self.main_window, self.main_window.db_connection)
+        with ui_monitor.MONITOR.operation("dialog.material.open"):
+            dialog = self.main_window.editor_dialog(MaterialDialog)
         if dialog.exec() == QDialog.Accepted:
             self.load_materials()
             self.main_window.show_info_message("Успех", "Материал успешно добавлен.")
 
     def show_edit_material_dialog(self, material_id):
         """Показывает диалог редактирования материала"""
-        dialog = MaterialDialog(self.main_window, self.main_window.db_connection, material_id)
+        with ui_monitor.MONITOR.operation("dialog.material.open"):
+            dialog = self.main_window.editor_dialog(MaterialDialog, material_id)
         if dialog.exec() == QDialog.Accepted:
             self.load_materials()
             self.main_window.show_info_message("Успех", "Материал успешно обновлен.")
@@ -1011,9 +2195,295 @@ class MaterialsPage(QWidget):
             QPushButton:pressed {
                 background-color: #1D4023;
             }
+            QPushButton:checked {
+                background-color: #D9534F;
+            }
         """
 
 
+class ConflictDialog(QDialog):
+    """Конфликт сохранения: строку изменили на другом рабочем месте после открытия диалога"""
+
+    OVERWRITE = 2
+    RELOAD = 3
+
+    def __init__(self, parent, differences):
+        super().__init__(parent)
+        self.setModal(True)
+        self.setWindowTitle("Данные изменены другим пользователем")
+        self.setStyleSheet("""
+            QDialog {
+                background-color: #FFFFFF;
+                font-family: Gabriola;
+                font-size: 14px;
+            }
+            QLabel {
+                color: #333333;
+            }
+        """)
+
+        layout = QVBoxLayout()
+        self.setLayout(layout)
+
+        message = QLabel("Пока вы редактировали запись, ее сохранили на другом рабочем месте.\n"
+                         "Различающиеся поля выделены.")
+        message.setFont(QFont("Gabriola", 12))
+        layout.addWidget(message)
+
+        grid = QGridLayout()
+        grid.setHorizontalSpacing(20)
+        for column, title in enumerate(("Поле", "Ваше значение", "Сейчас в базе")):
+            header = QLabel(title)
+            header.setFont(QFont("Gabriola", 12, QFont.Bold))
+            header.setStyleSheet("color: #2D6033;")
+            grid.addWidget(header, 0, column)
+        for row, (label, mine, theirs, changed) in enumerate(differences, start=1):
+            for column, text in enumerate((label, mine, theirs)):
+                cell = QLabel(str(text))
+                cell.setFont(QFont("Gabriola", 12, QFont.Bold if changed else QFont.Normal))
+                if changed:
+                    cell.setStyleSheet("color: #C62828;")
+                grid.addWidget(cell, row, column)
+        layout.addLayout(grid)
+
+        button_box = QDialogButtonBox()
+        overwrite_button = button_box.addButton("Сохранить мои значения", QDialogButtonBox.AcceptRole)
+        reload_button = button_box.addButton("Загрузить из базы", QDialogButtonBox.ResetRole)
+        button_box.addButton("Отмена", QDialogButtonBox.RejectRole)
+        overwrite_button.clicked.connect(lambda: self.done(self.OVERWRITE))
+        reload_button.clicked.connect(lambda: self.done(self.RELOAD))
+        button_box.rejected.connect(self.reject)
+        layout.addWidget(button_box)
+
+
+class PriceSimulationDialog(QDialog):
+    """Моделирование цен: новые коэффициенты типов и цены материалов
+    применяются к каталогу в памяти, в базу записываются только по подтверждению"""
+
+    def __init__(self, parent, connection, catalogue):
+        super().__init__(parent)
+        self.connection = connection
+        self.catalogue = catalogue
+        self.simulation = None
+        self.applied = 0
+        self.setModal(True)
+        self.setWindowTitle("Моделирование цен")
+        self.setMinimumSize(760, 560)
+        self.setStyleSheet("""
+            QDialog {
+                background-color: #FFFFFF;
+                font-family: Gabriola;
+                font-size: 14px;
+            }
+            QLabel {
+                color: #333333;
+            }
+        """)
+
+        layout = QVBoxLayout()
+        self.setLayout(layout)
+
+        # Сценарий пересчитывается после паузы в изменениях, а не на каждый шаг счетчика
+        self.simulate_timer = QTimer(self)
+        self.simulate_timer.setSingleShot(True)
+        self.simulate_timer.setInterval(150)
+        self.simulate_timer.timeout.connect(self.simulate)
+
+        inputs_layout = QHBoxLayout()
+        self.coefficient_spins = {}
+        coefficients_form = QFormLayout()
+        for type_id, name in sorted(catalogue.type_names.items(), key=lambda item: item[1]):
+            spin = QDoubleSpinBox()
+            spin.setFont(QFont("Gabriola", 12))
+            spin.setRange(0.0001, 1000)
+            spin.setDecimals(4)
+            spin.setValue(float(catalogue.coefficients[type_id]))
+            spin.valueChanged.connect(lambda value: self.simulate_timer.start())
+            coefficients_form.addRow(f"{name}:", spin)
+            self.coefficient_spins[type_id] = spin
+        self.price_spins = {}
+        prices_form = QFormLayout()
+        for material_id, name in sorted(catalogue.material_names.items(), key=lambda item: item[1]):
+            spin = QDoubleSpinBox()
+            spin.setFont(QFont("Gabriola", 12))
+            spin.setRange(0, 99999999.99)
+            spin.setDecimals(2)
+            spin.setPrefix("₽ ")
+            spin.setValue(float(catalogue.material_prices[material_id]))
+            spin.valueChanged.connect(lambda value: self.simulate_timer.start())
+            prices_form.addRow(f"{name}:", spin)
+            self.price_spins[material_id] = spin
+        for title, form in (("Коэффициенты типов продукции", coefficients_form),
+                            ("Цены материалов", prices_form)):
+            column = QVBoxLayout()
+            header = QLabel(title)
+            header.setFont(QFont("Gabriola", 14, QFont.Bold))
+            header.setStyleSheet("color: #2D6033;")
+            column.addWidget(header)
+            content = QWidget()
+            content.setLayout(form)
+            scroll = QScrollArea()
+            scroll.setWidgetResizable(True)
+            scroll.setFrameShape(QFrame.NoFrame)
+            scroll.setWidget(content)
+            column.addWidget(scroll)
+            inputs_layout.addLayout(column)
+        layout.addLayout(inputs_layout, 1)
+
+        self.summary_grid = QGridLayout()
+        self.summary_grid.setHorizontalSpacing(20)
+        layout.addLayout(self.summary_grid)
+        self.total_label = QLabel()
+        self.total_label.setFont(QFont("Gabriola", 12))
+        layout.addWidget(self.total_label)
+
+        button_box = QDialogButtonBox()
+        self.apply_button = button_box.addButton("Применить", QDialogButtonBox.AcceptRole)
+        reset_button = button_box.addButton("Сбросить", QDialogButtonBox.ResetRole)
+        button_box.addButton("Закрыть", QDialogButtonBox.RejectRole)
+        self.apply_button.clicked.connect(self.apply)
+        reset_button.clicked.connect(self.reset)
+        button_box.rejected.connect(self.reject)
+        layout.addWidget(button_box)
+
+        self.simulate()
+
+    def reset(self):
+        """Возвращает в поля текущие значения из каталога"""
+        for type_id, spin in self.coefficient_spins.items():
+            spin.setValue(float(self.catalogue.coefficients[type_id]))
+        for material_id, spin in self.price_spins.items():
+            spin.setValue(float(self.catalogue.material_prices[material_id]))
+        self.simulate()
+
+    def scenario(self):
+        # Значения счетчиков округлены до их числа знаков, как их видит пользователь
+        coefficients = {type_id: round(spin.value(), spin.decimals())
+                        for type_id, spin in self.coefficient_spins.items()}
+        prices = {material_id: round(spin.value(), spin.decimals())
+                  for material_id, spin in self.price_spins.items()}
+        return coefficients, prices
+
+    @ui_monitor.timed("products.simulate")
+    def simulate(self):
+        self.simulate_timer.stop()
+        coefficients, prices = self.scenario()
+        self.simulation = self.catalogue.simulate(coefficients, prices)
+
+        while self.summary_grid.count():
+            self.summary_grid.takeAt(0).widget().deleteLater()
+        titles = ("Тип продукции", "Продукции", "Изменится", "Мин. изменение", "Макс. изменение",
+                  "Среднее изменение")
+        for column, title in enumerate(titles):
+            header = QLabel(title)
+            header.setFont(QFont("Gabriola", 12, QFont.Bold))
+            header.setStyleSheet("color: #2D6033;")
+            self.summary_grid.addWidget(header, 0, column)
+        for row, summary in enumerate(self.simulation.summary, start=1):
+            values = (summary.type_name, summary.products, summary.changed,
+                      money.format_rub(summary.min_delta), money.format_rub(summary.max_delta),
+                      money.format_rub(summary.mean_delta))
+            for column, value in enumerate(values):
+                cell = QLabel(str(value))
+                cell.setFont(QFont("Gabriola", 12))
+                self.summary_grid.addWidget(cell, row, column)
+
+        if self.simulation.changed:
+            self.total_label.setText(
+                f"Изменится цен: {self.simulation.changed}, "
+                f"суммарное изменение: {money.format_rub(self.simulation.total_delta)} ₽")
+        else:
+            self.total_label.setText("Цены продукции не изменятся")
+        changes = self.simulation.coefficients or self.simulation.material_prices
+        self.apply_button.setEnabled(bool(changes))
+
+    def apply(self):
+        simulation = self.simulation
+        reply = QMessageBox.question(
+            self, 'Подтверждение',
+            f'Записать новые коэффициенты ({len(simulation.coefficients)}), '
+            f'цены материалов ({len(simulation.material_prices)}) '
+            f'и цены продукции ({simulation.changed})?',
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.No
+        )
+        if reply != QMessageBox.Yes:
+            return
+
+        try:
+            with ui_monitor.MONITOR.operation("products.simulation_apply"):
+                self.applied = price_simulation.apply(self.connection, simulation)
+        except price_simulation.StaleScenario as e:
+            QMessageBox.warning(self, "Данные изменены другим пользователем",
+                                f"{e}. Каталог загружен заново, проверьте сценарий.")
+            cursor = self.connection.cursor()
+            try:
+                self.catalogue = price_simulation.Catalogue.load(cursor)
+            finally:
+                cursor.close()
+            self.simulate()
+            return
+        except Exception as e:
+            QMessageBox.critical(self, "Ошибка записи",
+                                 f"Произошла ошибка при записи сценария: {str(e)}")
+            return
+        self.accept()
+
+
+class InventoryDialog(QDialog):
+    """Оценка запасов материалов по типам (inventory.Valuation)"""
+
+    def __init__(self, parent, valuation):
+        super().__init__(parent)
+        self.setModal(True)
+        self.setWindowTitle("Оценка запасов")
+        self.setMinimumSize(640, 320)
+        self.setStyleSheet("""
+            QDialog {
+                background-color: #FFFFFF;
+                font-family: Gabriola;
+                font-size: 14px;
+            }
+            QLabel {
+                color: #333333;
+            }
+        """)
+
+        layout = QVBoxLayout()
+        self.setLayout(layout)
+
+        grid = QGridLayout()
+        grid.setHorizontalSpacing(20)
+        titles = ("Тип материала", "Материалов", "Стоимость", "Упаковок", "Остаток")
+        for column, title in enumerate(titles):
+            header = QLabel(title)
+            header.setFont(QFont("Gabriola", 12, QFont.Bold))
+            header.setStyleSheet("color: #2D6033;")
+            grid.addWidget(header, 0, column)
+        rows = [(summary.type_name, summary.materials, summary.value, summary.packages, summary.quantities)
+                for summary in valuation.types]
+        rows.append(("Итого", len(valuation), valuation.total_value, valuation.total_packages,
+                     valuation.quantities))
+        for row, (type_name, materials, value, packages, quantities) in enumerate(rows, start=1):
+            values = (type_name, materials, f"{money.format_rub(value)} ₽", packages,
+                      inventory.format_quantities(quantities))
+            for column, text in enumerate(values):
+                cell = QLabel(str(text))
+                cell.setFont(QFont("Gabriola", 12, QFont.Bold if row == len(rows) else QFont.Normal))
+                grid.addWidget(cell, row, column)
+        layout.addLayout(grid)
+
+        if valuation.unknown_units:
+            note = QLabel("Единицы не из справочника (учтены отдельно): " + ", ".join(valuation.unknown_units))
+            note.setFont(QFont("Gabriola", 12))
+            note.setStyleSheet("color: #D9534F;")
+            layout.addWidget(note)
+        layout.addStretch()
+
+        button_box = QDialogButtonBox(QDialogButtonBox.Close)
+        button_box.rejected.connect(self.reject)
+        layout.addWidget(button_box)
+
+
 class ProductDialog(QDialog):
     """Диалог для добавления/редактирования продукта"""
 
@@ -1021,6 +2491,12 @@ class ProductDialog(QDialog):
         super().__init__(parent)
         self.db_connection = db_connection
         self.product_id = product_id
+        # Версия строки на момент чтения (см. conflicts.py)
+        self.row_version = None
+        # Значения полей на момент чтения (для журнала изменений и проверки дублей)
+        self.loaded_row = None
+        # Справочник типов, которым заполнен список (перестраивается только при изменении)
+        self.loaded_types = None
         self.setModal(True)
         self.setWindowTitle("Редактирование продукта" if product_id else "Добавление продукта")
         self.setMinimumSize(500, 400)
@@ -1113,33 +2589,21 @@ class ProductDialog(QDialog):
         try:
             cursor = self.db_connection.cursor()
 
-            # Загружаем типы продуктов
-            cursor.execute("SELECT id_type_product, type_product FROM type_product ORDER BY type_product")
-            types = cursor.fetchall()
+            # Типы продуктов и сам продукт — из кэша или одним запросом
+            types, product_data = load_editor_data(
+                self.parent().query_cache, cursor, statements.PRODUCT_TYPES,
+                statements.PRODUCT_ROW, statements.PRODUCT_DIALOG_DATA, self.product_id)
 
-            self.type_combo.clear()
-            for type_id, type_name in types:
-                self.type_combo.addItem(type_name, type_id)
+            # Кэш возвращает тот же объект, пока справочник не менялся
+            if types is not self.loaded_types:
+                self.type_combo.clear()
+                for type_id, type_name in types:
+                    self.type_combo.addItem(type_name, type_id)
+                self.loaded_types = types
 
-            # Если это редактирование, загружаем данные продукта
-            if self.product_id:
-                cursor.execute("""
-                    SELECT acrticul, id_type_product, product_name, min_cost, width 
-                    FROM products 
-                    WHERE id_product = %s
-                """, (self.product_id,))
-
-                product_data = cursor.fetchone()
-                if product_data:
-                    self.articul_edit.setText(product_data[0])
-                    self.name_edit.setText(product_data[2])
-                    self.min_cost_spin.setValue(float(product_data[3]))
-                    self.width_spin.setValue(float(product_data[4]))
-
-                    # Устанавливаем правильный тип продукта
-                    type_index = self.type_combo.findData(product_data[1])
-                    if type_index >= 0:
-                        self.type_combo.setCurrentIndex(type_index)
+            # Если это редактирование, заполняем поля продукта
+            if product_data:
+                self.fill_form(product_data)
 
         except Exception as e:
             self.parent().show_error_message(
@@ -1151,6 +2615,36 @@ class ProductDialog(QDialog):
             if 'cursor' in locals():
                 cursor.close()
 
+    def bind(self, product_id):
+        """Привязывает построенный диалог к другому продукту (None — новый продукт)"""
+        self.product_id = product_id
+        self.row_version = None
+        self.loaded_row = None
+        self.setWindowTitle("Редактирование продукта" if product_id else "Добавление продукта")
+        # Поля предыдущего продукта не должны остаться, даже если строку не удалось прочитать
+        self.articul_edit.clear()
+        self.name_edit.clear()
+        self.min_cost_spin.setValue(0)
+        self.width_spin.setValue(self.width_spin.minimum())
+        self.type_combo.setCurrentIndex(0)
+        self.load_data()
+        self.articul_edit.setFocus()
+
+    def fill_form(self, product_data):
+        """Заполняет поля строкой запроса PRODUCT_ROW и запоминает ее версию"""
+        self.articul_edit.setText(product_data[0])
+        self.name_edit.setText(product_data[2])
+        self.min_cost_spin.setValue(float(product_data[3]))
+        self.width_spin.setValue(float(product_data[4]))
+        self.row_version = product_data[5]
+        # Поля строки этой версии — образ «до» для журнала изменений
+        self.loaded_row = tuple(product_data[:5])
+
+        # Устанавливаем правильный тип продукта
+        type_index = self.type_combo.findData(product_data[1])
+        if type_index >= 0:
+            self.type_combo.setCurrentIndex(type_index)
+
     def validate_and_accept(self):
         """Проверка данных и сохранение"""
         try:
@@ -1172,6 +2666,12 @@ class ProductDialog(QDialog):
             if width <= 0:
                 raise ValueError("Ширина должна быть положительной")
 
+            # Проверка дублей — для нового продукта или при смене артикула и наименования
+            if self.loaded_row is None or (articul, product_name) != (self.loaded_row[0], self.loaded_row[2]):
+                duplicates = self.parent().products_page.possible_duplicates(articul, product_name, self.product_id)
+                if not confirm_duplicates(self, duplicates):
+                    return
+
             # Сохранение данных
             if self.save_product(articul, type_id, product_name, min_cost, width):
                 self.accept()
@@ -1184,45 +2684,82 @@ class ProductDialog(QDialog):
                 f"Не удалось сохранить продукт: {str(e)}"
             )
 
+    @ui_monitor.timed("product.save")
     def save_product(self, articul, type_id, product_name, min_cost, width):
         """Сохранение продукта в базу данных"""
         if not self.db_connection:
             return False
 
+        values = (articul, type_id, product_name, min_cost, width)
+        conflict = False
         try:
             cursor = self.db_connection.cursor()
 
+            # Проверка секции истории цен и запись продукта — одной отправкой на сервер
+            saved_id = self.product_id
+            partition = (statements.ENSURE_PRICE_HISTORY_PARTITION, ())
             if self.product_id:
-                # Обновление существующего продукта
-                query = """
-                    UPDATE products 
-                    SET acrticul = %s, 
-                        id_type_product = %s, 
-                        product_name = %s, 
-                        min_cost = %s, 
-                        width = %s
-                    WHERE id_product = %s
-                """
-                cursor.execute(query, (articul, type_id, product_name, min_cost, width, self.product_id))
+                # Обновление существующего продукта, если его не изменили после открытия
+                # диалога; новая цена попадает в историю, только если она изменилась
+                statements.execute_batch(cursor, [partition, (statements.PRODUCT_UPDATE, (
+                    articul, type_id, product_name, min_cost, width, self.product_id,
+                    self.row_version, price_history.SOURCE_EDIT))])
+                conflict = not cursor.fetchone()[0]
             else:
-                # Добавление нового продукта
-                query = """
-                    INSERT INTO products 
-                    (acrticul, id_type_product, product_name, min_cost, width)
-                    VALUES (%s, %s, %s, %s, %s)
-                """
-                cursor.execute(query, (articul, type_id, product_name, min_cost, width))
-
-            self.db_connection.commit()
-            return True
+                # Добавление нового продукта вместе с первой записью в истории цен
+                statements.execute_batch(cursor, [partition, (statements.PRODUCT_INSERT, (
+                    articul, type_id, product_name, min_cost, width, price_history.SOURCE_EDIT))])
+                saved_id = cursor.fetchone()[0]
+
+            if not conflict:
+                self.parent().tables_changed("products")
+                self.parent().products_page.product_saved(
+                    saved_id, articul, product_name, self.type_combo.currentText())
+                self.parent().audit.record(
+                    audit.ENTITY_PRODUCT, saved_id,
+                    audit.ACTION_UPDATE if self.product_id else audit.ACTION_INSERT,
+                    audit.SOURCE_EDIT, self.loaded_row if self.product_id else None, values)
 
-        except Exception as e:
-            self.db_connection.rollback()
-            raise e
         finally:
             if 'cursor' in locals():
                 cursor.close()
 
+        if conflict:
+            return self.resolve_conflict(values)
+        return True
+
+    def resolve_conflict(self, mine):
+        """Показывает различия с текущей строкой в базе и выполняет выбор пользователя"""
+        cursor = self.db_connection.cursor()
+        try:
+            statements.PRODUCT_ROW.execute(cursor, (self.product_id,))
+            theirs = cursor.fetchone()
+        finally:
+            cursor.close()
+        # Кэшированная строка устарела
+        self.parent().query_cache.invalidate("products")
+
+        if theirs is None:
+            self.parent().show_warning_message(
+                "Продукт удален", "Продукт удален на другом рабочем месте, сохранение невозможно")
+            return False
+
+        type_name = lambda type_id: self.type_combo.itemText(self.type_combo.findData(type_id))
+        differences = [
+            (label, type_name(my_value) if index == 1 else my_value,
+             type_name(their_value) if index == 1 else their_value, changed)
+            for index, (label, my_value, their_value, changed) in enumerate(
+                conflicts.field_differences(conflicts.PRODUCT_FIELDS, mine, theirs))]
+
+        choice = ConflictDialog(self, differences).exec()
+        if choice == ConflictDialog.OVERWRITE:
+            self.row_version = theirs[5]
+            self.loaded_row = tuple(theirs[:5])
+            return self.save_product(*mine)
+        if choice == ConflictDialog.RELOAD:
+            self.fill_form(theirs)
+        return False
+
 
 class MaterialDialog(QDialog):
     """Диалог для добавления/редактирования материала"""
@@ -1231,6 +2768,12 @@ class MaterialDialog(QDialog):
         super().__init__(parent)
         self.db_connection = db_connection
         self.material_id = material_id
+        # Версия строки на момент чтения (см. conflicts.py)
+        self.row_version = None
+        # Значения полей на момент чтения (для журнала изменений и проверки дублей)
+        self.loaded_row = None
+        # Справочник типов, которым заполнен список (перестраивается только при изменении)
+        self.loaded_types = None
         self.setModal(True)
         self.setWindowTitle("Редактирование материала" if material_id else "Добавление материала")
         self.setMinimumSize(500, 500)
@@ -1303,7 +2846,7 @@ class MaterialDialog(QDialog):
         # Поле единицы измерения
         self.unit_combo = QComboBox()
         self.unit_combo.setFont(QFont("Gabriola", 12))
-        self.unit_combo.addItems(["шт", "м", "кг", "л", "упак"])
+        self.unit_combo.addItems(units.REGISTRY.names())
         self.form_layout.addRow("Единица измерения:", self.unit_combo)
 
         layout.addLayout(self.form_layout)
@@ -1334,40 +2877,26 @@ class MaterialDialog(QDialog):
         try:
             cursor = self.db_connection.cursor()
 
-            # Загружаем типы материалов
-            cursor.execute("SELECT id_type_material, type_material FROM type_material ORDER BY type_material")
-            types = cursor.fetchall()
+            # Типы материалов и сам материал — из кэша или одним запросом
+            types, material_data = load_editor_data(
+                self.parent().query_cache, cursor, statements.MATERIAL_TYPES,
+                statements.MATERIAL_ROW, statements.MATERIAL_DIALOG_DATA, self.material_id)
 
-            self.type_combo.clear()
-            for type_id, type_name in types:
-                self.type_combo.addItem(type_name, type_id)
+            # Кэш возвращает тот же объект, пока справочник не менялся
+            if types is not self.loaded_types:
+                self.type_combo.clear()
+                for type_id, type_name in types:
+                    self.type_combo.addItem(type_name, type_id)
+                self.loaded_types = types
 
-            # Если это редактирование, загружаем данные материала
+            # Если это редактирование, заполняем поля материала
             if self.material_id:
-                cursor.execute("""
-                    SELECT material_name, id_type_material, unit_price, 
-                           stock_quantity, min_quantity, package_quantity, unit 
-                    FROM materials 
-                    WHERE id_material = %s
-                """, (self.material_id,))
-
-                material_data = cursor.fetchone()
+                record = self.parent().write_behind.pending_record(self.material_id)
+                if record is not None:
+                    # Изменение из журнала пакетного сохранения, еще не записанное в базу
+                    material_data = tuple(record["values"]) + (record["version"],)
                 if material_data:
-                    self.name_edit.setText(material_data[0])
-                    self.price_spin.setValue(float(material_data[2]))
-                    self.stock_spin.setValue(material_data[3])
-                    self.min_qty_spin.setValue(material_data[4])
-                    self.package_spin.setValue(material_data[5])
-
-                    # Устанавливаем правильный тип материала
-                    type_index = self.type_combo.findData(material_data[1])
-                    if type_index >= 0:
-                        self.type_combo.setCurrentIndex(type_index)
-
-                    # Устанавливаем правильную единицу измерения
-                    unit_index = self.unit_combo.findText(material_data[6])
-                    if unit_index >= 0:
-                        self.unit_combo.setCurrentIndex(unit_index)
+                    self.fill_form(material_data)
 
         except Exception as e:
             self.parent().show_error_message(
@@ -1379,6 +2908,51 @@ class MaterialDialog(QDialog):
             if 'cursor' in locals():
                 cursor.close()
 
+    def bind(self, material_id):
+        """Привязывает построенный диалог к другому материалу (None — новый материал)"""
+        self.material_id = material_id
+        self.row_version = None
+        self.loaded_row = None
+        self.setWindowTitle("Редактирование материала" if material_id else "Добавление материала")
+        # Поля предыдущего материала не должны остаться, даже если строку не удалось прочитать
+        self.name_edit.clear()
+        self.price_spin.setValue(0)
+        self.stock_spin.setValue(0)
+        self.min_qty_spin.setValue(0)
+        self.package_spin.setValue(0)
+        self.type_combo.setCurrentIndex(0)
+        # Единица не из реестра, добавленная для предыдущего материала, убирается
+        while self.unit_combo.count() > len(units.REGISTRY.units):
+            self.unit_combo.removeItem(self.unit_combo.count() - 1)
+        self.unit_combo.setCurrentIndex(0)
+        self.load_data()
+        self.name_edit.setFocus()
+
+    def fill_form(self, material_data):
+        """Заполняет поля строкой запроса MATERIAL_ROW и запоминает ее версию"""
+        self.name_edit.setText(material_data[0])
+        self.price_spin.setValue(float(material_data[2]))
+        self.stock_spin.setValue(material_data[3])
+        self.min_qty_spin.setValue(material_data[4])
+        self.package_spin.setValue(material_data[5])
+        self.row_version = material_data[7]
+        # Поля строки этой версии — образ «до» для журнала изменений
+        self.loaded_row = tuple(material_data[:7])
+
+        # Устанавливаем правильный тип материала
+        type_index = self.type_combo.findData(material_data[1])
+        if type_index >= 0:
+            self.type_combo.setCurrentIndex(type_index)
+
+        # Устанавливаем правильную единицу измерения; единица не из реестра
+        # добавляется в список, чтобы сохранение ее не заменило
+        unit_index = self.unit_combo.findText(material_data[6])
+        if unit_index < 0 and material_data[6]:
+            self.unit_combo.addItem(material_data[6])
+            unit_index = self.unit_combo.count() - 1
+        if unit_index >= 0:
+            self.unit_combo.setCurrentIndex(unit_index)
+
     def validate_and_accept(self):
         """Проверка данных и сохранение"""
         try:
@@ -1402,6 +2976,12 @@ class MaterialDialog(QDialog):
             if package_quantity <= 0:
                 raise ValueError("Количество в упаковке должно быть положительным")
 
+            # Проверка дублей — для нового материала или при смене наименования
+            if self.loaded_row is None or material_name != self.loaded_row[0]:
+                duplicates = self.parent().materials_page.possible_duplicates(material_name, self.material_id)
+                if not confirm_duplicates(self, duplicates):
+                    return
+
             # Сохранение данных
             if self.save_material(material_name, type_id, unit_price, stock_quantity, min_quantity, package_quantity,
                                   unit):
@@ -1415,57 +2995,120 @@ class MaterialDialog(QDialog):
                 f"Не удалось сохранить материал: {str(e)}"
             )
 
+    @ui_monitor.timed("material.save")
     def save_material(self, material_name, type_id, unit_price, stock_quantity, min_quantity, package_quantity, unit):
         """Сохранение материала в базу данных"""
         if not self.db_connection:
             return False
 
+        values = (material_name, type_id, unit_price, stock_quantity, min_quantity, package_quantity, unit)
+        write_behind_queue = self.parent().write_behind
+        if self.material_id and write_behind_queue.enabled:
+            # Пакетный режим: изменение записывается в журнал, в базу его запишет фоновый поток
+            write_behind_queue.put(
+                self.material_id, self.row_version, values, self.type_combo.currentText(),
+                self.loaded_row)
+            self.parent().materials_page.material_saved(
+                self.material_id, material_name, self.type_combo.currentText())
+            self.parent().low_stock_monitor.material_saved(
+                self.material_id, material_name, stock_quantity, min_quantity, unit)
+            return True
+
+        conflict = False
         try:
             cursor = self.db_connection.cursor()
 
+            saved_id = self.material_id
             if self.material_id:
-                # Обновление существующего материала
-                query = """
-                    UPDATE materials 
-                    SET material_name = %s, 
-                        id_type_material = %s, 
-                        unit_price = %s, 
-                        stock_quantity = %s, 
-                        min_quantity = %s, 
-                        package_quantity = %s, 
-                        unit = %s
-                    WHERE id_material = %s
-                """
-                cursor.execute(query, (
-                material_name, type_id, unit_price, stock_quantity, min_quantity, package_quantity, unit,
-                self.material_id))
+                # Обновление существующего материала, если его не изменили после открытия диалога
+                statements.MATERIAL_UPDATE.execute(cursor, (
+                    material_name, type_id, unit_price, stock_quantity, min_quantity, package_quantity, unit,
+                    self.material_id, self.row_version))
+                conflict = cursor.rowcount == 0
             else:
                 # Добавление нового материала
-                query = """
-                    INSERT INTO materials 
-                    (material_name, id_type_material, unit_price, 
-                     stock_quantity, min_quantity, package_quantity, unit)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                """
-                cursor.execute(query, (
-                material_name, type_id, unit_price, stock_quantity, min_quantity, package_quantity, unit))
-
-            self.db_connection.commit()
-            return True
+                statements.MATERIAL_INSERT.execute(cursor, (
+                    material_name, type_id, unit_price, stock_quantity, min_quantity, package_quantity, unit))
+                saved_id = cursor.fetchone()[0]
+
+            if not conflict:
+                self.parent().tables_changed("materials")
+                self.parent().materials_page.material_saved(
+                    saved_id, material_name, self.type_combo.currentText())
+                self.parent().low_stock_monitor.material_saved(
+                    saved_id, material_name, stock_quantity, min_quantity, unit)
+                self.parent().audit.record(
+                    audit.ENTITY_MATERIAL, saved_id,
+                    audit.ACTION_UPDATE if self.material_id else audit.ACTION_INSERT,
+                    audit.SOURCE_EDIT, self.loaded_row if self.material_id else None, values)
 
-        except Exception as e:
-            self.db_connection.rollback()
-            raise e
         finally:
             if 'cursor' in locals():
                 cursor.close()
 
+        if conflict:
+            return self.resolve_conflict(values)
+        return True
+
+    def resolve_conflict(self, mine):
+        """Показывает различия с текущей строкой в базе и выполняет выбор пользователя"""
+        choice, theirs = self.ask_conflict(mine)
+        if choice == ConflictDialog.OVERWRITE:
+            self.row_version = theirs[7]
+            self.loaded_row = tuple(theirs[:7])
+            return self.save_material(*mine)
+        if choice == ConflictDialog.RELOAD:
+            self.fill_form(theirs)
+        return False
+
+    def ask_conflict(self, mine):
+        """Показывает различия с текущей строкой в базе: (выбор, строка в базе или None)"""
+        cursor = self.db_connection.cursor()
+        try:
+            statements.MATERIAL_ROW.execute(cursor, (self.material_id,))
+            theirs = cursor.fetchone()
+        finally:
+            cursor.close()
+        # Кэшированная строка устарела
+        self.parent().query_cache.invalidate("materials")
+
+        if theirs is None:
+            self.parent().show_warning_message(
+                "Материал удален", "Материал удален на другом рабочем месте, сохранение невозможно")
+            return None, None
+
+        type_name = lambda type_id: self.type_combo.itemText(self.type_combo.findData(type_id))
+        differences = [
+            (label, type_name(my_value) if index == 1 else my_value,
+             type_name(their_value) if index == 1 else their_value, changed)
+            for index, (label, my_value, their_value, changed) in enumerate(
+                conflicts.field_differences(conflicts.MATERIAL_FIELDS, mine, theirs))]
+
+        return ConflictDialog(self, differences).exec(), theirs
+
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     app.setFont(QFont("Gabriola", 12))
 
+    # Замеры отзывчивости интерфейса включаются переменной окружения
+    monitor_file = os.environ.get("UI_MONITOR_FILE")
+    if monitor_file:
+        ui_monitor.MONITOR.start(monitor_file)
+
+    # Служба чтения данных для других программ (api_server.py) запускается вместе с приложением
+    api_port = os.environ.get("API_PORT")
+    api = None
+    if api_port:
+        import api_server
+        api = api_server.ApiServer(port=int(api_port))
+        api.start()
+
     window = MainWindow()
     window.show()
 
-    sys.exit(app.exec())
\ No newline at end of file
+    exit_code = app.exec()
+    ui_monitor.MONITOR.stop()
+    if api is not None:
+        api.stop()
+    sys.exit(exit_code)
\ No newline at end of file
@@ -0,0 +1,73 @@
+"""Денежные суммы в целых копейках.
+
+Цены и суммы хранятся как int (копейки), массовые данные — в массивах
+array("q") (64-битные целые). Дробные величины (ширина, коэффициент,
+количество) переводятся в целые с фиксированным числом знаков после запятой.
+Округление выполняется только целочисленной арифметикой, половина
+округляется от нуля (как ROUND в PostgreSQL для numeric).
+"""
+from array import array
+from decimal import Decimal, ROUND_HALF_UP
+from fractions import Fraction
+
+KOPECKS = 100
+
+
+def scaled(value, digits):
+    """Целое value * 10**digits (с округлением); None остается None"""
+    if value is None:
+        return None
+    if isinstance(value, int):
+        return value * 10 ** digits
+    if isinstance(value, float):
+        # Значения из double precision: точны до digits знаков после округления
+        return round(value * 10 ** digits)
+    if isinstance(value, Fraction):
+        return div_round(value.numerator * 10 ** digits, value.denominator)
+    return int((Decimal(value) * 10 ** digits).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def to_kopecks(value):
+    """Сумма в рублях (int, float, Decimal, str) -> копейки"""
+    return scaled(value, 2)
+
+
+def to_decimal(kopecks):
+    """Копейки -> Decimal в рублях (для записи в базу и отображения)"""
+    return Decimal(kopecks).scaleb(-2)
+
+
+def format_rub(kopecks):
+    sign = "-" if kopecks < 0 else ""
+    rubles, rest = divmod(abs(kopecks), KOPECKS)
+    return f"{sign}{rubles}.{rest:02d}"
+
+
+def div_round(numerator, denominator):
+    """Целочисленное деление с округлением половины от нуля"""
+    if denominator < 0:
+        numerator, denominator = -numerator, -denominator
+    quotient, remainder = divmod(abs(numerator), denominator)
+    if remainder * 2 >= denominator:
+        quotient += 1
+    return quotient if numerator >= 0 else -quotient
+
+
+def round_to_step(kopecks, step):
+    """Округляет сумму до шага step (в копейках)"""
+    return div_round(kopecks, step) * step
+
+
+def kopecks_array(values=()):
+    """Массив сумм в копейках из значений в рублях"""
+    return array("q", (to_kopecks(value) for value in values))
+
+
+def amount(quantity, quantity_digits, price_kopecks):
+    """Стоимость quantity (целое с quantity_digits знаками) по цене price_kopecks, в копейках"""
+    return div_round(quantity * price_kopecks, 10 ** quantity_digits)
+
+
+def total_amount(quantities, quantity_digits, prices_kopecks):
+    """Сумма количеств на цены (массивы одной длины) с одним округлением в конце"""
+    return div_round(sum(q * p for q, p in zip(quantities, prices_kopecks)), 10 ** quantity_digits)
@@ -0,0 +1,213 @@
+"""Параллельный пересчет цен для очень больших каталогов.
+
+Таблица products делится на секции по диапазонам id_product. Каждая секция
+считается в отдельном процессе со своим подключением к базе и записывается
+одной пакетной командой в собственной транзакции. Состояние секций хранится
+в repricing_shards, поэтому прерванный запуск можно продолжить:
+
+    python parallel_repricing.py --workers 8 --shard-size 100000
+    python parallel_repricing.py --resume 12
+"""
+import argparse
+import os
+import sys
+from array import array
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from decimal import Decimal
+from itertools import repeat
+
+import database
+import money
+import price_history
+import pricing
+import statements
+from pricing import PricingEngine
+
+DEFAULT_SHARD_SIZE = 100000
+
+
+def _to_decimal(value, digits):
+    """Целое с digits знаками после запятой -> Decimal; None остается None"""
+    return None if value is None else Decimal(value).scaleb(-digits)
+
+
+def reprice_shard(run_id, shard_no, id_from, id_to, price_function=None):
+    """Пересчитывает одну секцию в рабочем процессе, возвращает число измененных цен.
+
+    price_function(type_id, width, coefficient, material_cost) позволяет задать
+    собственный расчет цены (аргументы — Decimal, результат — цена в рублях);
+    по умолчанию используются правила из pricing_rules. Функция должна быть
+    объявлена на уровне модуля, чтобы ее можно было передать в другой процесс.
+
+    Расчет идет в целых числах (см. money.py): строки секции приходят из базы
+    уже в фиксированной точке, цены сравниваются в копейках, измененные
+    собираются в массивы array("q"). Пустые (NULL) ширина и коэффициент
+    передаются как None и дают ту же цену, что и пересчет одним запросом
+    (см. pricing.py): неопределенная цена (None) не записывается, пустая
+    прежняя цена заменяется рассчитанной. Цены,
+    измененные в базе после чтения секции, не перезаписываются и не входят в
+    число измененных: их пересчитает следующий запуск.
+    """
+    from psycopg2.extras import execute_values
+
+    conn = database.connect()
+    try:
+        cursor = conn.cursor()
+        if price_function is None:
+            engine = PricingEngine.load(cursor)
+
+            def price_kopecks(type_id, width, coefficient, material_cost):
+                return engine.rule_for(type_id).price_kopecks(width, coefficient, material_cost)
+        else:
+            def price_kopecks(type_id, width, coefficient, material_cost):
+                price = price_function(
+                    type_id, _to_decimal(width, pricing.WIDTH_DIGITS),
+                    _to_decimal(coefficient, pricing.COEFFICIENT_DIGITS),
+                    _to_decimal(material_cost, pricing.MATERIAL_COST_DIGITS))
+                return money.to_kopecks(price)
+
+        statements.SHARD_ROWS.execute(cursor, (id_from, id_to, id_from, id_to))
+        changed_ids = array("q")
+        changed_costs = array("q")
+        old_costs = []  # прежняя цена может быть пустой (None)
+        for product_id, type_id, width, coefficient, material_cost, old_cost in cursor.fetchall():
+            new_cost = price_kopecks(type_id, width, coefficient, material_cost)
+            if new_cost is not None and new_cost != old_cost:
+                changed_ids.append(product_id)
+                changed_costs.append(new_cost)
+                old_costs.append(old_cost)
+
+        updated = 0
+        if changed_ids:
+            rows = zip(changed_ids, changed_costs, old_costs, repeat(price_history.SOURCE_REPRICING))
+            updated = len(execute_values(cursor, statements.SHARD_UPDATE_SQL, rows,
+                                         template=statements.SHARD_UPDATE_TEMPLATE, page_size=10000,
+                                         fetch=True))
+
+        # Отметка о готовности секции в той же транзакции, что и сами цены
+        statements.SHARD_DONE.execute(cursor, (updated, run_id, shard_no))
+        conn.commit()
+        return updated
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def create_run(conn, shard_size=DEFAULT_SHARD_SIZE):
+    """Создает запуск пересчета и делит продукцию на секции по id_product"""
+    cursor = conn.cursor()
+    try:
+        statements.PRODUCT_ID_RANGE.execute(cursor)
+        first_id, last_id = cursor.fetchone()
+        statements.REPRICING_RUN_INSERT.execute(cursor)
+        run_id = cursor.fetchone()[0]
+        if first_id is not None:
+            statements.REPRICING_SHARDS_INSERT.execute(cursor, (
+                run_id, first_id, shard_size, first_id, shard_size, last_id, last_id, first_id, shard_size))
+        conn.commit()
+        return run_id
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def pending_shards(conn, run_id):
+    """Секции запуска, которые еще не пересчитаны; ValueError, если запуска нет"""
+    cursor = conn.cursor()
+    try:
+        statements.REPRICING_RUN_EXISTS.execute(cursor, (run_id,))
+        if cursor.fetchone() is None:
+            raise ValueError(f"Запуск пересчета {run_id} не найден")
+        statements.REPRICING_PENDING_SHARDS.execute(cursor, (run_id,))
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+def _mark_failed(conn, run_id, shard_no, error):
+    cursor = conn.cursor()
+    try:
+        statements.SHARD_FAILED.execute(cursor, (str(error), run_id, shard_no))
+        conn.commit()
+    finally:
+        cursor.close()
+
+
+def _finish_run(conn, run_id):
+    cursor = conn.cursor()
+    try:
+        statements.REPRICING_RUN_FINISH.execute(cursor, (run_id,))
+        conn.commit()
+    finally:
+        cursor.close()
+
+
+def reprice_parallel(workers=None, shard_size=DEFAULT_SHARD_SIZE, resume_run_id=None,
+                     price_function=None, progress=None):
+    """Пересчитывает цены всей продукции в нескольких процессах.
+
+    progress(done, total, updated) вызывается после каждой завершенной секции.
+    Возвращает (id запуска, число измененных цен, число неудачных секций);
+    при неудачных секциях запуск можно продолжить с resume_run_id.
+    Если запуска resume_run_id нет, выбрасывается ValueError.
+    """
+    conn = database.connect()
+    try:
+        run_id = resume_run_id if resume_run_id is not None else create_run(conn, shard_size)
+        shards = pending_shards(conn, run_id)
+        total = len(shards)
+        done = updated = failed = 0
+
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            futures = {
+                executor.submit(reprice_shard, run_id, shard_no, id_from, id_to, price_function): shard_no
+                for shard_no, id_from, id_to in shards
+            }
+            for future in as_completed(futures):
+                try:
+                    updated += future.result()
+                except Exception as e:
+                    failed += 1
+                    _mark_failed(conn, run_id, futures[future], e)
+                done += 1
+                if progress:
+                    progress(done, total, updated)
+
+        if not failed:
+            _finish_run(conn, run_id)
+        return run_id, updated, failed
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Параллельный пересчет стоимости продукции")
+    parser.add_argument("--workers", type=int, default=None, help="число процессов")
+    parser.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE,
+                        help="размер секции по id_product")
+    parser.add_argument("--resume", type=int, default=None, help="продолжить запуск с этим id")
+    args = parser.parse_args()
+
+    def print_progress(done, total, updated):
+        print(f"\rСекций: {done}/{total}, изменено цен: {updated}", end="", flush=True)
+
+    try:
+        run_id, updated, failed = reprice_parallel(args.workers, args.shard_size, args.resume,
+                                                   progress=print_progress)
+    except ValueError as e:
+        parser.error(str(e))
+    print()
+    if failed:
+        print(f"Запуск {run_id}: {failed} секций завершились с ошибкой, "
+              f"продолжите командой --resume {run_id}")
+        return 1
+    print(f"Запуск {run_id} завершен, изменено цен: {updated}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,31 @@
+"""История цен продукции: запросы «цена на дату».
+
+Каждое изменение products.min_cost добавляет строку в product_price_history
+тем же запросом, который меняет цену (см. statements.PRODUCT_UPDATE и
+пересчет в pricing.py). Таблица секционирована по месяцам по полю
+valid_from, поиск цены на дату идет по индексу (id_product, valid_from).
+"""
+import statements
+
+SOURCE_EDIT = "edit"
+SOURCE_REPRICING = "repricing"
+SOURCE_SIMULATION = "simulation"
+
+
+def price_as_of(cursor, product_id, moment):
+    """Цена продукта на указанный момент; None, если истории нет"""
+    statements.PRICE_AS_OF.execute(cursor, (product_id, moment))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def catalogue_as_of(cursor, moment):
+    """Цены всей продукции на указанный момент: словарь id_product -> цена"""
+    statements.CATALOGUE_AS_OF.execute(cursor, (moment,))
+    return dict(cursor.fetchall())
+
+
+def price_changes(cursor, product_id):
+    """Все изменения цены продукта в хронологическом порядке"""
+    statements.PRICE_CHANGES.execute(cursor, (product_id,))
+    return cursor.fetchall()
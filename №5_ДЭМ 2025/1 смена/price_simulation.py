@@ -0,0 +1,250 @@
+"""Моделирование цен: что будет с ценами продукции при других коэффициентах
+типов или ценах материалов.
+
+Каталог (продукция, коэффициенты типов, цены материалов и состав продукции)
+загружается из базы один раз в массивы array("q") в фиксированной точке
+(см. money.py и pricing.py). Сценарий — словари новых значений; при его
+расчете пересчитываются только затронутые продукты: продукты измененных
+типов и продукты, в состав которых входят измененные материалы. Стоимость
+материалов таких продуктов меняется на разницу цен, без повторного
+суммирования состава, цены считаются столбцами по типам
+(PricingRule.prices_kopecks) теми же правилами pricing_rules, что и
+обычный пересчет.
+
+В базу ничего не пишется, пока сценарий не применен:
+
+    catalogue = Catalogue.load(cursor)
+    result = catalogue.simulate(coefficients={2: Decimal("1.35")},
+                                material_prices={7: Decimal("180.00")})
+    for summary in result.summary:
+        print(summary.type_name, summary.changed, summary.mean_delta)
+    apply(conn, result)
+"""
+from array import array
+from decimal import Decimal
+from itertools import repeat
+
+import money
+import price_history
+import pricing
+import statements
+from pricing import PricingEngine
+
+
+class StaleScenario(Exception):
+    """Коэффициенты или цены материалов изменились в базе после загрузки каталога"""
+
+
+class TypeSummary:
+    """Итог сценария по одному типу продукции (изменения цен — в копейках)"""
+
+    def __init__(self, type_id, type_name, products):
+        self.type_id = type_id
+        self.type_name = type_name
+        self.products = products
+        self.changed = 0
+        self.min_delta = 0
+        self.max_delta = 0
+        self.total_delta = 0
+
+    @property
+    def mean_delta(self):
+        """Среднее изменение цены по измененным продуктам, в копейках"""
+        return money.div_round(self.total_delta, self.changed) if self.changed else 0
+
+
+class SimulationResult:
+    """Результат сценария: измененные цены и итоги по типам"""
+
+    def __init__(self, catalogue, coefficients, material_prices):
+        self.catalogue = catalogue
+        self.coefficients = coefficients
+        self.material_prices = material_prices
+        self.product_ids = array("q")
+        self.old_costs = array("q")
+        self.new_costs = array("q")
+        self.summary = []
+
+    @property
+    def changed(self):
+        return len(self.product_ids)
+
+    @property
+    def total_delta(self):
+        """Суммарное изменение цен, в копейках"""
+        return sum(self.new_costs) - sum(self.old_costs)
+
+
+class Catalogue:
+    """Снимок каталога в памяти для расчета сценариев"""
+
+    def __init__(self, engine, types, products, materials, composition):
+        """types — [(id, название, коэффициент)], products — [(id, тип, ширина,
+        цена)], materials — [(id, название, цена, в работе)], composition —
+        [(id продукта, id материала, количество)]; ширина, цена продукта и
+        количество — целые в фиксированной точке, как их возвращают запросы
+        SIMULATION_*. Архивные материалы учитываются в стоимости состава, но
+        в material_names (материалы, цены которых можно менять) не входят"""
+        self.engine = engine
+        self.type_names = {type_id: name for type_id, name, _ in types}
+        self.coefficients = {type_id: Decimal(str(value)) for type_id, _, value in types}
+        # Значения в базе (double precision) — для проверки при записи сценария
+        self.stored_coefficients = {type_id: value for type_id, _, value in types}
+        self.material_names = {material_id: name for material_id, name, _, active in materials if active}
+        self.material_prices = {material_id: price for material_id, _, price, _ in materials}
+        price_kopecks = {material_id: money.to_kopecks(price) for material_id, price in self.material_prices.items()}
+
+        # Продукты упорядочены по типам: продукты одного типа занимают непрерывный
+        # отрезок массивов, и столбцы типа берутся срезами
+        self.product_ids = array("q")
+        self.type_ids = array("q")
+        self.widths = array("q")
+        self.costs = array("q")
+        self._ranges = {}
+        for product_id, type_id, width, cost in sorted(products, key=lambda row: (row[1], row[0])):
+            if type_id not in self._ranges:
+                self._ranges[type_id] = [len(self.product_ids), len(self.product_ids)]
+            self._ranges[type_id][1] += 1
+            self.product_ids.append(product_id)
+            self.type_ids.append(type_id)
+            self.widths.append(width)
+            self.costs.append(cost)
+        index = {product_id: position for position, product_id in enumerate(self.product_ids)}
+
+        # Состав по материалам: позиции продуктов и количества; стоимость состава продуктов
+        self._material_costs = array("q", bytes(8 * len(self.product_ids)))
+        self._uses = {}
+        for product_id, material_id, quantity in composition:
+            position = index.get(product_id)
+            if position is None or material_id not in price_kopecks:
+                continue
+            positions, quantities = self._uses.setdefault(material_id, (array("q"), array("q")))
+            positions.append(position)
+            quantities.append(quantity)
+            self._material_costs[position] += quantity * price_kopecks[material_id]
+
+    @classmethod
+    def load(cls, cursor):
+        """Загружает правила цен и каталог из базы"""
+        engine = PricingEngine.load(cursor)
+        loaded = []
+        for statement in (statements.SIMULATION_TYPES, statements.SIMULATION_PRODUCTS,
+                          statements.SIMULATION_MATERIALS, statements.SIMULATION_COMPOSITION):
+            statement.execute(cursor)
+            loaded.append(cursor.fetchall())
+        return cls(engine, *loaded)
+
+    def products_of_type(self, type_id):
+        first, last = self._ranges.get(type_id, (0, 0))
+        return last - first
+
+    def simulate(self, coefficients=None, material_prices=None):
+        """Рассчитывает сценарий: coefficients — {id типа: коэффициент},
+        material_prices — {id материала: цена в рублях}. Значения, совпадающие
+        с текущими, и цены архивных материалов не учитываются."""
+        coefficients = {type_id: Decimal(str(value)) for type_id, value in (coefficients or {}).items()
+                        if type_id in self.coefficients
+                        and Decimal(str(value)) != self.coefficients[type_id]}
+        material_prices = {material_id: Decimal(str(value))
+                           for material_id, value in (material_prices or {}).items()
+                           if material_id in self.material_names
+                           and Decimal(str(value)) != self.material_prices[material_id]}
+        result = SimulationResult(self, coefficients, material_prices)
+
+        # Стоимость состава меняется на количество * разницу цен только у затронутых продуктов
+        material_costs = self._material_costs
+        touched = set()
+        if material_prices:
+            material_costs = array("q", material_costs)
+            for material_id, price in material_prices.items():
+                price_delta = money.to_kopecks(price) - money.to_kopecks(self.material_prices[material_id])
+                positions, quantities = self._uses.get(material_id, ((), ()))
+                for position, quantity in zip(positions, quantities):
+                    material_costs[position] += quantity * price_delta
+                touched.update(positions)
+
+        # Тип с новым коэффициентом пересчитывается целиком, остальные — только затронутые продукты
+        affected = {type_id: None for type_id in coefficients if type_id in self._ranges}
+        for position in sorted(touched):
+            type_id = self.type_ids[position]
+            if type_id not in coefficients:
+                affected.setdefault(type_id, []).append(position)
+
+        for type_id in sorted(affected, key=self.type_names.get):
+            positions = affected[type_id]
+            if positions is None:
+                first, last = self._ranges[type_id]
+                positions = range(first, last)
+                widths = self.widths[first:last]
+                costs = material_costs[first:last]
+                old_costs = self.costs[first:last]
+            else:
+                widths = [self.widths[position] for position in positions]
+                costs = [material_costs[position] for position in positions]
+                old_costs = [self.costs[position] for position in positions]
+            coefficient = money.scaled(coefficients.get(type_id, self.coefficients[type_id]),
+                                       pricing.COEFFICIENT_DIGITS)
+            new_costs = self.engine.rule_for(type_id).prices_kopecks(widths, coefficient, costs)
+            changed = [number for number, (new_cost, old_cost) in enumerate(zip(new_costs, old_costs))
+                       if new_cost != old_cost]
+
+            summary = TypeSummary(type_id, self.type_names[type_id], self.products_of_type(type_id))
+            if changed:
+                deltas = [new_costs[number] - old_costs[number] for number in changed]
+                summary.changed = len(changed)
+                summary.min_delta = min(deltas)
+                summary.max_delta = max(deltas)
+                summary.total_delta = sum(deltas)
+                result.product_ids.extend(self.product_ids[positions[number]] for number in changed)
+                result.old_costs.extend(old_costs[number] for number in changed)
+                result.new_costs.extend(new_costs[number] for number in changed)
+            result.summary.append(summary)
+        return result
+
+
+def apply(connection, result):
+    """Записывает сценарий одной транзакцией: коэффициенты, цены материалов
+    и новые цены продукции (с историей цен и журналом изменений).
+
+    Если после загрузки каталога коэффициент, цена материала из сценария или
+    цена измененной продукции изменились в базе, ничего не записывается и
+    возникает StaleScenario.
+    Возвращает число измененных цен продукции.
+    """
+    from psycopg2.extras import execute_values
+
+    catalogue = result.catalogue
+    autocommit = connection.autocommit
+    connection.autocommit = False
+    try:
+        cursor = connection.cursor()
+        try:
+            if result.coefficients:
+                rows = [(type_id, float(value), catalogue.stored_coefficients[type_id])
+                        for type_id, value in result.coefficients.items()]
+                execute_values(cursor, statements.SIMULATION_COEFFICIENTS_SQL, rows, page_size=len(rows))
+                if cursor.rowcount != len(rows):
+                    raise StaleScenario("Коэффициенты типов продукции изменились после загрузки каталога")
+            if result.material_prices:
+                rows = [(material_id, value, catalogue.material_prices[material_id])
+                        for material_id, value in result.material_prices.items()]
+                execute_values(cursor, statements.SIMULATION_MATERIAL_PRICES_SQL, rows, page_size=len(rows))
+                if cursor.rowcount != len(rows):
+                    raise StaleScenario("Цены материалов изменились после загрузки каталога")
+            if result.changed:
+                rows = zip(result.product_ids, result.new_costs, result.old_costs,
+                           repeat(price_history.SOURCE_SIMULATION))
+                updated = execute_values(cursor, statements.SHARD_UPDATE_SQL, rows,
+                                         template=statements.SHARD_UPDATE_TEMPLATE, page_size=10000,
+                                         fetch=True)
+                if len(updated) != result.changed:
+                    raise StaleScenario("Цены продукции изменились после загрузки каталога")
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            cursor.close()
+    finally:
+        connection.autocommit = autocommit
+    return result.changed
@@ -0,0 +1,329 @@
+"""Движок правил ценообразования.
+
+Для каждого типа продукции в таблице pricing_rules хранится формула цены
+и параметры: базовая стоимость метра, наценка, минимальная цена и шаг
+округления. Формула компилируется один раз в SQL-выражение (для массового
+пересчета одним запросом) и в функцию Python (для расчета одного продукта и
+пересчета секций в parallel_repricing).
+
+Функция Python считает в целых числах с фиксированной точкой (см. money.py):
+входные величины переводятся в целые с WIDTH_DIGITS, COEFFICIENT_DIGITS и
+MATERIAL_COST_DIGITS знаками, цена получается в копейках. Деление в формуле
+выполняется точно (fractions.Fraction), округление — один раз в конце.
+Формула переводится в одно выражение Python, поэтому столбец цен
+(prices_kopecks) считается одним списковым включением без вызова функции
+на каждый узел формулы.
+
+Пустые (NULL) ширина и коэффициент обрабатываются как в SQL: арифметика с
+NULL дает NULL, min и max (LEAST и GREATEST) его пропускают. Если значение
+формулы пустое, цена не определена (None в Python, NULL в SQL): такую цену
+пересчет не записывает, прежняя цена продукта остается.
+"""
+import ast
+from decimal import Decimal
+from fractions import Fraction
+
+import money
+import price_history
+import statements
+
+# Число знаков после запятой входных величин в целочисленном расчете
+WIDTH_DIGITS = 4
+COEFFICIENT_DIGITS = 4
+MATERIAL_COST_DIGITS = 6  # количество numeric(12,4) * цена numeric(10,2)
+
+# Формула по умолчанию: ширина * базовая стоимость метра * коэффициент типа
+DEFAULT_FORMULA = "width * base_cost * coefficient"
+DEFAULT_BASE_COST = Decimal("100")
+
+# Переменные, доступные в формуле, и соответствующие им выражения SQL
+FORMULA_VARIABLES = {
+    "width": "p.width::numeric",
+    "coefficient": "tp.coefficient_type_product::numeric",
+    "material_cost": "COALESCE(mc.material_cost, 0)",
+    "base_cost": None,  # подставляется из правила как константа
+}
+
+# Число знаков переменных в целочисленном расчете
+_VARIABLE_DIGITS = {
+    "width": WIDTH_DIGITS,
+    "coefficient": COEFFICIENT_DIGITS,
+    "material_cost": MATERIAL_COST_DIGITS,
+}
+
+_SQL_OPERATORS = {ast.Add: "+", ast.Sub: "-", ast.Mult: "*", ast.Div: "/"}
+_SQL_FUNCTIONS = {"min": "LEAST", "max": "GREATEST"}
+
+
+class _Null:
+    """NULL в формуле: любая арифметика с ним дает NULL, как в SQL"""
+
+    def _null(self, *args):
+        return self
+
+    __add__ = __radd__ = __sub__ = __rsub__ = __mul__ = __rmul__ = __neg__ = _null
+
+    def __repr__(self):
+        return "NULL"
+
+
+NULL = _Null()
+
+
+def _null_fraction(numerator, denominator):
+    if numerator is NULL or denominator is NULL:
+        return NULL
+    return Fraction(numerator, denominator)
+
+
+def _least(*values):
+    values = [value for value in values if value is not NULL]
+    return min(values) if values else NULL
+
+
+def _greatest(*values):
+    values = [value for value in values if value is not NULL]
+    return max(values) if values else NULL
+
+
+def _to_decimal(value):
+    if isinstance(value, Decimal):
+        return value
+    return Decimal(str(value))
+
+
+def _sql_literal(value):
+    return f"{_to_decimal(value)}::numeric"
+
+
+def _fixed(value):
+    """Десятичная константа -> (целое, число знаков после запятой)"""
+    value = _to_decimal(value)
+    digits = max(0, -value.as_tuple().exponent)
+    return int(value.scaleb(digits)), digits
+
+
+def _align(expression, digits, target):
+    """Приводит значение выражения к target знакам после запятой"""
+    if digits == target:
+        return expression
+    return f"({expression} * {10 ** (target - digits)})"
+
+
+def _compile_node(node, base_cost):
+    """Рекурсивно переводит узел формулы в (SQL, выражение Python, число знаков его значения).
+
+    Выражение Python записано через целые значения переменных (width,
+    coefficient, material_cost) и дает целое (или Fraction после деления)
+    с указанным числом знаков после запятой.
+    """
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) \
+            and not isinstance(node.value, bool):
+        constant, digits = _fixed(node.value)
+        return _sql_literal(node.value), str(constant), digits
+
+    if isinstance(node, ast.Name):
+        if node.id not in FORMULA_VARIABLES:
+            raise ValueError(f"Неизвестная переменная в формуле: {node.id}")
+        if node.id == "base_cost":
+            constant, digits = _fixed(base_cost)
+            return _sql_literal(base_cost), str(constant), digits
+        return FORMULA_VARIABLES[node.id], node.id, _VARIABLE_DIGITS[node.id]
+
+    if isinstance(node, ast.BinOp) and type(node.op) in _SQL_OPERATORS:
+        left_sql, left, left_digits = _compile_node(node.left, base_cost)
+        right_sql, right, right_digits = _compile_node(node.right, base_cost)
+        operator = _SQL_OPERATORS[type(node.op)]
+        sql = f"({left_sql} {operator} {right_sql})"
+        if operator in ("+", "-"):
+            digits = max(left_digits, right_digits)
+            left = _align(left, left_digits, digits)
+            right = _align(right, right_digits, digits)
+            return sql, f"({left} {operator} {right})", digits
+        if operator == "*":
+            return sql, f"({left} * {right})", left_digits + right_digits
+        # (a / 10^la) / (b / 10^rb) = (a * 10^rb / b) / 10^la
+        return sql, f"Fraction({left} * {10 ** right_digits}, {right})", left_digits
+
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        operand_sql, operand, digits = _compile_node(node.operand, base_cost)
+        if isinstance(node.op, ast.UAdd):
+            return operand_sql, operand, digits
+        return f"(-{operand_sql})", f"(-{operand})", digits
+
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) \
+            and node.func.id in _SQL_FUNCTIONS and node.args and not node.keywords:
+        compiled = [_compile_node(arg, base_cost) for arg in node.args]
+        sql = f"{_SQL_FUNCTIONS[node.func.id]}({', '.join(part for part, _, _ in compiled)})"
+        digits = max(part_digits for _, _, part_digits in compiled)
+        parts = [_align(part, part_digits, digits) for _, part, part_digits in compiled]
+        return sql, f"{node.func.id}({', '.join(parts)})", digits
+
+    raise ValueError(f"Недопустимое выражение в формуле: {ast.dump(node)}")
+
+
+class PricingRule:
+    """Правило расчета цены для одного типа продукции"""
+
+    def __init__(self, type_id=None, formula=DEFAULT_FORMULA, base_cost=DEFAULT_BASE_COST,
+                 markup_percent=0, min_price=0, rounding_step=Decimal("0.01")):
+        self.type_id = type_id
+        self.formula = formula
+        self.base_cost = _to_decimal(base_cost)
+        self.markup_percent = _to_decimal(markup_percent)
+        self.min_price = _to_decimal(min_price)
+        self.rounding_step = _to_decimal(rounding_step)
+        if self.rounding_step < Decimal("0.01") or self.rounding_step % Decimal("0.01"):
+            raise ValueError(f"Шаг округления должен быть кратен копейке: {self.rounding_step}")
+
+        try:
+            tree = ast.parse(formula, mode="eval")
+        except SyntaxError as e:
+            raise ValueError(f"Ошибка в формуле «{formula}»: {e.msg}")
+        formula_sql, formula, formula_digits = _compile_node(tree.body, self.base_cost)
+        # Выражение собрано только из проверенных узлов: чисел, переменных и операций
+        namespace = {"Fraction": Fraction, "min": min, "max": max, "__builtins__": {}}
+        self._evaluate_formula = eval(
+            f"lambda width, coefficient, material_cost: {formula}", namespace)
+        self._evaluate_column = eval(
+            f"lambda widths, coefficient, material_costs: [{formula} "
+            f"for width, material_cost in zip(widths, material_costs)]", {**namespace, "zip": zip})
+        # Вариант для пустых входных величин (см. _Null) — только для таких строк
+        self._evaluate_nullable = eval(
+            f"lambda width, coefficient, material_cost: {formula}",
+            {**namespace, "Fraction": _null_fraction, "min": _least, "max": _greatest})
+        self._integral = "Fraction" not in formula
+
+        # Целочисленные параметры: число шагов = формула * наценка * 100 / (10^знаков * шаг)
+        markup, markup_digits = _fixed(1 + self.markup_percent / 100)
+        self._markup = markup * money.KOPECKS
+        self._step = money.to_kopecks(self.rounding_step)
+        self._min_price = money.to_kopecks(self.min_price)
+        self._divisor = 10 ** (formula_digits + markup_digits) * self._step
+
+        # Итоговое выражение: наценка, округление до шага, нижняя граница цены;
+        # GREATEST пропускает NULL, поэтому пустая формула проверяется отдельно
+        markup = _sql_literal(1 + self.markup_percent / 100)
+        step = _sql_literal(self.rounding_step)
+        self.sql = (f"CASE WHEN ({formula_sql}) IS NOT NULL "
+                    f"THEN GREATEST({_sql_literal(self.min_price)}, "
+                    f"ROUND({formula_sql} * {markup} / {step}) * {step}) END")
+
+    def price_kopecks(self, width, coefficient, material_cost=0):
+        """Цена в копейках по целым входным величинам.
+
+        width, coefficient и material_cost — целые с WIDTH_DIGITS,
+        COEFFICIENT_DIGITS и MATERIAL_COST_DIGITS знаками после запятой;
+        width и coefficient могут быть None (NULL), см. описание модуля;
+        если значение формулы пустое, возвращается None.
+        """
+        if width is None or coefficient is None:
+            raw = self._evaluate_nullable(NULL if width is None else width,
+                                          NULL if coefficient is None else coefficient,
+                                          material_cost or 0)
+            if raw is NULL:
+                return None
+            return self._round(raw)
+        return self._round(self._evaluate_formula(width, coefficient, material_cost or 0))
+
+    def prices_kopecks(self, widths, coefficient, material_costs):
+        """Цены в копейках для столбцов ширин и стоимостей материалов при одном
+        коэффициенте; то же, что price_kopecks для каждой пары значений"""
+        raws = self._evaluate_column(widths, coefficient, material_costs)
+        if not self._integral:
+            return [self._round(raw) for raw in raws]
+        # Формула без деления дает целые: money.div_round, развернутый в выражение
+        markup = 2 * self._markup
+        divisor = self._divisor
+        twice = 2 * divisor
+        step = self._step
+        min_price = self._min_price
+        return [max(min_price, ((raw * markup + divisor) // twice if raw >= 0
+                                else -((divisor - raw * markup) // twice)) * step)
+                for raw in raws]
+
+    def _round(self, raw):
+        """Значение формулы -> цена в копейках: наценка, шаг округления, минимальная цена"""
+        raw *= self._markup
+        if isinstance(raw, Fraction):
+            steps = money.div_round(raw.numerator, raw.denominator * self._divisor)
+        else:
+            steps = money.div_round(raw, self._divisor)
+        return max(self._min_price, steps * self._step)
+
+    def price(self, width, coefficient, material_cost=0):
+        """Рассчитывает цену продукта по правилу (Decimal в рублях; None, если цена не определена)"""
+        kopecks = self.price_kopecks(
+            money.scaled(width, WIDTH_DIGITS),
+            money.scaled(coefficient, COEFFICIENT_DIGITS),
+            money.scaled(material_cost or 0, MATERIAL_COST_DIGITS),
+        )
+        return None if kopecks is None else money.to_decimal(kopecks)
+
+
+class PricingEngine:
+    """Набор правил ценообразования, загруженный из базы данных"""
+
+    def __init__(self, rules=None):
+        self.default_rule = PricingRule()
+        self.rules = {rule.type_id: rule for rule in (rules or [])}
+
+    @classmethod
+    def load(cls, cursor):
+        """Загружает и компилирует правила из таблицы pricing_rules"""
+        statements.PRICING_RULES.execute(cursor)
+        return cls([PricingRule(*row) for row in cursor.fetchall()])
+
+    def rule_for(self, type_id):
+        return self.rules.get(type_id, self.default_rule)
+
+    def price_sql(self):
+        """SQL-выражение цены для строки products p / type_product tp / material_costs mc"""
+        if not self.rules:
+            return self.default_rule.sql
+        branches = "\n".join(
+            f"WHEN {int(type_id)} THEN {rule.sql}" for type_id, rule in self.rules.items()
+        )
+        return f"CASE p.id_type_product\n{branches}\nELSE {self.default_rule.sql}\nEND"
+
+    def reprice_query(self, where=""):
+        """Запрос, пересчитывающий цены всех (или отобранных) продуктов одной командой.
+
+        Измененные цены тем же запросом добавляются в историю цен и журнал
+        изменений (audit.py). Продукты с неопределенной ценой (пустая ширина
+        или коэффициент) не изменяются.
+        """
+        return statements.ENSURE_PRICE_HISTORY_PARTITION_SQL + "; " \
+            + statements.ENSURE_AUDIT_LOG_PARTITION_SQL + f""";
+            WITH material_costs AS ({statements.MATERIAL_COSTS_SQL}),
+            new_prices AS (
+                SELECT p.id_product, p.min_cost AS old_cost, {self.price_sql()} AS new_cost
+                FROM products p
+                JOIN type_product tp ON p.id_type_product = tp.id_type_product
+                LEFT JOIN material_costs mc ON mc.id_product = p.id_product
+                {where}
+            ),
+            changed AS (
+                UPDATE products p
+                SET min_cost = np.new_cost
+                FROM new_prices np
+                WHERE p.id_product = np.id_product
+                  AND np.new_cost IS NOT NULL
+                  AND p.min_cost IS DISTINCT FROM np.new_cost
+                RETURNING p.id_product, p.min_cost, np.old_cost
+            ),""" + statements.INSERT_REPRICED_AUDIT_SQL + statements.INSERT_CHANGED_PRICES_SQL
+
+    def reprice_all(self, cursor):
+        """Пересчитывает цены всей продукции, возвращает число измененных строк"""
+        cursor.execute(self.reprice_query(), (price_history.SOURCE_REPRICING,))
+        return cursor.rowcount
+
+    def price_product(self, cursor, product_id):
+        """Рассчитывает цену одного продукта; None, если продукт не найден
+        или цена не определена (пустая ширина или коэффициент)"""
+        statements.PRODUCT_PRICING_DATA.execute(cursor, (product_id,))
+        row = cursor.fetchone()
+        if not row:
+            return None
+        type_id, width, coefficient, material_cost = row
+        return self.rule_for(type_id).price(width, coefficient, material_cost)
@@ -0,0 +1,121 @@
+"""Кэш результатов запросов на чтение.
+
+Ключ кэша — нормализованный текст запроса и его параметры. Размер кэша
+ограничен числом хранимых строк, при переполнении вытесняются давно не
+использованные результаты (LRU). Каждая запись помнит таблицы, из которых
+она прочитана, и сбрасывается при записи в любую из них.
+"""
+import re
+from collections import OrderedDict
+
+from statements import Statement
+
+_WHITESPACE = re.compile(r"\s+")
+_TABLE_NAMES = re.compile(r"\b(?:FROM|JOIN)\s+([a-z_][a-z0-9_]*)", re.IGNORECASE)
+
+
+def normalize_sql(query):
+    """Приводит текст запроса к единому виду: без лишних пробелов и переносов"""
+    return _WHITESPACE.sub(" ", query).strip()
+
+
+def tables_of(query):
+    """Таблицы, упомянутые в FROM/JOIN запроса"""
+    return {name.lower() for name in _TABLE_NAMES.findall(query)}
+
+
+class QueryCache:
+    """LRU-кэш результатов SELECT с инвалидацией по таблицам"""
+
+    def __init__(self, max_rows=200000):
+        self.max_rows = max_rows
+        self.entries = OrderedDict()  # ключ -> (строки, таблицы)
+        self.keys_by_table = {}
+        self.cached_rows = 0
+        self.hits = 0
+        self.misses = 0
+
+    def fetchall(self, cursor, query, params=None, build=tuple):
+        """Возвращает строки результата запроса, при возможности из кэша.
+
+        build превращает список строк psycopg2 в хранимый объект (по умолчанию
+        кортеж); в кэше хранится уже результат build. Запрос из реестра
+        statements выполняется как подготовленный.
+        """
+        key, tables = self._key(query, params, build)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+        self.misses += 1
+        if isinstance(query, Statement):
+            query.execute(cursor, params)
+        else:
+            cursor.execute(query, params)
+        rows = build(cursor.fetchall())
+        self._store(key, rows, tables)
+        return rows
+
+    def cached(self, query, params=None, build=tuple):
+        """Результат запроса из кэша без обращения к базе; None, если его нет"""
+        key, _ = self._key(query, params, build)
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, query, params, rows, build=tuple):
+        """Сохраняет строки результата запроса, полученные другим запросом
+        (например, вместе с другими за одно обращение к базе)"""
+        key, tables = self._key(query, params, build)
+        self.misses += 1
+        rows = build(rows)
+        if key in self.entries:
+            self._remove(key)
+        self._store(key, rows, tables)
+        return rows
+
+    def _key(self, query, params, build):
+        if isinstance(query, Statement):
+            return (query.name, tuple(params or ()), build), tables_of(query.sql)
+        key = (normalize_sql(query), tuple(params) if params is not None else None, build)
+        return key, tables_of(key[0])
+
+    def fetchone(self, cursor, query, params=None):
+        rows = self.fetchall(cursor, query, params)
+        return rows[0] if rows else None
+
+    def _store(self, key, rows, tables):
+        if len(rows) > self.max_rows:
+            return
+        self.entries[key] = (rows, tables)
+        self.cached_rows += len(rows)
+        for table in tables:
+            self.keys_by_table.setdefault(table, set()).add(key)
+        while self.cached_rows > self.max_rows:
+            oldest_key = next(iter(self.entries))
+            self._remove(oldest_key)
+
+    def _remove(self, key):
+        rows, tables = self.entries.pop(key)
+        self.cached_rows -= len(rows)
+        for table in tables:
+            keys = self.keys_by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+
+    def invalidate(self, *tables):
+        """Сбрасывает все результаты, прочитанные из указанных таблиц"""
+        for table in tables:
+            for key in list(self.keys_by_table.pop(table, ())):
+                if key in self.entries:
+                    self._remove(key)
+
+    def clear(self):
+        self.entries.clear()
+        self.keys_by_table.clear()
+        self.cached_rows = 0
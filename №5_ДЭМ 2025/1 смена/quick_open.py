@@ -0,0 +1,127 @@
+"""Быстрый переход к строке по артикулу или началу наименования (Ctrl+K).
+
+Индекс строится при первом открытии поиска из загруженного списка и хранит ключи —
+приведенные к нижнему регистру артикулы, наименования и слова наименований —
+в отсортированных списках. Поиск по префиксу — двоичный поиск (bisect) и
+просмотр не больше limit подходящих ключей, без запросов к базе. После
+сохранения строки ее ключи заменяются на месте (update) без перестроения
+индекса:
+
+    index = QuickOpenIndex(("articul", "name"))
+    index.rebuild((product.id, label, (product.articul, product.name)) for product in store)
+    index.search("обои фл", limit=10)  # [(id, подпись), ...]
+"""
+from bisect import bisect_left, insort
+
+
+def normalize(text):
+    """Ключ поиска: без лишних пробелов, без учета регистра"""
+    return " ".join(str(text or "").split()).casefold()
+
+
+class PrefixIndex:
+    """Отсортированный список пар (ключ, id строки)"""
+
+    __slots__ = ("pairs",)
+
+    def __init__(self, pairs=()):
+        self.pairs = sorted(pairs)
+
+    def add(self, key, row_id):
+        insort(self.pairs, (key, row_id))
+
+    def remove(self, key, row_id):
+        position = bisect_left(self.pairs, (key, row_id))
+        if position < len(self.pairs) and self.pairs[position] == (key, row_id):
+            del self.pairs[position]
+
+    def prefixed(self, prefix):
+        """id строк, ключи которых начинаются с prefix, в порядке ключей"""
+        pairs = self.pairs
+        position = bisect_left(pairs, (prefix,))
+        while position < len(pairs) and pairs[position][0].startswith(prefix):
+            yield pairs[position][1]
+            position += 1
+
+
+class QuickOpenIndex:
+    """Индекс быстрого перехода по полям строки.
+
+    fields — названия полей в порядке важности: совпадения по первому полю
+    показываются раньше совпадений по второму и т. д., последними — совпадения
+    с началом любого слова последнего поля (наименования).
+    """
+
+    def __init__(self, fields):
+        self.fields = tuple(fields)
+        self.labels = {}  # id строки -> подпись в списке совпадений
+        self.stale = True  # индекс нужно построить заново из загруженного списка
+        self._keys = {}  # id строки -> ключи полей и слов
+        self._indexes = [PrefixIndex() for _ in self.fields]
+        self._words = PrefixIndex()
+
+    def __len__(self):
+        return len(self.labels)
+
+    def _row_keys(self, values):
+        keys = tuple(normalize(value) for value in values)
+        # Первое слово уже покрыто ключом всего поля
+        words = tuple(dict.fromkeys(keys[-1].split(" ")[1:]))
+        return keys, words
+
+    def rebuild(self, rows):
+        """Строит индекс заново; rows — (id, подпись, значения полей в порядке fields)"""
+        self.labels = {}
+        self._keys = {}
+        field_pairs = [[] for _ in self.fields]
+        word_pairs = []
+        for row_id, label, values in rows:
+            keys, words = self._row_keys(values)
+            self.labels[row_id] = label
+            self._keys[row_id] = (keys, words)
+            for pairs, key in zip(field_pairs, keys):
+                if key:
+                    pairs.append((key, row_id))
+            word_pairs.extend((word, row_id) for word in words)
+        self._indexes = [PrefixIndex(pairs) for pairs in field_pairs]
+        self._words = PrefixIndex(word_pairs)
+        self.stale = False
+
+    def update(self, row_id, label, values):
+        """Добавляет строку или заменяет ее ключи и подпись"""
+        self.remove(row_id)
+        keys, words = self._row_keys(values)
+        self.labels[row_id] = label
+        self._keys[row_id] = (keys, words)
+        for index, key in zip(self._indexes, keys):
+            if key:
+                index.add(key, row_id)
+        for word in words:
+            self._words.add(word, row_id)
+
+    def remove(self, row_id):
+        entry = self._keys.pop(row_id, None)
+        if entry is None:
+            return
+        keys, words = entry
+        for index, key in zip(self._indexes, keys):
+            if key:
+                index.remove(key, row_id)
+        for word in words:
+            self._words.remove(word, row_id)
+        del self.labels[row_id]
+
+    def search(self, text, limit=10):
+        """Не больше limit строк, у которых поле или слово наименования
+        начинается с text: [(id, подпись)]"""
+        prefix = normalize(text)
+        if not prefix:
+            return []
+        found = {}
+        for index in self._indexes + [self._words]:
+            for row_id in index.prefixed(prefix):
+                if row_id not in found:
+                    found[row_id] = self.labels[row_id]
+                    if len(found) == limit:
+                        return list(found.items())
+        return list(found.items())
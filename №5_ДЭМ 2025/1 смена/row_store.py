@@ -0,0 +1,276 @@
+"""Компактное хранение загруженных списков продукции и материалов.
+
+Вместо списка кортежей psycopg2 с объектами Decimal данные хранятся по
+столбцам: числа — в типизированных массивах array, повторяющиеся строки
+(типы, единицы измерения) — один раз в словаре с кодами в массиве. Для
+доступа к строке используются легкие объекты-представления с __slots__.
+Пустые (NULL) числа хранятся в массиве нулем, а их позиции — в отдельном
+множестве столбца, поэтому представление строки возвращает для них None.
+
+Сортировка и группировка выполняются в памяти: для каждого столбца-ключа один
+раз вычисляются ранги значений, при сортировке ранги нескольких ключей
+складываются в одно число и устойчиво сортируется перестановка индексов
+строк. Сами строки и столбцы при этом не перемещаются. Пустые значения
+идут после остальных, как NULL при сортировке по возрастанию в PostgreSQL.
+"""
+import sys
+from array import array
+
+
+class StringColumn:
+    """Столбец повторяющихся строк: каждая уникальная строка хранится один раз"""
+
+    __slots__ = ("values", "codes", "_index")
+
+    def __init__(self):
+        self.values = []
+        self.codes = array("I")
+        self._index = {}
+
+    def _code(self, value):
+        code = self._index.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(sys.intern(value) if isinstance(value, str) else value)
+            self._index[value] = code
+        return code
+
+    def append(self, value):
+        self.codes.append(self._code(value))
+
+    def __getitem__(self, position):
+        return self.values[self.codes[position]]
+
+    def __setitem__(self, position, value):
+        self.codes[position] = self._code(value)
+
+
+class ColumnStore:
+    """Набор столбцов одинаковой длины.
+
+    COLUMNS описывает столбцы в порядке полей запроса: имя и вид хранения —
+    код типа array ("q", "d"), "str" для уникальных строк или "enum" для
+    повторяющихся. nulls — позиции пустых значений числовых столбцов.
+    """
+
+    COLUMNS = ()
+    ROW_CLASS = None
+
+    def __init__(self, rows=()):
+        self.columns = {}
+        self.nulls = {name: set() for name, _ in self.COLUMNS}
+        for name, kind in self.COLUMNS:
+            if kind == "enum":
+                self.columns[name] = StringColumn()
+            elif kind == "str":
+                self.columns[name] = []
+            else:
+                self.columns[name] = array(kind)
+        self.positions = {}
+        self._sort_cache = {}
+        for row in rows:
+            self.append(row)
+
+    def _converted(self, row, position):
+        for (name, kind), value in zip(self.COLUMNS, row):
+            if kind in ("q", "d"):
+                if value is None:
+                    self.nulls[name].add(position)
+                    value = 0
+                else:
+                    self.nulls[name].discard(position)
+                    value = int(value) if kind == "q" else float(value)
+            yield name, value
+
+    def append(self, row):
+        position = len(self.positions)
+        for name, value in self._converted(row, position):
+            self.columns[name].append(value)
+        self.positions[row[0]] = position
+        self._sort_cache.clear()
+
+    def update(self, row):
+        """Заменяет значения строки с тем же id (первое поле) или добавляет новую"""
+        position = self.positions.get(row[0])
+        if position is None:
+            self.append(row)
+            return
+        for name, value in self._converted(row, position):
+            self.columns[name][position] = value
+        self._sort_cache.clear()
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __getitem__(self, position):
+        return self.ROW_CLASS(self, position)
+
+    def __iter__(self):
+        for position in range(len(self)):
+            yield self.ROW_CLASS(self, position)
+
+    def get(self, row_id):
+        """Строка по id или None"""
+        position = self.positions.get(row_id)
+        return None if position is None else self.ROW_CLASS(self, position)
+
+    def value(self, name, position):
+        """Значение столбца в позиции; None для пустого значения"""
+        if position in self.nulls[name]:
+            return None
+        return self.columns[name][position]
+
+    def sort_ranks(self, name):
+        """Ключ сортировки столбца: ранги значений по позициям строк.
+
+        Равные значения получают равный ранг, строки сравниваются без учета
+        регистра, пустые значения получают последний ранг. Возвращает (массив
+        рангов, число различных рангов); ранги вычисляются один раз до
+        изменения данных.
+        """
+        cached = self._sort_cache.get(name)
+        if cached is not None:
+            return cached
+        column = self.columns[name]
+        kind = dict(self.COLUMNS)[name]
+        ranks = array("I", bytes(4 * len(self)))
+        if kind == "enum":
+            # Ранжируются только уникальные значения, строки получают ранг по коду
+            values = [None if value is None else value.casefold() for value in column.values]
+            distinct = sorted(set(values) - {None})
+            rank_of = {value: rank for rank, value in enumerate(distinct)}
+            rank_of[None] = len(distinct)
+            code_ranks = [rank_of[value] for value in values]
+            for position, code in enumerate(column.codes):
+                ranks[position] = code_ranks[code]
+            cached = (ranks, len(distinct) + (None in values))
+        else:
+            if kind == "str":
+                values = [None if value is None else value.casefold() for value in column]
+                nulls = {position for position, value in enumerate(values) if value is None}
+            else:
+                values = column
+                nulls = self.nulls[name]
+            rank = -1
+            previous = object()
+            filled = (position for position in range(len(self)) if position not in nulls)
+            for position in sorted(filled, key=values.__getitem__):
+                if values[position] != previous:
+                    rank += 1
+                    previous = values[position]
+                ranks[position] = rank
+            if nulls:
+                rank += 1
+                for position in nulls:
+                    ranks[position] = rank
+            cached = (ranks, rank + 1)
+        self._sort_cache[name] = cached
+        return cached
+
+    def permutation(self, order, group_by=None):
+        """Позиции строк в порядке сортировки.
+
+        order — последовательность (имя столбца, по убыванию); при равенстве
+        ключей сохраняется исходный порядок. group_by — столбец, по которому
+        строки сначала собираются в группы (группы идут по возрастанию).
+        Ранги ключей складываются в одно целое число, поэтому выполняется
+        одна сортировка независимо от числа ключей.
+        """
+        keys = tuple(order)
+        if group_by is not None:
+            keys = ((group_by, False),) + keys
+        cached = self._sort_cache.get(keys)
+        if cached is not None:
+            return cached
+        combined = None
+        for name, descending in keys:
+            ranks, size = self.sort_ranks(name)
+            if descending:
+                ranks = [size - 1 - rank for rank in ranks]
+            if combined is None:
+                combined = list(ranks)
+            else:
+                combined = [value * size + rank for value, rank in zip(combined, ranks)]
+        if combined is None:
+            positions = array("I", range(len(self)))
+        else:
+            positions = array("I", sorted(range(len(self)), key=combined.__getitem__))
+        # Готовые перестановки хранятся вместе с рангами до изменения данных
+        self._sort_cache[keys] = positions
+        return positions
+
+    def search(self, text, fields=("name",)):
+        """Строки, в полях которых встречается текст (без учета регистра)"""
+        text = text.strip().lower()
+        columns = [self.columns[field] for field in fields]
+        return [self.ROW_CLASS(self, position) for position in range(len(self))
+                if any(column[position] is not None and text in str(column[position]).lower()
+                       for column in columns)]
+
+
+def _column_property(name):
+    return property(lambda row: row.store.value(name, row.position))
+
+
+class RowView:
+    """Представление одной строки хранилища; значения читаются из столбцов"""
+
+    __slots__ = ("store", "position")
+
+    def __init__(self, store, position):
+        self.store = store
+        self.position = position
+
+    def __iter__(self):
+        for name, _ in self.store.COLUMNS:
+            yield self.store.value(name, self.position)
+
+
+class ProductRow(RowView):
+    __slots__ = ()
+    id = _column_property("id")
+    type_name = _column_property("type_name")
+    name = _column_property("name")
+    min_cost = _column_property("min_cost")
+    articul = _column_property("articul")
+    width = _column_property("width")
+
+
+class ProductStore(ColumnStore):
+    """Продукция в порядке полей запроса ProductsPage.load_products"""
+
+    COLUMNS = (
+        ("id", "q"),
+        ("type_name", "enum"),
+        ("name", "str"),
+        ("min_cost", "d"),
+        ("articul", "str"),
+        ("width", "d"),
+    )
+    ROW_CLASS = ProductRow
+
+
+class MaterialRow(RowView):
+    __slots__ = ()
+    id = _column_property("id")
+    type_name = _column_property("type_name")
+    name = _column_property("name")
+    unit_price = _column_property("unit_price")
+    stock_quantity = _column_property("stock_quantity")
+    unit = _column_property("unit")
+    low_stock = _column_property("low_stock")
+
+
+class MaterialStore(ColumnStore):
+    """Материалы в порядке полей запроса MaterialsPage.load_materials"""
+
+    COLUMNS = (
+        ("id", "q"),
+        ("type_name", "enum"),
+        ("name", "str"),
+        ("unit_price", "d"),
+        ("stock_quantity", "q"),
+        ("unit", "enum"),
+        ("low_stock", "q"),
+    )
+    ROW_CLASS = MaterialRow
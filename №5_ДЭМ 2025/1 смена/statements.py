@@ -0,0 +1,685 @@
+"""Реестр SQL-запросов приложения.
+
+Все постоянные запросы объявлены здесь один раз. Запрос с prepare=True при
+первом выполнении на соединении подготавливается командой PREPARE (в той же
+отправке, что и первый EXECUTE), дальше выполняется через EXECUTE без
+повторного разбора и планирования. Для каждого запроса ведется счетчик
+выполнений и подготовок (stats()).
+
+Каждая отправка команд на сервер — это ожидание ответа по сети, поэтому
+связанные запросы можно отправить одной строкой (execute_batch).
+
+Динамические запросы (пересчет цен по правилам) собираются в pricing.py из
+фрагментов, объявленных в этом модуле.
+"""
+import re
+import time
+import weakref
+
+_PLACEHOLDER = re.compile(r"%s")
+
+# Все объявленные запросы: имя -> Statement
+REGISTRY = {}
+
+
+class Statement:
+    """Именованный запрос с параметрами в стиле psycopg2 (%s)"""
+
+    # observer(имя запроса, длительность в мс) вызывается после каждого выполнения
+    observer = None
+
+    def __init__(self, name, sql, prepare=True):
+        if name in REGISTRY:
+            raise ValueError(f"Запрос {name} уже объявлен")
+        self.name = name
+        self.sql = sql
+        self.prepare = prepare
+        self.param_count = len(_PLACEHOLDER.findall(sql))
+        counter = iter(range(1, self.param_count + 1))
+        self.prepared_sql = _PLACEHOLDER.sub(lambda match: f"${next(counter)}", sql)
+        self.executions = 0
+        self.prepares = 0
+        self._prepared_on = weakref.WeakSet()
+        self._unknown_on = weakref.WeakSet()
+        REGISTRY[name] = self
+
+    def execute(self, cursor, params=()):
+        """Выполняет запрос, при необходимости подготовив его на соединении курсора"""
+        execute_batch(cursor, [(self, params)])
+
+    def _sync(self, cursor):
+        # После ошибки неизвестно, успела ли выполниться PREPARE: проверяем на сервере
+        connection = cursor.connection
+        if connection in self._unknown_on:
+            self._unknown_on.discard(connection)
+            cursor.execute("SELECT 1 FROM pg_prepared_statements WHERE name = %s", (self.name,))
+            if cursor.fetchone():
+                self._prepared_on.add(connection)
+
+    def command(self, connection, params=()):
+        """Текст команды для соединения: EXECUTE, а до подготовки — PREPARE и EXECUTE"""
+        if not self.prepare:
+            return self.sql if params else self.sql.replace("%", "%%")
+        execute = f"EXECUTE {self.name}"
+        if params:
+            execute += f" ({', '.join(['%s'] * len(params))})"
+        if connection in self._prepared_on:
+            return execute
+        # Знаки % в тексте запроса — не параметры (они уже заменены на $n)
+        return f"PREPARE {self.name} AS {self.prepared_sql.replace('%', '%%')};\n{execute}"
+
+    def __repr__(self):
+        return f"<Statement {self.name}>"
+
+
+def execute_batch(cursor, calls):
+    """Выполняет запросы calls [(Statement, параметры)] за одну отправку на сервер.
+
+    Команды передаются одной строкой через точку с запятой, результат курсора —
+    результат последней команды. На соединении в режиме autocommit PostgreSQL
+    выполняет такую строку как одну транзакцию: ошибка любой команды отменяет
+    все. Вне autocommit psycopg2 отдельно отправляет BEGIN, а фиксирует
+    транзакцию вызывающий код.
+    """
+    connection = cursor.connection
+    for statement, _ in calls:
+        statement._sync(cursor)
+    unprepared = [statement for statement, _ in calls
+                  if statement.prepare and connection not in statement._prepared_on]
+    sql = ";\n".join(statement.command(connection, params) for statement, params in calls)
+    params = [value for _, call_params in calls for value in call_params or ()]
+
+    observer = Statement.observer
+    started = time.perf_counter()
+    try:
+        cursor.execute(sql, params)
+    except Exception:
+        # PREPARE выполняется и остается на соединении, даже если следующая команда
+        # завершилась ошибкой, а ошибка раньше нее отменяет и саму подготовку
+        for statement in unprepared:
+            statement._unknown_on.add(connection)
+        raise
+    finally:
+        for statement, _ in calls:
+            statement.executions += 1
+        if observer is not None:
+            observer("+".join(statement.name for statement, _ in calls),
+                     (time.perf_counter() - started) * 1000)
+    for statement in unprepared:
+        statement._prepared_on.add(connection)
+        statement.prepares += 1
+
+
+def stats():
+    """Статистика повторного использования планов: (имя, выполнений, подготовок)"""
+    return [(statement.name, statement.executions, statement.prepares)
+            for statement in REGISTRY.values()]
+
+
+# --- Фрагменты для составных и динамических запросов ---
+
+# Перед записью в историю цен убеждаемся, что секция текущего месяца существует
+ENSURE_PRICE_HISTORY_PARTITION_SQL = "SELECT ensure_price_history_partition(now())"
+
+# Вставка в историю цен строк, возвращенных изменяющим запросом changed(id_product, min_cost)
+INSERT_CHANGED_PRICES_SQL = """
+    INSERT INTO product_price_history (id_product, min_cost, source)
+    SELECT id_product, min_cost, %s FROM changed"""
+
+# Секция журнала изменений (audit.py) текущего месяца
+ENSURE_AUDIT_LOG_PARTITION_SQL = "SELECT ensure_audit_log_partition(now())"
+
+
+def _repriced_audit_sql(source):
+    # Запись в журнал изменений цен, возвращенных запросом пересчета
+    # changed(id_product, min_cost, old_cost); source — SQL-выражение источника.
+    # Используется как часть WITH
+    return f"""
+    audit AS (
+        INSERT INTO audit_log (entity, entity_id, action, source, before_row, after_row)
+        SELECT 'product', id_product, 'U', {source},
+               jsonb_build_object('min_cost', old_cost), jsonb_build_object('min_cost', min_cost)
+        FROM changed
+    )"""
+
+
+INSERT_REPRICED_AUDIT_SQL = _repriced_audit_sql("'repricing'")
+
+# Стоимость материалов на единицу продукции по составу
+MATERIAL_COSTS_SQL = """
+    SELECT pm.id_product, SUM(pm.required_quantity * m.unit_price) AS material_cost
+    FROM product_materials pm
+    JOIN materials m ON m.id_material = pm.id_material
+    GROUP BY pm.id_product"""
+
+# Вместе с ACTIVE_MATERIAL условие совпадает с предикатом частичного индекса
+# materials_active_low_stock_idx
+LOW_STOCK_CONDITION = "m.stock_quantity < m.min_quantity"
+
+# Строки в работе (не в архиве, см. archive.py); совпадают с предикатами
+# частичных индексов products_active_name_idx и materials_active_name_idx
+ACTIVE_PRODUCT = "p.archived_at IS NULL"
+ACTIVE_MATERIAL = "m.archived_at IS NULL"
+
+# --- Списки и справочники ---
+
+# Списки выбирают только поля заголовков карточек и ключи сортировки; остальные поля
+# строки и состав загружаются при раскрытии карточки или открытии диалога
+# (PRODUCT_ROW, MATERIAL_ROW). По умолчанию списки содержат только строки в работе
+_PRODUCTS_COLUMNS = """
+    SELECT
+        p.id_product,
+        tp.type_product,
+        p.product_name,
+        p.min_cost,
+        p.acrticul,
+        p.width
+    FROM products p
+    JOIN type_product tp ON p.id_type_product = tp.id_type_product"""
+
+PRODUCTS_LIST = Statement("products_list", _PRODUCTS_COLUMNS + f"""
+    WHERE {ACTIVE_PRODUCT}
+    ORDER BY p.product_name""")
+
+PRODUCTS_ARCHIVED_LIST = Statement("products_archived_list", _PRODUCTS_COLUMNS + """
+    WHERE p.archived_at IS NOT NULL
+    ORDER BY p.product_name""")
+
+_MATERIALS_COLUMNS = f"""
+    SELECT
+        m.id_material,
+        tm.type_material,
+        m.material_name,
+        m.unit_price,
+        m.stock_quantity,
+        m.unit,
+        {LOW_STOCK_CONDITION} AS low_stock
+    FROM materials m
+    JOIN type_material tm ON m.id_type_material = tm.id_type_material"""
+
+MATERIALS_LIST = Statement("materials_list", _MATERIALS_COLUMNS + f"""
+    WHERE {ACTIVE_MATERIAL}
+    ORDER BY m.material_name""")
+
+MATERIALS_LOW_STOCK_LIST = Statement("materials_low_stock_list", _MATERIALS_COLUMNS + f"""
+    WHERE {ACTIVE_MATERIAL} AND {LOW_STOCK_CONDITION}
+    ORDER BY m.material_name""")
+
+MATERIALS_ARCHIVED_LIST = Statement("materials_archived_list", _MATERIALS_COLUMNS + """
+    WHERE m.archived_at IS NOT NULL
+    ORDER BY m.material_name""")
+
+# Оценка запасов (inventory.py): материалы одного типа идут подряд, цена — в копейках
+INVENTORY_MATERIALS = Statement("inventory_materials", f"""
+    SELECT m.id_material, tm.type_material, m.unit, round(coalesce(m.unit_price, 0) * 100)::bigint,
+           coalesce(m.stock_quantity, 0), coalesce(m.package_quantity, 0)
+    FROM materials m
+    JOIN type_material tm ON m.id_type_material = tm.id_type_material
+    WHERE {ACTIVE_MATERIAL}
+    ORDER BY tm.type_material, m.id_material""")
+
+PRODUCT_TYPES = Statement("product_types", """
+    SELECT id_type_product, type_product FROM type_product ORDER BY type_product""")
+
+MATERIAL_TYPES = Statement("material_types", """
+    SELECT id_type_material, type_material FROM type_material ORDER BY type_material""")
+
+LOW_STOCK_SHORTAGES = Statement("low_stock_shortages", f"""
+    SELECT m.id_material, m.material_name, m.stock_quantity, m.min_quantity, m.unit
+    FROM materials m
+    WHERE {ACTIVE_MATERIAL} AND {LOW_STOCK_CONDITION}
+    ORDER BY m.material_name""")
+
+DASHBOARD_SUMMARY = Statement("dashboard_summary", """
+    SELECT kind, label, item_count, amount
+    FROM dashboard_summary
+    ORDER BY kind, label""")
+
+# Служебные команды не подготавливаются (PREPARE их не поддерживает)
+DASHBOARD_REFRESH = Statement("dashboard_refresh", """
+    REFRESH MATERIALIZED VIEW CONCURRENTLY dashboard_summary""", prepare=False)
+
+# --- Продукция ---
+
+# Последнее поле — версия строки (xmin) для оптимистической блокировки, см. conflicts.py
+PRODUCT_ROW = Statement("product_row", """
+    SELECT acrticul, id_type_product, product_name, min_cost, width, xmin::text
+    FROM products
+    WHERE id_product = %s""")
+
+# Открытие диалога без загруженного справочника: строка продукта (как PRODUCT_ROW,
+# все поля NULL, если продукта нет) и справочник типов (как PRODUCT_TYPES, в JSON)
+# за одно обращение к базе
+PRODUCT_DIALOG_DATA = Statement("product_dialog_data", """
+    SELECT p.acrticul, p.id_type_product, p.product_name, p.min_cost, p.width, p.xmin::text,
+           (SELECT json_agg(json_build_array(id_type_product, type_product) ORDER BY type_product)
+            FROM type_product)
+    FROM (SELECT %s::integer AS id_product) k
+    LEFT JOIN products p ON p.id_product = k.id_product""")
+
+ENSURE_PRICE_HISTORY_PARTITION = Statement(
+    "ensure_price_history_partition", ENSURE_PRICE_HISTORY_PARTITION_SQL)
+
+# Обновление продукта, если его версия не изменилась с момента чтения; новая цена
+# попадает в историю, только если она изменилась. Возвращает число обновленных строк
+PRODUCT_UPDATE = Statement("product_update", """
+    WITH updated AS (
+        UPDATE products p
+        SET acrticul = %s,
+            id_type_product = %s,
+            product_name = %s,
+            min_cost = %s,
+            width = %s
+        FROM products old
+        WHERE p.id_product = %s AND p.xmin::text = %s AND old.id_product = p.id_product
+        RETURNING p.id_product, p.min_cost, old.min_cost AS old_cost
+    ),
+    changed AS (
+        SELECT id_product, min_cost FROM updated
+        WHERE min_cost IS DISTINCT FROM old_cost
+    ),
+    history AS (""" + INSERT_CHANGED_PRICES_SQL + """
+    )
+    SELECT count(*) FROM updated""")
+
+# Добавление продукта вместе с первой записью в истории цен; возвращает id продукта
+PRODUCT_INSERT = Statement("product_insert", """
+    WITH changed AS (
+        INSERT INTO products
+        (acrticul, id_type_product, product_name, min_cost, width)
+        VALUES (%s, %s, %s, %s, %s)
+        RETURNING id_product, min_cost
+    )""" + INSERT_CHANGED_PRICES_SQL + """
+    RETURNING id_product""")
+
+PRODUCT_COMPOSITION = Statement("product_composition", """
+    SELECT m.material_name, pm.required_quantity, m.unit, pm.required_quantity * m.unit_price
+    FROM product_materials pm
+    JOIN materials m ON m.id_material = pm.id_material
+    WHERE pm.id_product = %s
+    ORDER BY m.material_name""")
+
+PRODUCT_PRICING_DATA = Statement("product_pricing_data", """
+    SELECT p.id_type_product, p.width, tp.coefficient_type_product,
+           (SELECT SUM(pm.required_quantity * m.unit_price)
+            FROM product_materials pm
+            JOIN materials m ON m.id_material = pm.id_material
+            WHERE pm.id_product = p.id_product)
+    FROM products p
+    JOIN type_product tp ON p.id_type_product = tp.id_type_product
+    WHERE p.id_product = %s""")
+
+# Ширины продукции для раскроя рулонов (cutting.py)
+PRODUCT_WIDTHS = Statement("product_widths", """
+    SELECT id_product, width FROM products WHERE id_product = ANY(%s)""")
+
+PRICING_RULES = Statement("pricing_rules", """
+    SELECT id_type_product, formula, base_cost, markup_percent, min_price, rounding_step
+    FROM pricing_rules""")
+
+# --- Материалы ---
+
+MATERIAL_ROW = Statement("material_row", """
+    SELECT material_name, id_type_material, unit_price,
+           stock_quantity, min_quantity, package_quantity, unit, xmin::text
+    FROM materials
+    WHERE id_material = %s""")
+
+# То же для диалога материала: MATERIAL_ROW и MATERIAL_TYPES
+MATERIAL_DIALOG_DATA = Statement("material_dialog_data", """
+    SELECT m.material_name, m.id_type_material, m.unit_price,
+           m.stock_quantity, m.min_quantity, m.package_quantity, m.unit, m.xmin::text,
+           (SELECT json_agg(json_build_array(id_type_material, type_material) ORDER BY type_material)
+            FROM type_material)
+    FROM (SELECT %s::integer AS id_material) k
+    LEFT JOIN materials m ON m.id_material = k.id_material""")
+
+MATERIAL_USAGE = Statement("material_usage", """
+    SELECT p.product_name, pm.required_quantity
+    FROM product_materials pm
+    JOIN products p ON p.id_product = pm.id_product
+    WHERE pm.id_material = %s
+    ORDER BY p.product_name""")
+
+# Обновление материала, если его версия не изменилась с момента чтения;
+# возвращает новую версию строки (нет строк — конфликт версий)
+MATERIAL_UPDATE = Statement("material_update", """
+    UPDATE materials
+    SET material_name = %s,
+        id_type_material = %s,
+        unit_price = %s,
+        stock_quantity = %s,
+        min_quantity = %s,
+        package_quantity = %s,
+        unit = %s
+    WHERE id_material = %s AND xmin::text = %s
+    RETURNING xmin::text""")
+
+MATERIAL_INSERT = Statement("material_insert", """
+    INSERT INTO materials
+    (material_name, id_type_material, unit_price,
+     stock_quantity, min_quantity, package_quantity, unit)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+    RETURNING id_material""")
+
+# --- История цен ---
+
+PRICE_AS_OF = Statement("price_as_of", """
+    SELECT min_cost
+    FROM product_price_history
+    WHERE id_product = %s AND valid_from <= %s
+    ORDER BY valid_from DESC
+    LIMIT 1""")
+
+CATALOGUE_AS_OF = Statement("catalogue_as_of", """
+    SELECT p.id_product, h.min_cost
+    FROM products p
+    CROSS JOIN LATERAL (
+        SELECT min_cost
+        FROM product_price_history
+        WHERE id_product = p.id_product AND valid_from <= %s
+        ORDER BY valid_from DESC
+        LIMIT 1
+    ) h""")
+
+PRICE_CHANGES = Statement("price_changes", """
+    SELECT valid_from, min_cost, source
+    FROM product_price_history
+    WHERE id_product = %s
+    ORDER BY valid_from""")
+
+# --- Журнал изменений ---
+
+ENSURE_AUDIT_LOG_PARTITION = Statement("ensure_audit_log_partition", """
+    SELECT ensure_audit_log_partition(%s)""")
+
+# Условие по entity, entity_id и changed_at совпадает с индексом audit_log_entity_idx,
+# а по changed_at отсекаются секции за другие месяцы
+AUDIT_HISTORY = Statement("audit_history", """
+    SELECT changed_at, action, actor, source, before_row, after_row
+    FROM audit_log
+    WHERE entity = %s AND entity_id = %s AND changed_at >= %s AND changed_at < %s
+    ORDER BY changed_at""")
+
+# --- Параллельный пересчет цен (выполняются редко, без подготовки) ---
+
+# Величины сразу приводятся к целым с фиксированной точкой (pricing.WIDTH_DIGITS,
+# COEFFICIENT_DIGITS, MATERIAL_COST_DIGITS), цена — к копейкам
+SHARD_ROWS = Statement("shard_rows", """
+    SELECT p.id_product, p.id_type_product,
+           round(p.width::numeric * 10000)::bigint,
+           round(tp.coefficient_type_product::numeric * 10000)::bigint,
+           round(COALESCE(mc.material_cost, 0) * 1000000)::bigint,
+           round(p.min_cost::numeric * 100)::bigint
+    FROM products p
+    JOIN type_product tp ON p.id_type_product = tp.id_type_product
+    LEFT JOIN (
+        SELECT pm.id_product, SUM(pm.required_quantity * m.unit_price) AS material_cost
+        FROM product_materials pm
+        JOIN materials m ON m.id_material = pm.id_material
+        WHERE pm.id_product BETWEEN %s AND %s
+        GROUP BY pm.id_product
+    ) mc ON mc.id_product = p.id_product
+    WHERE p.id_product BETWEEN %s AND %s""", prepare=False)
+
+# Пакетное обновление цен секции (для execute_values с SHARD_UPDATE_TEMPLATE:
+# id, новая и прежняя цены в копейках, источник) с записью изменений в историю
+# цен и журнал изменений. Цена меняется, только если в базе все еще прежняя
+# цена: строки, измененные после чтения, пропускаются. Возвращает id
+# измененных строк (execute_values(..., fetch=True))
+SHARD_UPDATE_SQL = ENSURE_PRICE_HISTORY_PARTITION_SQL + "; " + ENSURE_AUDIT_LOG_PARTITION_SQL + """;
+    WITH changed AS (
+        UPDATE products p
+        SET min_cost = v.new_cost
+        FROM (VALUES %s) AS v(id_product, new_cost, old_cost, source)
+        WHERE p.id_product = v.id_product
+          AND round(p.min_cost::numeric, 2) IS NOT DISTINCT FROM v.old_cost
+        RETURNING p.id_product, p.min_cost, v.old_cost, v.source
+    ),""" + _repriced_audit_sql("source") + """
+    INSERT INTO product_price_history (id_product, min_cost, source)
+    SELECT id_product, min_cost, source FROM changed
+    RETURNING id_product"""
+
+SHARD_UPDATE_TEMPLATE = "(%s, %s::numeric / 100, %s::numeric / 100, %s)"
+
+SHARD_DONE = Statement("shard_done", """
+    UPDATE repricing_shards
+    SET status = 'done', updated_count = %s, error = NULL
+    WHERE id_run = %s AND shard_no = %s""", prepare=False)
+
+SHARD_FAILED = Statement("shard_failed", """
+    UPDATE repricing_shards SET status = 'failed', error = %s
+    WHERE id_run = %s AND shard_no = %s""", prepare=False)
+
+PRODUCT_ID_RANGE = Statement("product_id_range", """
+    SELECT min(id_product), max(id_product) FROM products""", prepare=False)
+
+REPRICING_RUN_INSERT = Statement("repricing_run_insert", """
+    INSERT INTO repricing_runs DEFAULT VALUES RETURNING id_run""", prepare=False)
+
+REPRICING_SHARDS_INSERT = Statement("repricing_shards_insert", """
+    INSERT INTO repricing_shards (id_run, shard_no, id_from, id_to)
+    SELECT %s, n, %s + n * %s, LEAST(%s + (n + 1) * %s - 1, %s)
+    FROM generate_series(0, (%s - %s) / %s) AS n""", prepare=False)
+
+REPRICING_RUN_EXISTS = Statement("repricing_run_exists", """
+    SELECT 1 FROM repricing_runs WHERE id_run = %s""", prepare=False)
+
+REPRICING_PENDING_SHARDS = Statement("repricing_pending_shards", """
+    SELECT shard_no, id_from, id_to
+    FROM repricing_shards
+    WHERE id_run = %s AND status <> 'done'
+    ORDER BY shard_no""", prepare=False)
+
+REPRICING_RUN_FINISH = Statement("repricing_run_finish", """
+    UPDATE repricing_runs SET finished_at = now() WHERE id_run = %s""", prepare=False)
+
+# --- Моделирование цен (price_simulation.py, выполняются редко, без подготовки) ---
+
+# Величины в той же фиксированной точке, что и SHARD_ROWS. Продукция без ширины,
+# цены или коэффициента типа и архивная продукция в моделировании не участвуют.
+# Архивные материалы, как и в MATERIAL_COSTS_SQL, входят в стоимость состава,
+# но их цены в сценарии не меняются (последний столбец — материал в работе)
+SIMULATION_TYPES = Statement("simulation_types", """
+    SELECT id_type_product, type_product, coefficient_type_product
+    FROM type_product
+    WHERE coefficient_type_product IS NOT NULL
+    ORDER BY type_product""", prepare=False)
+
+SIMULATION_PRODUCTS = Statement("simulation_products", f"""
+    SELECT p.id_product, p.id_type_product,
+           round(p.width::numeric * 10000)::bigint,
+           round(p.min_cost::numeric * 100)::bigint
+    FROM products p
+    JOIN type_product tp ON p.id_type_product = tp.id_type_product
+    WHERE {ACTIVE_PRODUCT} AND p.width IS NOT NULL AND p.min_cost IS NOT NULL
+      AND tp.coefficient_type_product IS NOT NULL
+    ORDER BY p.id_product""", prepare=False)
+
+SIMULATION_MATERIALS = Statement("simulation_materials", f"""
+    SELECT m.id_material, m.material_name, m.unit_price, {ACTIVE_MATERIAL}
+    FROM materials m
+    WHERE m.unit_price IS NOT NULL
+    ORDER BY m.material_name""", prepare=False)
+
+SIMULATION_COMPOSITION = Statement("simulation_composition", """
+    SELECT pm.id_product, pm.id_material, round(pm.required_quantity * 10000)::bigint
+    FROM product_materials pm
+    JOIN materials m ON m.id_material = pm.id_material
+    WHERE m.unit_price IS NOT NULL""", prepare=False)
+
+# Новые коэффициенты и цены материалов (для execute_values: id, новое и прежнее
+# значения). Строка изменяется, только если значение в базе еще прежнее
+SIMULATION_COEFFICIENTS_SQL = """
+    UPDATE type_product tp
+    SET coefficient_type_product = v.new_value
+    FROM (VALUES %s) AS v(id_type_product, new_value, old_value)
+    WHERE tp.id_type_product = v.id_type_product
+      AND tp.coefficient_type_product = v.old_value"""
+
+SIMULATION_MATERIAL_PRICES_SQL = ENSURE_AUDIT_LOG_PARTITION_SQL + """;
+    WITH changed AS (
+        UPDATE materials m
+        SET unit_price = v.new_value
+        FROM (VALUES %s) AS v(id_material, new_value, old_value)
+        WHERE m.id_material = v.id_material
+          AND m.unit_price = v.old_value
+        RETURNING m.id_material, v.old_value, v.new_value
+    )
+    INSERT INTO audit_log (entity, entity_id, action, source, before_row, after_row)
+    SELECT 'material', id_material, 'U', 'simulation',
+           jsonb_build_object('unit_price', old_value), jsonb_build_object('unit_price', new_value)
+    FROM changed"""
+
+# --- Объединение дублей (dedup.py, для execute_values: id дубля, id сохраняемой строки) ---
+
+# Количества материалов-дублей в составе продукции складываются в строку сохраняемого
+# материала, остаток на складе — тоже; дубли удаляются и записываются в журнал изменений
+MERGE_MATERIALS_SQL = ENSURE_AUDIT_LOG_PARTITION_SQL + """;
+    WITH merge(id_duplicate, id_keep) AS (VALUES %s),
+    moved AS (
+        INSERT INTO product_materials (id_product, id_material, required_quantity)
+        SELECT pm.id_product, m.id_keep, sum(pm.required_quantity)
+        FROM product_materials pm
+        JOIN merge m ON pm.id_material = m.id_duplicate
+        GROUP BY pm.id_product, m.id_keep
+        ON CONFLICT (id_product, id_material) DO UPDATE
+        SET required_quantity = product_materials.required_quantity + EXCLUDED.required_quantity
+    ),
+    stock AS (
+        UPDATE materials k
+        SET stock_quantity = k.stock_quantity + s.added
+        FROM (
+            SELECT m.id_keep, sum(d.stock_quantity) AS added
+            FROM materials d
+            JOIN merge m ON d.id_material = m.id_duplicate
+            GROUP BY m.id_keep
+        ) s
+        WHERE k.id_material = s.id_keep AND s.added <> 0
+        RETURNING k.id_material, k.stock_quantity, s.added
+    ),
+    removed AS (
+        DELETE FROM materials d
+        USING merge m
+        WHERE d.id_material = m.id_duplicate
+        RETURNING d.*, m.id_keep
+    ),
+    audit AS (
+        INSERT INTO audit_log (entity, entity_id, action, source, before_row, after_row)
+        SELECT 'material', id_material, 'D', 'merge',
+               to_jsonb(removed) - 'id_keep', jsonb_build_object('merged_into', id_keep)
+        FROM removed
+        UNION ALL
+        SELECT 'material', id_material, 'U', 'merge',
+               jsonb_build_object('stock_quantity', stock_quantity - added),
+               jsonb_build_object('stock_quantity', stock_quantity)
+        FROM stock
+    )
+    SELECT count(*) FROM removed"""
+
+# Состав продукта-дубля дополняет состав сохраняемого продукта (совпадающие материалы
+# остаются как у сохраняемого)
+MERGE_PRODUCTS_SQL = ENSURE_AUDIT_LOG_PARTITION_SQL + """;
+    WITH merge(id_duplicate, id_keep) AS (VALUES %s),
+    moved AS (
+        INSERT INTO product_materials (id_product, id_material, required_quantity)
+        SELECT DISTINCT ON (m.id_keep, pm.id_material) m.id_keep, pm.id_material, pm.required_quantity
+        FROM product_materials pm
+        JOIN merge m ON pm.id_product = m.id_duplicate
+        ORDER BY m.id_keep, pm.id_material, pm.id_product
+        ON CONFLICT (id_product, id_material) DO NOTHING
+    ),
+    removed AS (
+        DELETE FROM products d
+        USING merge m
+        WHERE d.id_product = m.id_duplicate
+        RETURNING d.*, m.id_keep
+    ),
+    audit AS (
+        INSERT INTO audit_log (entity, entity_id, action, source, before_row, after_row)
+        SELECT 'product', id_product, 'D', 'merge',
+               to_jsonb(removed) - 'id_keep', jsonb_build_object('merged_into', id_keep)
+        FROM removed
+    )
+    SELECT count(*) FROM removed"""
+
+# --- Архив (archive.py) ---
+
+
+def _set_archived_sql(table, key, entity):
+    # Отметка строки как архивной или возврат в работу вместе с записью в журнал
+    # изменений. Параметры: в архив (true/false), id строки, то же значение
+    # еще раз; возвращает число измененных строк (0 — строка уже в этом состоянии)
+    return ENSURE_AUDIT_LOG_PARTITION_SQL + f""";
+    WITH changed AS (
+        UPDATE {table} t
+        SET archived_at = CASE WHEN %s THEN now() END
+        FROM {table} old
+        WHERE t.{key} = %s AND old.{key} = t.{key}
+          AND (old.archived_at IS NULL) = %s
+        RETURNING t.{key} AS id, old.archived_at AS old_value, t.archived_at AS new_value
+    ),
+    audit AS (
+        INSERT INTO audit_log (entity, entity_id, action, source, before_row, after_row)
+        SELECT '{entity}', id, 'U', 'archive',
+               jsonb_build_object('archived_at', old_value), jsonb_build_object('archived_at', new_value)
+        FROM changed
+    )
+    SELECT count(*) FROM changed"""
+
+
+PRODUCT_SET_ARCHIVED_SQL = _set_archived_sql("products", "id_product", "product")
+MATERIAL_SET_ARCHIVED_SQL = _set_archived_sql("materials", "id_material", "material")
+
+# Перенос строк, находящихся в архиве дольше заданного срока, в таблицы *_archive;
+# столбцы сопоставляются по именам. Состав продукции сохраняется в composition
+# (строки product_materials удаляются каскадом). Материалы, которые еще входят
+# в состав продукции, остаются на месте
+ARCHIVE_MOVE_PRODUCTS_SQL = """
+    WITH moved AS (
+        DELETE FROM products p
+        WHERE p.archived_at < %(before)s
+        RETURNING p.*
+    ),
+    stored AS (
+        INSERT INTO products_archive
+        SELECT (jsonb_populate_record(NULL::products_archive, to_jsonb(moved) || jsonb_build_object(
+            'moved_at', now(),
+            'composition', (SELECT jsonb_agg(jsonb_build_object('id_material', pm.id_material,
+                                                                'required_quantity', pm.required_quantity))
+                            FROM product_materials pm
+                            WHERE pm.id_product = moved.id_product)))).*
+        FROM moved
+    )
+    SELECT count(*) FROM moved"""
+
+ARCHIVE_MOVE_MATERIALS_SQL = """
+    WITH moved AS (
+        DELETE FROM materials m
+        WHERE m.archived_at < %(before)s
+          AND NOT EXISTS (SELECT 1 FROM product_materials pm WHERE pm.id_material = m.id_material)
+        RETURNING m.*
+    ),
+    stored AS (
+        INSERT INTO materials_archive
+        SELECT (jsonb_populate_record(NULL::materials_archive,
+                                      to_jsonb(moved) || jsonb_build_object('moved_at', now()))).*
+        FROM moved
+    )
+    SELECT count(*) FROM moved"""
+
+
+# --- Нагрузочный тест (load_test.py, выполняются редко, без подготовки) ---
+
+LOAD_TEST_PRODUCT_IDS = Statement("load_test_product_ids", """
+    SELECT id_product FROM products""", prepare=False)
+
+LOAD_TEST_MATERIAL_IDS = Statement("load_test_material_ids", """
+    SELECT id_material FROM materials""", prepare=False)
+
+# Ожидающие блокировки: какая таблица, кто ждет и кто держит
+LOCK_WAITS = Statement("lock_waits", """
+    SELECT COALESCE(c.relname, l.locktype), l.mode, cardinality(pg_blocking_pids(l.pid))
+    FROM pg_locks l
+    LEFT JOIN pg_class c ON c.oid = l.relation
+    WHERE NOT l.granted""", prepare=False)
@@ -0,0 +1,29 @@
+"""Общие настройки тестов: модули приложения импортируются из папки выше.
+
+Тесты проверяют расчетную логику без базы данных. Тесты с фикстурой
+db_cursor сверяют расчет с PostgreSQL и пропускаются, если база из
+database.DB_CONFIG недоступна; они ничего не записывают в базу.
+
+    python -m pytest -q tests
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def db_cursor():
+    """Курсор подключения к базе из database.py (только для чтения)"""
+    psycopg2 = pytest.importorskip("psycopg2")
+    import database
+    try:
+        connection = database.connect()
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"База данных недоступна: {e}")
+    connection.autocommit = True
+    cursor = connection.cursor()
+    yield cursor
+    connection.close()
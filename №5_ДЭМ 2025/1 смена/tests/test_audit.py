@@ -0,0 +1,87 @@
+"""Журнал изменений: образы строк и фоновая запись пачками при сбоях базы"""
+import pytest
+
+import audit
+from audit import ENTITY_MATERIAL, AuditWriter
+
+psycopg2 = pytest.importorskip("psycopg2")
+
+
+def test_row_images():
+    before = ["Белила ", 1, 10.5, 100, 20, 10, "кг"]
+    after = ["Белила", 1, 11, 100, 20, 10, "л"]
+    assert audit.row_images(ENTITY_MATERIAL, before, after) == (
+        {"unit_price": 10.5, "unit": "кг"}, {"unit_price": 11, "unit": "л"})
+    assert audit.row_images(ENTITY_MATERIAL, before, before) is None
+    assert audit.row_images(ENTITY_MATERIAL, None, after)[1]["material_name"] == "Белила"
+
+
+class Connection:
+    def cursor(self):
+        return self
+
+    def commit(self):
+        pass
+
+    rollback = close = commit
+
+
+class Database:
+    """Подключение и запись журнала: failures — {id записи: исключение}"""
+
+    def __init__(self, monkeypatch):
+        self.written = []
+        self.failures = {}
+        monkeypatch.setattr(audit.database, "connect", Connection)
+        monkeypatch.setattr(audit, "write_entries", self.write_entries)
+
+    def write_entries(self, cursor, entries):
+        for entry in entries:
+            if entry[1] in self.failures:
+                raise self.failures[entry[1]]
+        self.written.extend(entry[1] for entry in entries)
+
+
+def writer(*entity_ids, **options):
+    writer = AuditWriter(**options)
+    for entity_id in entity_ids:
+        writer.record(ENTITY_MATERIAL, entity_id, audit.ACTION_UPDATE, audit.SOURCE_EDIT, None, [])
+    return writer
+
+
+def queued(writer):
+    return [entry[1] for entry in writer._queue]
+
+
+def test_lost_connection_keeps_entries(monkeypatch):
+    database = Database(monkeypatch)
+    database.failures[2] = psycopg2.OperationalError("server closed the connection")
+    writer_ = writer(1, 2, 3)
+    assert not writer_._flush()
+    assert queued(writer_) == [1, 2, 3] and writer_.dropped == 0
+    del database.failures[2]
+    assert writer_._flush() and database.written == [1, 2, 3]
+
+
+def test_rejected_entry_does_not_block_others(monkeypatch):
+    database = Database(monkeypatch)
+    error = psycopg2.DataError("invalid input syntax for type json")
+    database.failures[2] = error
+    writer_ = writer(1, 2, 3, batch_size=2)
+    assert writer_._flush() and writer_._flush()
+    assert database.written == [1, 3] and not writer_._queue
+    assert writer_.rejected == 1 and writer_.last_error is error
+
+
+def test_full_queue_drops_oldest_on_requeue(monkeypatch):
+    Database(monkeypatch)
+    writer_ = writer(1, 2, 3, batch_size=2, max_pending=3)
+
+    def write_entries(cursor, entries):
+        # Пока пачка пишется, в очередь добавляется новое изменение
+        writer_.record(ENTITY_MATERIAL, 4, audit.ACTION_UPDATE, audit.SOURCE_EDIT, None, [])
+        raise psycopg2.InterfaceError("connection already closed")
+
+    monkeypatch.setattr(audit, "write_entries", write_entries)
+    assert not writer_._flush()
+    assert queued(writer_) == [2, 3, 4] and writer_.dropped == 1
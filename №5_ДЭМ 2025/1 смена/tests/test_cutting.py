@@ -0,0 +1,90 @@
+"""Раскрой рулонов: полнота заказа, вместимость схем и сравнение способов"""
+import random
+from collections import Counter
+
+import pytest
+
+import cutting
+
+
+def produced(plan):
+    pieces = Counter()
+    for pattern in plan.patterns:
+        for width, count in pattern.cuts.items():
+            pieces[width] += count * pattern.count
+    return pieces
+
+
+def check_plan(plan, order, roll_widths, kerf=0):
+    demand = Counter()
+    for width, quantity in order:
+        demand[cutting.to_units(width)] += quantity
+    assert produced(plan) == +demand
+    units = {cutting.to_units(width) for width in roll_widths}
+    for pattern in plan.patterns:
+        assert pattern.roll_width in units
+        assert pattern.kerf == cutting.to_units(kerf)
+        assert 0 <= pattern.waste < pattern.roll_width
+
+
+def test_exact_fit_without_waste():
+    plan = cutting.first_fit_decreasing([(0.5, 4)], [1.0])
+    assert plan.rolls == 2 and plan.waste_percent == 0
+    assert [(pattern.cuts, pattern.count) for pattern in plan.patterns] == [({500: 2}, 2)]
+
+
+def test_kerf_between_strips():
+    order = [(0.5, 2)]
+    assert cutting.first_fit_decreasing(order, [1.0], kerf=0.01).rolls == 2
+    plan = cutting.first_fit_decreasing(order, [1.01], kerf=0.01)
+    assert plan.rolls == 1 and plan.patterns[0].waste == 0
+
+
+def test_rolls_are_narrowed_to_the_narrowest_fitting_width():
+    plan = cutting.first_fit_decreasing([(1.0, 1), (0.5, 1)], [1.06, 0.53])
+    assert plan.rolls_by_width == {1060: 1, 530: 1}
+    assert plan.packages_needed(4) == {1060: 1, 530: 1}
+
+
+@pytest.mark.parametrize("method", [cutting.METHOD_FFD, cutting.METHOD_PATTERNS])
+def test_random_orders_are_cut_completely(method):
+    generator = random.Random(7)
+    roll_widths = [1.06, 2.12]
+    for _ in range(5):
+        order = [(generator.choice([0.21, 0.33, 0.45, 0.53, 0.68, 1.06]), generator.randint(1, 40))
+                 for _ in range(4)]
+        check_plan(cutting.optimize(order, roll_widths, method, kerf=0.002), order, roll_widths, 0.002)
+
+
+def test_patterns_use_no_more_material_than_first_fit():
+    order = [(0.45, 97), (0.36, 610), (0.31, 395), (0.14, 211)]
+    first_fit = cutting.first_fit_decreasing(order, [1.0])
+    patterns = cutting.generate_patterns(order, [1.0])
+    check_plan(patterns, order, [1.0])
+    assert patterns.rolls <= first_fit.rolls
+
+
+def test_knapsack():
+    value, counts = cutting._knapsack([3.0, 2.0, 0.5], [4, 3, 1], [1, 2, 5], 7)
+    assert value == 5.0
+    assert sum(weight * count for weight, count in zip([4, 3, 1], counts)) <= 7
+
+
+def test_empty_order():
+    assert cutting.first_fit_decreasing([(0.5, 0)], [1.0]).patterns == []
+
+
+@pytest.mark.parametrize("order, rolls", [
+    ([(1.2, 1)], [1.06]),
+    ([(0.5, -1)], [1.06]),
+    ([(0, 1)], [1.06]),
+    ([(0.5, 1)], []),
+])
+def test_invalid_input(order, rolls):
+    with pytest.raises(ValueError):
+        cutting.first_fit_decreasing(order, rolls)
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        cutting.optimize([(0.5, 1)], [1.0], method="best")
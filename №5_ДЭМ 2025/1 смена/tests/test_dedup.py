@@ -0,0 +1,119 @@
+"""Поиск дублей: префиксная фильтрация находит те же пары, что и полный перебор"""
+import random
+from itertools import combinations
+
+import pytest
+
+import dedup
+from dedup import DuplicateDetector, SimilarityIndex
+
+WORDS = ["клей", "пва", "обои", "флизелин", "бумага", "основа", "краска", "белая", "акрил",
+         "дисперсия", "пигмент", "синий", "лак", "глянец", "ролик", "винил", "рогожка"]
+
+
+def corpus(count, seed):
+    """Наименования из общих слов: много похожих и почти одинаковых"""
+    generator = random.Random(seed)
+    names = {}
+    for row_id in range(1, count + 1):
+        words = generator.sample(WORDS, generator.randint(1, 4))
+        if generator.random() < 0.3:
+            words[0] = words[0].upper() + "."
+        names[row_id] = " ".join(words)
+    return names
+
+
+def brute_force_pairs(names, threshold):
+    grams = {row_id: dedup.ngrams(name) for row_id, name in names.items()}
+    found = set()
+    for first, second in combinations(sorted(names), 2):
+        if dedup.normalize(names[first]) == dedup.normalize(names[second]):
+            continue
+        if dedup.jaccard(grams[first], grams[second]) >= threshold:
+            found.add((first, second))
+    return found
+
+
+def test_normalize_and_ngrams():
+    assert dedup.normalize("  Клей-ПВА.  Ёлка ") == "клей пва елка"
+    assert dedup.ngrams("ab") == {" ab", "ab "}
+    assert dedup.ngrams("") == {"  "}
+    assert dedup.jaccard({1, 2}, {2, 3}) == pytest.approx(1 / 3)
+    assert dedup.jaccard(set(), {1}) == 0.0
+
+
+@pytest.mark.parametrize("threshold", [0.5, 0.75, 0.9])
+def test_similar_matches_brute_force(threshold):
+    names = corpus(300, seed=1)
+    index = SimilarityIndex(threshold)
+    index.rebuild(names.items())
+    for probe in ["клей пва белая", "ОБОИ флизелин", "лак глянец ролик", "синий"]:
+        probe_grams = dedup.ngrams(probe)
+        expected = {row_id for row_id, name in names.items()
+                    if dedup.jaccard(probe_grams, dedup.ngrams(name)) >= threshold}
+        found = index.similar(probe)
+        assert {row_id for row_id, _ in found} == expected
+        assert [similarity for _, similarity in found] == sorted((s for _, s in found), reverse=True)
+
+
+@pytest.mark.parametrize("threshold", [0.5, 0.75, 0.9])
+def test_pairs_match_brute_force(threshold):
+    names = corpus(400, seed=threshold)
+    index = SimilarityIndex(threshold)
+    index.rebuild(names.items())
+    groups = index.groups()
+    # Сравниваются только первые строки групп одинаковых наименований
+    representatives = {group[0] for group in groups}
+    expected = {pair for pair in brute_force_pairs(names, threshold)
+                if pair[0] in representatives and pair[1] in representatives}
+    found = {(first, second) for first, second, _ in index.pairs(groups)}
+    assert found == expected
+
+
+def test_update_and_remove():
+    index = SimilarityIndex(0.75)
+    index.rebuild([(1, "Клей ПВА строительный"), (2, "Краска белая")])
+    assert index.similar("клей пва строительный", exclude=1) == []
+    index.update(3, "Клей-ПВА строительный")
+    assert [row_id for row_id, _ in index.similar("клей пва строительный", exclude=1)] == [3]
+    index.update(3, "Лак глянцевый")
+    index.remove(2)
+    index.remove(99)
+    assert index.similar("Краска белая") == [] and len(index) == 2
+
+
+def test_detector_check():
+    detector = DuplicateDetector()
+    assert detector.stale
+    detector.rebuild([
+        (1, "8758385 — Обои Лес", "Обои Лес", "8758385"),
+        (2, "7750282 — Стеклообои Рогожка", "Стеклообои Рогожка", "7750282"),
+    ])
+    assert not detector.stale
+    assert detector.check("Новые обои", " 7750282 ") == [(2, "7750282 — Стеклообои Рогожка", "тот же артикул")]
+    assert detector.check("обои лес", "1") == [(1, "8758385 — Обои Лес", "похожее наименование (100%)")]
+    # Сама сохраняемая строка дублем не считается
+    assert detector.check("Обои Лес", "8758385", exclude=1) == []
+    detector.update(3, "3 — Обои", "Обои", "8758385")
+    assert [row_id for row_id, _, _ in detector.check("", "8758385")] == [1, 3]
+    detector.remove(1)
+    assert [row_id for row_id, _, _ in detector.check("", "8758385")] == [3]
+
+
+def test_clusters_join_keys_and_similar_names():
+    detector = DuplicateDetector()
+    detector.rebuild([
+        (1, "", "Клей ПВА строительный", None),
+        (2, "", "клей-пва строительный", None),
+        (3, "", "Клей ПВА строительный.", None),
+        (4, "", "Краска белая", "K-1"),
+        (5, "", "Эмаль", "k-1"),
+        (6, "", "Лак", None),
+    ])
+    assert detector.clusters() == [[1, 2, 3], [4, 5]]
+
+
+def test_resolve_merges():
+    assert dedup.resolve_merges({3: 2, 2: 1, 5: 1}) == {3: 1, 2: 1, 5: 1}
+    with pytest.raises(ValueError):
+        dedup.resolve_merges({1: 2, 2: 1})
@@ -0,0 +1,40 @@
+"""Оценка запасов: стоимость, упаковки и количества в базовых единицах по типам"""
+from decimal import Decimal
+
+import inventory
+from units import FACTOR_DIGITS
+
+ONE = 10 ** FACTOR_DIGITS
+
+ROWS = [
+    # id, тип, единица, цена в копейках, остаток, в упаковке
+    (1, "Клей", "кг", 15000, 30, 10),
+    (2, "Клей", "г", 20, 2500, 500),
+    (3, "Клей", "упак", 99900, 4, 0),
+    (4, "Краска", "л", 30000, 7, 3),
+    (5, "Краска", "бобина", 100, 2, 0),
+]
+
+
+def test_valuation_totals():
+    valuation = inventory.Valuation(ROWS)
+    assert len(valuation) == 5
+    assert list(valuation.values) == [450000, 50000, 399600, 210000, 200]
+    assert valuation.total_value == 1109800
+    # Неполная упаковка считается целой, «упак» уже в упаковках
+    assert list(valuation.packages) == [3, 5, 4, 3, 0]
+    assert valuation.total_packages == 15
+    assert valuation.unknown_units == ["бобина"]
+
+
+def test_valuation_by_type():
+    clay, paint = inventory.Valuation(ROWS).types
+    assert (clay.type_name, clay.materials, clay.value, clay.packages) == ("Клей", 3, 899600, 12)
+    assert clay.quantities == {"кг": Decimal("32.5").scaleb(FACTOR_DIGITS), "упак": 4 * ONE}
+    assert (paint.type_name, paint.materials, paint.value) == ("Краска", 2, 210200)
+    assert inventory.format_quantities(paint.quantities) == "2 бобина, 7 л"
+
+
+def test_empty_valuation():
+    valuation = inventory.Valuation([])
+    assert (len(valuation), valuation.total_value, valuation.types, valuation.quantities) == (0, 0, [], {})
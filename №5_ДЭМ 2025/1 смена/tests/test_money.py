@@ -0,0 +1,57 @@
+"""Суммы в целых копейках и величины с фиксированной точкой"""
+from array import array
+from decimal import Decimal
+from fractions import Fraction
+
+import pytest
+
+import money
+
+
+@pytest.mark.parametrize("value, digits, expected", [
+    (3, 2, 300),
+    (Decimal("1.005"), 2, 101),
+    (Decimal("-1.005"), 2, -101),
+    ("12.345678", 4, 123457),
+    (0.1 + 0.2, 2, 30),
+    (1.06, 4, 10600),
+    (Fraction(1, 3), 2, 33),
+    (Fraction(-2, 3), 2, -67),
+    (None, 2, None),
+])
+def test_scaled(value, digits, expected):
+    assert money.scaled(value, digits) == expected
+
+
+def test_kopecks_round_trip():
+    assert money.to_kopecks("1499.99") == 149999
+    assert money.to_decimal(149999) == Decimal("1499.99")
+    assert money.kopecks_array([1, "2.5", Decimal("0.01")]) == array("q", [100, 250, 1])
+
+
+@pytest.mark.parametrize("kopecks, text", [(0, "0.00"), (5, "0.05"), (123456, "1234.56"), (-5, "-0.05")])
+def test_format_rub(kopecks, text):
+    assert money.format_rub(kopecks) == text
+
+
+@pytest.mark.parametrize("numerator, denominator, expected", [
+    (5, 2, 3),
+    (-5, 2, -3),
+    (5, -2, -3),
+    (7, 3, 2),
+    (-7, 3, -2),
+    (0, 7, 0),
+])
+def test_div_round_half_away_from_zero(numerator, denominator, expected):
+    assert money.div_round(numerator, denominator) == expected
+
+
+def test_round_to_step():
+    assert money.round_to_step(12345, 50) == 12350
+    assert money.round_to_step(12324, 50) == 12300
+
+
+def test_amounts_round_once():
+    # 0.333 * 0.01 ₽ = 0.00333 ₽ -> 0 коп.; сумма трех — 0.999 коп. -> 1 коп.
+    assert money.amount(333, 3, 1) == 0
+    assert money.total_amount(array("q", [333, 333, 333]), 3, array("q", [1, 1, 1])) == 1
@@ -0,0 +1,44 @@
+"""Моделирование цен: сценарий считает цены так же, как обычный пересчет"""
+from decimal import Decimal
+
+from price_simulation import Catalogue
+from pricing import PricingEngine, PricingRule
+
+TYPES = [(1, "Обои", 1.0), (2, "Клей", 1.5)]
+PRODUCTS = [(1, 1, 10000, 13000), (2, 1, 5000, 7000), (3, 2, 10000, 15000)]
+MATERIALS = [
+    (1, "Флизелин", Decimal("10.00"), True),
+    (2, "Бумага", Decimal("20.00"), False),  # в архиве
+]
+COMPOSITION = [(1, 1, 10000), (1, 2, 10000), (2, 1, 20000)]
+
+
+def build():
+    engine = PricingEngine([PricingRule(type_id=1, formula="width * base_cost * coefficient + material_cost")])
+    return Catalogue(engine, TYPES, PRODUCTS, MATERIALS, COMPOSITION)
+
+
+def test_coefficient_reprices_whole_type():
+    result = build().simulate(coefficients={1: 2})
+    # 1 * 100 * 2 + 10 + 20 (архивный материал тоже входит в стоимость состава)
+    assert list(result.product_ids) == [1, 2]
+    assert list(result.new_costs) == [23000, 12000]
+    assert result.total_delta == 23000 + 12000 - 13000 - 7000
+
+
+def test_material_price_reprices_only_its_products():
+    result = build().simulate(material_prices={1: "15"})
+    assert list(result.product_ids) == [1, 2]
+    assert list(result.new_costs) == [13500, 8000]
+    assert [summary.type_id for summary in result.summary] == [1]
+
+
+def test_archived_material_is_not_editable():
+    catalogue = build()
+    assert catalogue.material_names == {1: "Флизелин"}
+    assert catalogue.simulate(material_prices={2: "99"}).changed == 0
+
+
+def test_unchanged_values_are_ignored():
+    result = build().simulate(coefficients={1: "1.0", 3: 5}, material_prices={1: "10"})
+    assert result.changed == 0 and result.summary == []
@@ -0,0 +1,123 @@
+"""Правила ценообразования: расчет в Python и совпадение с SQL-выражением правила"""
+from decimal import Decimal
+
+import pytest
+
+from pricing import PricingEngine, PricingRule
+
+
+def test_default_formula():
+    rule = PricingRule()
+    assert rule.price(Decimal("2.5"), Decimal("1.2")) == Decimal("300.00")
+
+
+def test_markup_rounding_step_and_min_price():
+    rule = PricingRule(markup_percent=10, min_price=50, rounding_step=Decimal("0.50"))
+    # 1.23 * 100 * 1.1 = 135.3; с наценкой 148.83; до шага 0.50 — 149.00
+    assert rule.price(Decimal("1.23"), Decimal("1.1")) == Decimal("149.00")
+    # 0.1 * 100 * 1.1 * 1.1 = 12.10 меньше минимальной цены
+    assert rule.price(Decimal("0.1"), Decimal("1.1")) == Decimal("50.00")
+
+
+def test_division_is_exact_and_rounded_once():
+    rule = PricingRule(formula="width * base_cost / 3 + width * base_cost / 3 + width * base_cost / 3")
+    assert rule.price(1, 1) == Decimal("100.00")
+
+
+def test_half_rounds_away_from_zero():
+    rule = PricingRule(formula="material_cost / 2", min_price=-1)
+    assert rule.price(1, 1, Decimal("0.01")) == Decimal("0.01")
+    rule = PricingRule(formula="-material_cost / 2", min_price=-1)
+    assert rule.price(1, 1, Decimal("0.01")) == Decimal("-0.01")
+
+
+def test_min_and_max():
+    rule = PricingRule(formula="max(width * base_cost, 50) + min(material_cost, 10)")
+    assert rule.price(Decimal("0.1"), 1, Decimal("25")) == Decimal("60.00")
+
+
+def test_null_width_gives_no_price():
+    rule = PricingRule(min_price=15)
+    assert rule.price(None, Decimal("1.2")) is None
+    assert rule.price(Decimal("1.5"), None) is None
+    assert rule.price_kopecks(None, 12000) is None
+
+
+def test_null_is_skipped_by_min_and_max():
+    rule = PricingRule(formula="max(width * base_cost, material_cost)")
+    assert rule.price(None, 1, Decimal("7")) == Decimal("7.00")
+    rule = PricingRule(formula="min(width, coefficient) * base_cost")
+    assert rule.price(None, Decimal("0.5"), 0) == Decimal("50.00")
+
+
+def test_null_material_cost_is_zero():
+    rule = PricingRule(formula="width * base_cost + material_cost")
+    assert rule.price(1, 1, None) == Decimal("100.00")
+
+
+@pytest.mark.parametrize("formula", [
+    "width * base_cost * coefficient",
+    "width * base_cost / coefficient + material_cost",
+])
+def test_column_prices_match_single_prices(formula):
+    rule = PricingRule(formula=formula, markup_percent=Decimal("12.5"), rounding_step=Decimal("0.10"))
+    widths = [10000, 12345, 5, 99999, 0]
+    costs = [0, 1234567, 999, 5000000, 1]
+    coefficient = 13500
+    assert rule.prices_kopecks(widths, coefficient, costs) == [
+        rule.price_kopecks(width, coefficient, cost) for width, cost in zip(widths, costs)]
+
+
+@pytest.mark.parametrize("formula", [
+    "__import__('os').getcwd()",
+    "width ** 2",
+    "width * price",
+    "width.real",
+    "width *",
+])
+def test_invalid_formula(formula):
+    with pytest.raises(ValueError):
+        PricingRule(formula=formula)
+
+
+def test_rounding_step_must_be_whole_kopecks():
+    with pytest.raises(ValueError):
+        PricingRule(rounding_step=Decimal("0.005"))
+
+
+def test_engine_price_sql():
+    engine = PricingEngine([PricingRule(type_id=2, markup_percent=5)])
+    assert engine.rule_for(2).markup_percent == 5
+    assert engine.rule_for(3) is engine.default_rule
+    sql = engine.price_sql()
+    assert sql.startswith("CASE p.id_type_product") and "WHEN 2 THEN" in sql
+    assert PricingEngine().price_sql() == PricingEngine().default_rule.sql
+
+
+_PARITY_RULES = [
+    PricingRule(),
+    PricingRule(markup_percent=Decimal("17.5"), min_price=120, rounding_step=Decimal("0.50")),
+    PricingRule(formula="width * base_cost / 3 * coefficient + material_cost", base_cost=Decimal("99.99")),
+    PricingRule(formula="max(width * base_cost, material_cost) - min(coefficient, 1)", min_price=-100),
+]
+
+_PARITY_VALUES = [
+    (2.5, 1.2, Decimal("0")),
+    (0.3333, 1.15, Decimal("12.345678")),
+    (1.005, 0.7, Decimal("250.5")),
+    (None, 1.2, Decimal("40")),
+    (1.75, None, Decimal("0")),
+    (None, None, Decimal("3.5")),
+]
+
+
+@pytest.mark.parametrize("rule", _PARITY_RULES)
+def test_python_matches_sql(db_cursor, rule):
+    # Те же таблицы p, tp и mc, что и в запросе пересчета (pricing.PricingEngine.reprice_query)
+    query = (f"SELECT {rule.sql} FROM (SELECT %s::double precision AS width) p, "
+             f"(SELECT %s::double precision AS coefficient_type_product) tp, "
+             f"(SELECT %s::numeric AS material_cost) mc")
+    for width, coefficient, material_cost in _PARITY_VALUES:
+        db_cursor.execute(query, (width, coefficient, material_cost))
+        expected = db_cursor.fetchone()[0]
+        assert rule.price(width, coefficient, material_cost) == expected, (width, coefficient, material_cost)
@@ -0,0 +1,91 @@
+"""Кэш запросов: попадания, инвалидация по таблицам и вытеснение LRU"""
+import statements
+from query_cache import QueryCache, normalize_sql, tables_of
+
+
+class FakeCursor:
+    """Курсор, возвращающий заданные строки и считающий выполненные запросы"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.executed = []
+
+    def execute(self, query, params=None):
+        self.executed.append((query, params))
+
+    def fetchall(self):
+        return list(self.rows)
+
+
+PRODUCTS_QUERY = """
+    SELECT p.id_product, tp.type_product
+    FROM products p
+    JOIN type_product tp ON tp.id_type_product = p.id_type_product"""
+
+
+def test_normalize_and_tables():
+    assert normalize_sql(PRODUCTS_QUERY).startswith("SELECT p.id_product, tp.type_product FROM products p")
+    assert tables_of(PRODUCTS_QUERY) == {"products", "type_product"}
+
+
+def test_repeated_query_is_served_from_cache():
+    cache = QueryCache()
+    cursor = FakeCursor([(1, "a"), (2, "b")])
+    first = cache.fetchall(cursor, PRODUCTS_QUERY)
+    # Тот же запрос с другими пробелами — тот же ключ
+    second = cache.fetchall(cursor, " ".join(PRODUCTS_QUERY.split()))
+    assert first is second
+    assert len(cursor.executed) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_params_and_build_are_part_of_key():
+    cache = QueryCache()
+    cursor = FakeCursor([(1,)])
+    query = "SELECT id_product FROM products WHERE id_product = %s"
+    cache.fetchall(cursor, query, (1,))
+    cache.fetchall(cursor, query, (2,))
+    cache.fetchall(cursor, query, (1,), build=list)
+    assert len(cursor.executed) == 3
+
+
+def test_invalidate_drops_only_dependent_results():
+    cache = QueryCache()
+    cursor = FakeCursor([(1,)])
+    cache.fetchall(cursor, PRODUCTS_QUERY)
+    cache.fetchall(cursor, "SELECT id_material FROM materials")
+    cache.invalidate("type_product")
+    assert cache.cached(PRODUCTS_QUERY) is None
+    assert cache.cached("SELECT id_material FROM materials") == ((1,),)
+    assert cache.cached_rows == 1
+
+
+def test_least_recently_used_is_evicted():
+    cache = QueryCache(max_rows=4)
+    cursor = FakeCursor([(1,), (2,)])
+    cache.fetchall(cursor, "SELECT 1 FROM products")
+    cache.fetchall(cursor, "SELECT 2 FROM products")
+    cache.fetchall(cursor, "SELECT 1 FROM products")  # теперь самый свежий
+    cache.fetchall(cursor, "SELECT 3 FROM products")
+    assert cache.cached("SELECT 2 FROM products") is None
+    assert cache.cached("SELECT 1 FROM products") is not None
+    assert cache.cached_rows == 4
+
+
+def test_result_larger_than_cache_is_not_stored():
+    cache = QueryCache(max_rows=1)
+    cursor = FakeCursor([(1,), (2,)])
+    cache.fetchall(cursor, "SELECT 1 FROM products")
+    cache.fetchall(cursor, "SELECT 1 FROM products")
+    assert len(cursor.executed) == 2
+    assert cache.cached_rows == 0
+
+
+def test_put_statement_result_and_invalidate():
+    cache = QueryCache()
+    rows = cache.put(statements.PRODUCT_ROW, (5,), [("A-1", 1, "name", 10.0, 1.0, "1")])
+    assert cache.cached(statements.PRODUCT_ROW, (5,)) is rows
+    assert cache.cached(statements.PRODUCT_ROW, (6,)) is None
+    cache.invalidate("products")
+    assert cache.cached(statements.PRODUCT_ROW, (5,)) is None
+    assert cache.cached_rows == 0
@@ -0,0 +1,70 @@
+"""Быстрый переход: поиск по префиксу, порядок совпадений и обновление индекса"""
+from quick_open import PrefixIndex, QuickOpenIndex, normalize
+
+PRODUCTS = [
+    (1, "8758385 — Обои флизелиновые Лес", ("8758385", "Обои флизелиновые Лес")),
+    (2, "7750282 — Стеклообои Рогожка", ("7750282", "Стеклообои  Рогожка")),
+    (3, "8858958 — Обои бумажные Полосы", ("8858958", "Обои бумажные Полосы")),
+    (4, "ОБ-12 — Флизелин основа", ("ОБ-12", "Флизелин основа")),
+]
+
+
+def build():
+    index = QuickOpenIndex(("articul", "name"))
+    index.rebuild(PRODUCTS)
+    return index
+
+
+def ids(found):
+    return [row_id for row_id, _ in found]
+
+
+def test_normalize():
+    assert normalize("  Обои   ФЛИЗЕЛИН ") == "обои флизелин"
+    assert normalize(None) == ""
+
+
+def test_prefix_index():
+    index = PrefixIndex([("б", 2), ("аб", 1), ("ав", 3)])
+    assert list(index.prefixed("а")) == [1, 3]
+    index.add("аа", 4)
+    index.remove("ав", 3)
+    index.remove("нет", 9)
+    assert list(index.prefixed("а")) == [4, 1]
+
+
+def test_fields_in_order_of_importance():
+    index = build()
+    assert not index.stale and len(index) == 4
+    # Артикул, затем начало наименования, затем начало слова наименования;
+    # внутри поля — по алфавиту ключей
+    assert ids(index.search("8")) == [1, 3]
+    assert ids(index.search("об")) == [4, 3, 1]
+    assert ids(index.search("флиз")) == [4, 1]
+
+
+def test_search_ignores_case_and_spaces():
+    index = build()
+    assert index.search("  СТЕКЛООБОИ  рог") == [(2, "7750282 — Стеклообои Рогожка")]
+    assert index.search("   ") == []
+
+
+def test_limit():
+    assert len(build().search("о", limit=2)) == 2
+
+
+def test_update_replaces_keys():
+    index = build()
+    index.update(2, "7750282 — Стеклохолст", ("7750282", "Стеклохолст"))
+    assert index.search("рогож") == []
+    assert index.search("стеклох") == [(2, "7750282 — Стеклохолст")]
+    index.update(5, "5 — Новые обои", ("5", "Новые обои"))
+    assert ids(index.search("обои")) == [3, 1, 5]
+
+
+def test_remove():
+    index = build()
+    index.remove(1)
+    index.remove(99)
+    assert ids(index.search("обои")) == [3]
+    assert 1 not in index.labels
@@ -0,0 +1,116 @@
+"""Хранилища загруженных списков: столбцы, представления строк, пустые значения и сортировка"""
+from decimal import Decimal
+
+import pytest
+
+from row_store import MaterialStore, ProductStore, StringColumn
+
+PRODUCTS = [
+    (1, "Фотообои", "Обои Лес", Decimal("1200.50"), "8758385", Decimal("0.91")),
+    (2, "Стеклообои", "Стеклообои Рогожка", Decimal("2500.00"), "7750282", Decimal("1.06")),
+    (3, "Фотообои", "Обои Море", Decimal("990"), "8858958", Decimal("0.53")),
+]
+
+
+def test_string_column_stores_each_value_once():
+    column = StringColumn()
+    for value in ("кг", "л", "кг", "кг"):
+        column.append(value)
+    assert column.values == ["кг", "л"]
+    assert list(column.codes) == [0, 1, 0, 0]
+    column[1] = "кг"
+    assert [column[position] for position in range(4)] == ["кг"] * 4
+
+
+def test_rows_read_back_from_columns():
+    store = ProductStore(PRODUCTS)
+    assert len(store) == 3
+    row = store.get(2)
+    assert (row.id, row.type_name, row.name, row.articul) == (2, "Стеклообои", "Стеклообои Рогожка", "7750282")
+    assert row.min_cost == 2500.0 and row.width == 1.06
+    assert [row.id for row in store] == [1, 2, 3]
+    assert store.get(99) is None
+
+
+def test_update_replaces_or_appends():
+    store = MaterialStore([(7, "Краска", "Белила", Decimal("10.5"), 100, "кг", 0)])
+    store.update((7, "Краска", "Белила", Decimal("11"), 5, "л", 1))
+    row = store.get(7)
+    assert (row.unit_price, row.stock_quantity, row.unit, row.low_stock) == (11.0, 5, "л", 1)
+    store.update((8, "Клей", "Клей КМЦ", Decimal("3"), 1, "кг", 0))
+    assert len(store) == 2 and store.get(8).name == "Клей КМЦ"
+
+
+def test_search_ignores_case():
+    store = ProductStore(PRODUCTS)
+    assert [row.id for row in store.search("ОБОИ")] == [1, 2, 3]
+    assert [row.id for row in store.search("775", ("articul",))] == [2]
+
+
+def test_null_numbers_stay_none():
+    store = ProductStore(PRODUCTS + [(4, "Фотообои", "Обои Море", None, "8858958", None)])
+    row = store.get(4)
+    assert row.min_cost is None and row.width is None
+    assert tuple(row) == (4, "Фотообои", "Обои Море", None, "8858958", None)
+    # Пустое значение хранится нулем, но отличается от настоящего нуля
+    store.append((5, "Фотообои", "Обои Поле", 0, "1", 0))
+    assert store.get(5).min_cost == 0.0
+    store.update((4, "Фотообои", "Обои Море", 100, "8858958", None))
+    assert store.get(4).min_cost == 100.0 and store.get(4).width is None
+
+
+def test_search_skips_empty_values():
+    store = ProductStore(PRODUCTS + [(4, "Фотообои", "Обои", 1, None, 1)])
+    assert store.search("none", ("name", "articul")) == []
+
+
+SORTED = [
+    (1, "Фотообои", "обои Б", Decimal("300"), "3", Decimal("1.06")),
+    (2, "Стеклообои", "Обои А", Decimal("100"), "1", None),
+    (3, "фотообои", "обои а", None, "2", Decimal("0.53")),
+    (4, None, None, Decimal("100"), None, Decimal("1.06")),
+]
+
+
+def ids(store, positions):
+    return [store[position].id for position in positions]
+
+
+@pytest.mark.parametrize("name, expected", [
+    # Без учета регистра; пустые значения — после остальных
+    ("name", [2, 3, 1, 4]),
+    ("type_name", [2, 1, 3, 4]),
+    ("min_cost", [2, 4, 1, 3]),
+    ("width", [3, 1, 4, 2]),
+    ("articul", [2, 3, 1, 4]),
+])
+def test_sort_by_one_column(name, expected):
+    store = ProductStore(SORTED)
+    assert ids(store, store.permutation([(name, False)])) == expected
+
+
+def test_equal_values_share_rank():
+    store = ProductStore(SORTED)
+    ranks, count = store.sort_ranks("name")
+    assert ranks[1] == ranks[2] and count == 3
+
+
+def test_sort_by_several_keys_is_stable():
+    store = ProductStore(SORTED)
+    # Цена по убыванию (пустая — первой), при равенстве — наименование
+    assert ids(store, store.permutation([("min_cost", True), ("name", False)])) == [3, 1, 2, 4]
+    # Равные ключи сохраняют исходный порядок
+    assert ids(store, store.permutation([("width", False), ("min_cost", False)])) == [3, 4, 1, 2]
+
+
+def test_group_by_goes_first():
+    store = ProductStore(SORTED)
+    assert ids(store, store.permutation([("min_cost", False)], group_by="type_name")) == [2, 1, 3, 4]
+
+
+def test_sort_cache_is_reset_by_changes():
+    store = ProductStore(SORTED)
+    first = store.permutation([("min_cost", False)])
+    assert store.permutation([("min_cost", False)]) is first
+    store.update((3, "фотообои", "обои а", Decimal("1"), "2", Decimal("0.53")))
+    assert ids(store, store.permutation([("min_cost", False)])) == [3, 2, 4, 1]
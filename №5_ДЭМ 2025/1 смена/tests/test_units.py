@@ -0,0 +1,56 @@
+"""Реестр единиц измерения: написания, величины и перевод количеств"""
+from decimal import Decimal
+
+import pytest
+
+import units
+from units import FACTOR_DIGITS, REGISTRY, UnitRegistry
+
+ONE = 10 ** FACTOR_DIGITS
+
+
+@pytest.mark.parametrize("text, name", [
+    ("кг", "кг"),
+    ("Кг.", "кг"),
+    (" килограмм ", "кг"),
+    ("гр.", "г"),
+    ("Рулон", "рул"),
+    ("пог. м", "м"),
+    ("пог.м", "м"),
+    ("м³", "м3"),
+])
+def test_aliases(text, name):
+    assert REGISTRY.lookup(text).name == name
+
+
+def test_base_units_and_factors():
+    gram = REGISTRY.lookup("г")
+    assert (gram.dimension, gram.base, gram.factor) == ("масса", "кг", ONE // 1000)
+    assert gram.to_base(2500) == 2500 * ONE // 1000
+    assert REGISTRY.bases["объем"] == "л"
+    assert REGISTRY.names()[:4] == ["шт", "м", "кг", "л"]
+
+
+def test_convert():
+    assert REGISTRY.convert(Decimal("1.5"), "т", "кг") == Decimal("1500")
+    assert REGISTRY.convert(250, "мл", "л") == Decimal("0.25")
+    assert REGISTRY.convert(3, "см", "мм") == Decimal("30")
+    assert REGISTRY.factor("кг", "Кг.") == 1
+    with pytest.raises(ValueError):
+        REGISTRY.factor("кг", "л")
+
+
+def test_unknown_unit_is_its_own_dimension():
+    registry = UnitRegistry()
+    unit = registry.lookup("  бобина ")
+    assert (unit.name, unit.dimension, unit.known, unit.factor) == ("бобина", "бобина", False, ONE)
+    assert registry.lookup("Бобина") is unit
+    assert registry.lookup(None).name == "?"
+    with pytest.raises(ValueError):
+        registry.factor("бобина", "шт")
+
+
+def test_format_quantity():
+    assert units.format_quantity(2500000, "кг") == "2.5 кг"
+    assert units.format_quantity(3 * ONE, "л") == "3 л"
+    assert units.format_quantity(0, "м") == "0 м"
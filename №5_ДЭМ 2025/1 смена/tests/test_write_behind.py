@@ -0,0 +1,84 @@
+"""Журнал пакетного сохранения материалов: запись, подтверждение и повтор после сбоя"""
+import json
+from decimal import Decimal
+
+from write_behind import MaterialJournal
+
+VALUES = ["Белила", 1, 10.5, 100, 20, 10, "кг"]
+
+
+def lines(path):
+    with open(path, encoding="utf-8") as file:
+        return [json.loads(line) for line in file]
+
+
+def test_put_is_written_before_returning(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = MaterialJournal(str(path))
+    record = journal.put(3, "812", VALUES, "Краска", before=["Белила", 1, Decimal("9.5"), 90, 20, 10, "кг"])
+    assert journal.pending == {3: record}
+    assert lines(path) == [record]
+    assert record["before"][2] == 9.5
+
+
+def test_pending_changes_are_replayed(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = MaterialJournal(path)
+    first = journal.put(1, "10", VALUES, "Краска")
+    journal.put(2, "20", VALUES, "Краска")
+    journal.ack([first])
+
+    # Новый запуск после аварийного завершения: остается только неподтвержденное
+    replayed = MaterialJournal(path)
+    assert list(replayed.pending) == [2]
+    assert replayed.pending[2]["version"] == "20"
+    assert replayed.next_seq == 3
+    # Журнал переписан без подтвержденных записей
+    assert [record["material_id"] for record in lines(path)] == [2]
+
+
+def test_torn_last_line_is_ignored(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = MaterialJournal(str(path))
+    journal.put(1, "10", VALUES, "Краска")
+    with open(path, "a", encoding="utf-8") as file:
+        file.write('{"op": "put", "seq": 2, "materi')
+    assert list(MaterialJournal(str(path)).pending) == [1]
+
+
+def test_repeated_edit_keeps_original_version(tmp_path):
+    journal = MaterialJournal(str(tmp_path / "journal.jsonl"))
+    journal.put(1, "10", VALUES, "Краска", before=VALUES)
+    changed = VALUES[:3] + [150] + VALUES[4:]
+    record = journal.put(1, "11", changed, "Краска", before=changed)
+    assert record["version"] == "10"
+    assert record["before"] == VALUES
+    assert journal.pending[1]["values"] == changed
+
+
+def test_ack_of_replaced_record_keeps_newer_edit(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = MaterialJournal(path)
+    sent = journal.put(1, "10", VALUES, "Краска")
+    newer = journal.put(1, "10", VALUES[:3] + [150] + VALUES[4:], "Краска")
+    journal.ack([sent])
+    assert journal.pending == {1: newer}
+    assert MaterialJournal(path).pending[1]["values"][3] == 150
+
+
+def test_rebase_moves_edit_to_new_version(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = MaterialJournal(path)
+    record = journal.put(1, "10", VALUES, "Краска")
+    theirs = VALUES[:4] + [30] + VALUES[5:]
+    rebased = journal.rebase(record, "15", theirs)
+    assert (rebased["version"], rebased["before"], rebased["values"]) == ("15", theirs, VALUES)
+    assert MaterialJournal(path).pending[1]["version"] == "15"
+
+
+def test_last_ack_empties_journal(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = MaterialJournal(str(path))
+    journal.ack([journal.put(1, "10", VALUES, "Краска")])
+    assert journal.pending == {}
+    assert path.read_text(encoding="utf-8") == ""
@@ -0,0 +1,268 @@
+"""Монитор отзывчивости интерфейса.
+
+- задержка цикла событий: таймер с коротким интервалом измеряет, насколько
+  позже ожидаемого он срабатывает (гистограмма lag);
+- длительность операций: построение страниц, открытие диалогов и запросы
+  к базе (гистограмма на каждую операцию);
+- зависания: сторожевой поток замечает, что цикл событий не отвечает дольше
+  порога, и сохраняет стек главного потока и текущую операцию.
+
+Включается переменной окружения UI_MONITOR_FILE (путь к JSON-отчету), отчет
+пишется при закрытии окна. Для проверок без экрана:
+
+    python ui_monitor.py --rounds 5 --output ui_report.json --max-stall-ms 500
+"""
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from functools import wraps
+
+# Границы корзин гистограммы, мс
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+class Histogram:
+    """Гистограмма длительностей в миллисекундах"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, value_ms):
+        index = 0
+        while index < len(BUCKETS_MS) and value_ms > BUCKETS_MS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total_ms += value_ms
+        self.max_ms = max(self.max_ms, value_ms)
+
+    def percentile(self, fraction):
+        """Верхняя граница корзины, в которую попадает указанная доля значений"""
+        if not self.count:
+            return 0.0
+        threshold = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= threshold:
+                return BUCKETS_MS[index] if index < len(BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def to_dict(self):
+        labels = [f"<={bound}" for bound in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}"]
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": round(self.max_ms, 3),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class UiMonitor:
+    """Сбор задержек цикла событий, длительностей операций и зависаний"""
+
+    def __init__(self):
+        self.enabled = False
+        self.output_path = None
+        self.lag = Histogram()
+        self.operations = {}
+        self.stalls = []
+        self.current_operation = None
+        self.probe_interval_ms = 50
+        self.stall_threshold_ms = 200
+        self._timer = None
+        self._heartbeat = time.perf_counter()
+        self._watchdog = None
+        self._stop_event = threading.Event()
+        self._main_thread_id = threading.main_thread().ident
+
+    def start(self, output_path=None, probe_interval_ms=50, stall_threshold_ms=200):
+        """Запускает замеры; вызывается после создания QApplication"""
+        from PySide6.QtCore import QTimer
+        import statements
+
+        self.enabled = True
+        self.output_path = output_path
+        self.probe_interval_ms = probe_interval_ms
+        self.stall_threshold_ms = stall_threshold_ms
+        statements.Statement.observer = self.record_query
+
+        self._heartbeat = time.perf_counter()
+        self._timer = QTimer()
+        self._timer.setInterval(probe_interval_ms)
+        self._timer.timeout.connect(self._tick)
+        self._timer.start()
+
+        self._stop_event.clear()
+        self._watchdog = threading.Thread(target=self._watch, daemon=True)
+        self._watchdog.start()
+
+    def stop(self):
+        """Останавливает замеры и записывает отчет, если задан файл"""
+        if not self.enabled:
+            return
+        import statements
+
+        self.enabled = False
+        statements.Statement.observer = None
+        if self._timer is not None:
+            self._timer.stop()
+        self._stop_event.set()
+        if self.output_path:
+            self.write(self.output_path)
+
+    def _tick(self):
+        now = time.perf_counter()
+        self.lag.add(max(0.0, (now - self._heartbeat) * 1000 - self.probe_interval_ms))
+        self._heartbeat = now
+
+    def _watch(self):
+        sampled_heartbeat = None
+        while not self._stop_event.wait(self.stall_threshold_ms / 4000):
+            heartbeat = self._heartbeat
+            blocked_ms = (time.perf_counter() - heartbeat) * 1000
+            if blocked_ms < self.stall_threshold_ms or heartbeat == sampled_heartbeat:
+                continue
+            # Один снимок стека на каждое зависание
+            sampled_heartbeat = heartbeat
+            frame = sys._current_frames().get(self._main_thread_id)
+            self.stalls.append({
+                "at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "operation": self.current_operation,
+                "blocked_ms_at_sample": round(blocked_ms, 1),
+                "stack": traceback.format_stack(frame) if frame is not None else [],
+            })
+
+    def record(self, name, duration_ms):
+        self.operations.setdefault(name, Histogram()).add(duration_ms)
+
+    def record_query(self, statement_name, duration_ms):
+        self.record(f"query.{statement_name}", duration_ms)
+
+    @contextmanager
+    def operation(self, name):
+        """Замеряет длительность блока и помечает его как текущую операцию"""
+        if not self.enabled:
+            yield
+            return
+        previous = self.current_operation
+        self.current_operation = name
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - started) * 1000)
+            self.current_operation = previous
+
+    def report(self):
+        return {
+            "probe_interval_ms": self.probe_interval_ms,
+            "stall_threshold_ms": self.stall_threshold_ms,
+            "event_loop_lag": self.lag.to_dict(),
+            "operations": {name: histogram.to_dict()
+                           for name, histogram in sorted(self.operations.items())},
+            "stalls": self.stalls,
+        }
+
+    def write(self, path):
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.report(), file, ensure_ascii=False, indent=2)
+
+
+# Общий монитор приложения
+MONITOR = UiMonitor()
+
+
+def timed(name):
+    """Декоратор: замеряет вызов метода как операцию name"""
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with MONITOR.operation(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def run_scenario(rounds, output_path, probe_interval_ms, stall_threshold_ms):
+    """Прогоняет типовой сценарий работы без экрана и возвращает отчет"""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PySide6.QtWidgets import QApplication
+    import main
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    # Модальные сообщения в сценарии не показываются, а выводятся в консоль
+    for method in ("show_error_message", "show_warning_message", "show_info_message"):
+        setattr(main.MainWindow, method, lambda self, title, message: print(f"{title}: {message}"))
+
+    MONITOR.start(output_path, probe_interval_ms, stall_threshold_ms)
+    window = main.MainWindow()
+    window.show()
+
+    def settle():
+        deadline = time.perf_counter() + probe_interval_ms * 4 / 1000
+        while time.perf_counter() < deadline:
+            app.processEvents()
+
+    for _ in range(rounds):
+        window.show_products_page()
+        settle()
+        products = window.products_page.products
+        if products:
+            with MONITOR.operation("dialog.product.open"):
+                dialog = window.editor_dialog(main.ProductDialog, products[0].id)
+                dialog.open()
+            settle()
+            dialog.close()
+        window.show_materials_page()
+        settle()
+        materials = window.materials_page.materials
+        if materials:
+            with MONITOR.operation("dialog.material.open"):
+                dialog = window.editor_dialog(main.MaterialDialog, materials[0].id)
+                dialog.open()
+            settle()
+            dialog.close()
+        window.show_main_page()
+        settle()
+
+    window.close()
+    MONITOR.stop()
+    return MONITOR.report()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Проверка отзывчивости интерфейса без экрана")
+    parser.add_argument("--rounds", type=int, default=5, help="число проходов по страницам")
+    parser.add_argument("--output", default="ui_report.json", help="файл отчета")
+    parser.add_argument("--probe-interval-ms", type=int, default=50)
+    parser.add_argument("--stall-threshold-ms", type=int, default=200)
+    parser.add_argument("--max-stall-ms", type=float, default=None,
+                        help="завершиться с ошибкой, если задержка цикла событий больше")
+    args = parser.parse_args()
+
+    report = run_scenario(args.rounds, args.output, args.probe_interval_ms, args.stall_threshold_ms)
+    lag = report["event_loop_lag"]
+    print(f"Задержка цикла событий: p50 {lag['p50_ms']} мс, p95 {lag['p95_ms']} мс, "
+          f"макс. {lag['max_ms']} мс; зависаний: {len(report['stalls'])}")
+    if args.max_stall_ms is not None and lag["max_ms"] > args.max_stall_ms:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    # Запуск через импорт, чтобы main.py и сценарий работали с одним MONITOR
+    import ui_monitor
+    sys.exit(ui_monitor.main())
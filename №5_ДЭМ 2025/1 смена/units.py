@@ -0,0 +1,135 @@
+"""Единицы измерения материалов и перевод количеств между ними.
+
+В materials.unit хранится текст, выбранный в диалоге материала (или введенный
+раньше вручную: "кг", "Кг.", "рулон"). Реестр сводит такие написания к
+единицам, а единицы — к базовой единице своей величины (масса — кг, объем — л,
+длина — м). Коэффициенты перевода между единицами одной величины вычисляются
+один раз при создании реестра; для массовых расчетов (inventory.py) они
+хранятся целыми с FACTOR_DIGITS знаками после запятой:
+
+    unit = REGISTRY.lookup("гр.")
+    unit.to_base(2500)                       # 2500 г -> 2.5 кг: 2500000 (6 знаков)
+    REGISTRY.convert(Decimal("1.5"), "т", "кг")  # Decimal("1500")
+
+Незнакомая единица не смешивается с другими: она становится отдельной
+величиной с коэффициентом 1 (known = False).
+"""
+from decimal import Decimal
+
+import money
+
+FACTOR_DIGITS = 6
+
+# Единица, величина, коэффициент к базовой единице величины, другие написания.
+# Базовая единица величины — первая с коэффициентом 1; порядок строк — порядок
+# в списке единиц диалога материала
+_UNITS = (
+    ("шт", "штуки", "1", ("штука", "штук", "pcs")),
+    ("м", "длина", "1", ("метр", "пог. м", "п. м", "m")),
+    ("кг", "масса", "1", ("килограмм", "kg")),
+    ("л", "объем", "1", ("литр", "l")),
+    ("упак", "упаковки", "1", ("уп", "упаковка", "пачка")),
+    ("рул", "рулоны", "1", ("рулон", "рулонов")),
+    ("г", "масса", "0.001", ("гр", "грамм", "g")),
+    ("т", "масса", "1000", ("тонна", "t")),
+    ("мл", "объем", "0.001", ("ml",)),
+    ("м3", "объем", "1000", ("м³", "куб. м")),
+    ("см", "длина", "0.01", ("cm",)),
+    ("мм", "длина", "0.001", ("mm",)),
+    ("м2", "площадь", "1", ("м²", "кв. м")),
+)
+
+
+def normalize(text):
+    """Ключ написания единицы: без регистра, точек сокращения и лишних пробелов"""
+    text = str(text or "").casefold().replace("ё", "е")
+    return " ".join(text.replace(".", ". ").split()).rstrip(".")
+
+
+class Unit:
+    """Единица измерения: factor — сколько базовых единиц в одной (FACTOR_DIGITS знаков)"""
+
+    __slots__ = ("name", "dimension", "base", "factor", "known")
+
+    def __init__(self, name, dimension, base, factor, known=True):
+        self.name = name
+        self.dimension = dimension
+        self.base = base
+        self.factor = factor
+        self.known = known
+
+    def to_base(self, quantity):
+        """Целое количество в этой единице -> базовые единицы (FACTOR_DIGITS знаков)"""
+        return quantity * self.factor
+
+    def __repr__(self):
+        return f"Unit({self.name!r}, {self.dimension!r})"
+
+
+class UnitRegistry:
+    """Реестр единиц с написаниями и заранее вычисленными коэффициентами перевода"""
+
+    def __init__(self, units=_UNITS):
+        self.units = {}  # наименование -> Unit
+        self._aliases = {}  # нормализованное написание -> Unit
+        self._unknown = {}  # нормализованное написание незнакомой единицы -> Unit
+        bases = {}
+        for name, dimension, factor, aliases in units:
+            factor = Decimal(factor)
+            if factor == 1:
+                bases.setdefault(dimension, name)
+            unit = Unit(name, dimension, bases[dimension], money.scaled(factor, FACTOR_DIGITS))
+            self.units[name] = unit
+            for alias in (name,) + tuple(aliases):
+                self._aliases[normalize(alias)] = unit
+        self.bases = bases  # величина -> базовая единица
+
+        # Коэффициенты перевода для всех пар единиц одной величины
+        self._conversions = {}
+        for source in self.units.values():
+            for target in self.units.values():
+                if source.dimension == target.dimension:
+                    self._conversions[source.name, target.name] = (
+                        Decimal(source.factor) / Decimal(target.factor))
+
+    def names(self):
+        """Наименования единиц в порядке списка диалога материала"""
+        return list(self.units)
+
+    def lookup(self, text):
+        """Единица по написанию; незнакомое написание — отдельная величина"""
+        key = normalize(text)
+        unit = self._aliases.get(key)
+        if unit is None:
+            unit = self._unknown.get(key)
+            if unit is None:
+                name = " ".join(str(text or "").split()) or "?"
+                unit = Unit(name, name, name, 10 ** FACTOR_DIGITS, known=False)
+                self._unknown[key] = unit
+        return unit
+
+    def factor(self, source, target):
+        """Во сколько раз source больше target (Decimal); ValueError для разных величин"""
+        source, target = self.lookup(source), self.lookup(target)
+        if source is target:
+            return Decimal(1)
+        factor = self._conversions.get((source.name, target.name))
+        if factor is None:
+            raise ValueError(f"Нельзя перевести {source.name} ({source.dimension}) "
+                             f"в {target.name} ({target.dimension})")
+        return factor
+
+    def convert(self, quantity, source, target):
+        """Количество в единицах source -> в единицах target"""
+        return Decimal(quantity) * self.factor(source, target)
+
+
+REGISTRY = UnitRegistry()
+
+
+def format_quantity(quantity, unit_name):
+    """Количество в FACTOR_DIGITS знаках с единицей: "2.5 кг" """
+    text = f"{Decimal(quantity).scaleb(-FACTOR_DIGITS):f}"
+    if "." in text:
+        text = text.rstrip("0").rstrip(".")
+    return f"{text} {unit_name}"
@@ -0,0 +1,159 @@
+"""Отложенная запись изменений материалов (режим пакетного сохранения).
+
+Сохранение из диалога сначала записывается в локальный журнал (JSON по строке
+на запись, с fsync), затем фоновый поток записывает накопленные изменения в
+базу одной транзакцией. Журнал переживает аварийное завершение: при следующем
+запуске незаписанные изменения читаются из него и отправляются снова.
+
+Строки журнала:
+    {"op": "put", "seq": 5, "material_id": 3, "version": "812", "values": [...], "type_name": "...",
+     "before": [...]}
+    {"op": "ack", "seq": 5}
+
+values — поля в порядке параметров statements.MATERIAL_UPDATE (без id и версии),
+before — те же поля строки этой версии для журнала изменений (audit.py).
+Повторное изменение того же материала заменяет незаписанное и сохраняет его
+версию и before (см. conflicts.py): оператор правит значения, которые видит
+на экране.
+"""
+import json
+import os
+from decimal import Decimal
+
+import psycopg2
+
+import statements
+
+JOURNAL_FILE = "material_journal.jsonl"
+
+# Индексы полей в values
+STOCK_QUANTITY = 3
+MIN_QUANTITY = 4
+
+
+def _plain(value):
+    # Decimal из строки базы записывается в JSON числом
+    return float(value) if isinstance(value, Decimal) else value
+
+
+class MaterialJournal:
+    """Журнал незаписанных изменений материалов"""
+
+    def __init__(self, path=JOURNAL_FILE):
+        self.path = path
+        self.pending = {}  # id_material -> запись put
+        self.next_seq = 1
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Недописанная последняя строка после аварийного завершения
+                    continue
+                self.next_seq = max(self.next_seq, record["seq"] + 1)
+                if record["op"] == "put":
+                    self.pending[record["material_id"]] = record
+                else:
+                    self._forget(record["seq"])
+        # Журнал переписывается только с незаписанными изменениями
+        self._rewrite()
+
+    def _forget(self, seq):
+        for material_id, record in list(self.pending.items()):
+            if record["seq"] == seq:
+                del self.pending[material_id]
+
+    def _write(self, records):
+        with open(self.path, "a", encoding="utf-8") as file:
+            for record in records:
+                file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+
+    def _rewrite(self):
+        with open(self.path, "w", encoding="utf-8") as file:
+            for record in self.pending.values():
+                file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+
+    def put(self, material_id, version, values, type_name, before=None):
+        """Записывает изменение материала; возвращает запись журнала"""
+        previous = self.pending.get(material_id)
+        if previous is not None:
+            # Незаписанное изменение заменяется, версия остается исходной
+            version = previous["version"]
+            before = previous.get("before")
+        record = {
+            "op": "put",
+            "seq": self.next_seq,
+            "material_id": material_id,
+            "version": version,
+            "values": list(values),
+            "type_name": type_name,
+            "before": None if before is None else [_plain(value) for value in before],
+        }
+        self.next_seq += 1
+        self._write([record])
+        self.pending[material_id] = record
+        return record
+
+    def ack(self, records):
+        """Отмечает записи как записанные в базу (или отмененные пользователем)"""
+        acked = [record for record in records
+                 if self.pending.get(record["material_id"]) is record]
+        if not acked:
+            return
+        for record in acked:
+            del self.pending[record["material_id"]]
+        if self.pending:
+            self._write([{"op": "ack", "seq": record["seq"]} for record in acked])
+        else:
+            self._rewrite()
+
+    def rebase(self, record, version, before=None):
+        """Переносит незаписанное изменение на новую версию строки (before — ее поля)"""
+        self.pending.pop(record["material_id"], None)
+        return self.put(record["material_id"], version, record["values"], record["type_name"], before)
+
+
+def flush_batch(connection, records):
+    """Записывает изменения одной транзакцией.
+
+    Каждое изменение выполняется под точкой сохранения, поэтому ошибка одного
+    не отменяет остальные. Возвращает (записанные [(запись, новая версия)],
+    конфликты версий, ошибки [(запись, текст)]). Ошибки соединения
+    пробрасываются: вся пачка останется в журнале.
+    """
+    done, conflicted, failed = [], [], []
+    cursor = connection.cursor()
+    try:
+        for record in records:
+            cursor.execute("SAVEPOINT write_behind")
+            try:
+                statements.MATERIAL_UPDATE.execute(
+                    cursor, tuple(record["values"]) + (record["material_id"], record["version"]))
+                row = cursor.fetchone()
+            except psycopg2.OperationalError:
+                raise
+            except psycopg2.DatabaseError as e:
+                cursor.execute("ROLLBACK TO SAVEPOINT write_behind")
+                failed.append((record, str(e)))
+                continue
+            if row is None:
+                conflicted.append(record)
+            else:
+                done.append((record, row[0]))
+            cursor.execute("RELEASE SAVEPOINT write_behind")
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+    return done, conflicted, failed